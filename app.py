@@ -1,19 +1,36 @@
 import logging
-from sched import scheduler
+import os
 
+import click
 from flask import Flask
 from flask_cors import CORS
 
-from modules.play_log.services import flush_redis_play_logs
+from modules.play_log.services import (check_play_log_shards, consume_play_events, flush_redis_play_logs,
+                                      rebuild_play_log_index, replay_play_event_spool)
+from modules.admin.services import maintain_app_logs
+from modules.user.services import refill_qrcode_pool
+from utils import instrumentation, log
 from utils.db import db
-from flask_apscheduler import APScheduler
+from utils.redis_client import get_redis_client
+from utils.redis_lease import RedisLease
 # 引入你自定义的 Handler
 from utils.my_sql_handler   import MySQLLogHandler
-def create_app():
+
+MAINTAIN_LOCK_KEY = "maintain_app_logs_lock"
+
+
+def create_app(config=None, start_background=True):
+    """
+    start_background=False 时只构建应用，不启动进程内定时任务：
+    gunicorn 预加载（preload_app）时 master 进程不应持有后台线程，由每个 worker 在 fork 之后调用 init_worker
+    """
     app = Flask(__name__)
     CORS(app)
 
     app.config.from_pyfile('config.py')
+    if config:
+        # 覆盖 config.py 中的配置（基准 / 压测使用本地的数据库、Redis 与上游）
+        app.config.update(config)
 
     db.init_app(app)
 
@@ -22,45 +39,208 @@ def create_app():
         from modules.user.views import user_bp
         from modules.playlist.views import playlist_bp
         from modules.play_log.views import play_log_bp
+        from modules.admin.views import admin_bp, metrics_bp
 
         app.register_blueprint(user_bp)
         app.register_blueprint(playlist_bp)
         app.register_blueprint(play_log_bp)
+        app.register_blueprint(admin_bp)
+        app.register_blueprint(metrics_bp)
+
+        # 请求耗时、MySQL 语句耗时与按需采样（/metrics）
+        instrumentation.init_app(app, db.engine)
 
         # 日志部分配置
         flask_logger = app.logger
-        mysql_handler = MySQLLogHandler()
+        # app.logger 按应用名共享，重复 create_app 时先关闭上一个实例的写库 Handler
+        for handler in [h for h in flask_logger.handlers if isinstance(h, MySQLLogHandler)]:
+            flask_logger.removeHandler(handler)
+            handler.close()
+        # 异步批量写库，使用独立连接，不占用请求的 session
+        mysql_handler = MySQLLogHandler(
+            db.engine,
+            batch_size=app.config.get('LOG_BATCH_SIZE', 200),
+            flush_interval=app.config.get('LOG_FLUSH_INTERVAL', 1.0),
+            max_queue_size=app.config.get('LOG_QUEUE_SIZE', 10000)
+        )
         formatter = logging.Formatter(
             '[%(asctime)s] %(levelname)s in %(module)s: %(message)s'
         )
         mysql_handler.setFormatter(formatter)
         flask_logger.addHandler(mysql_handler)
-        flask_logger.setLevel(logging.DEBUG)
+        # 整体级别 LOG_LEVEL，各模块可用 LOG_LEVELS 单独调整
+        log.init_app(app)
+
+        @app.cli.command('run-play-event-worker')
+        def run_play_event_worker_command():
+            """常驻的播放事件消费者，可以启动多个并行写库"""
+            check_play_log_shards()
+            click.echo("播放事件消费者已启动")
+            while True:
+                consume_play_events(block_ms=5000, max_seconds=60)
+
+        @app.cli.command('run-scheduler')
+        def run_scheduler_command():
+            """独立的定时任务进程：只运行集群级任务（配合 SCHEDULER_MODE = "standalone"）"""
+            run_scheduler(app)
+
+        @app.cli.command('rebuild-play-log-index')
+        def rebuild_play_log_index_command():
+            """重建播放记录的分片 key 与索引（升级、修改分片数或迁移到集群后执行一次）"""
+            check_play_log_shards()
+            count = rebuild_play_log_index()
+            click.echo(f"已登记 {count} 个 key 到待写回索引")
+
+        @app.cli.command('backfill-listening-stats')
+        def backfill_listening_stats_command():
+            """按已有的 play_logs 重建收听统计"""
+            from modules.play_log.stats import backfill_listening_stats
+            click.echo(f"已重建 {backfill_listening_stats()} 个用户的收听统计")
+
+        @app.cli.command('profile-flush')
+        def profile_flush_command():
+            """采样执行一次播放日志写回，输出火焰图用的 folded stacks"""
+            from utils.profiler import SamplingProfiler
+            with SamplingProfiler(interval=app.config.get('PROFILER_INTERVAL', 0.005)) as profiler:
+                result = flush_redis_play_logs().get_json()
+            path = profiler.save(app.config.get('PROFILE_DIR', 'profiles'), 'flush_redis_play_logs')
+            click.echo(f"{result}，耗时 {profiler.duration:.3f} s，采样 {profiler.samples} 次，已写入 {path}")
+
+        @app.cli.command('maintain-app-logs')
+        def maintain_app_logs_command():
+            """立即执行一次 app_logs 维护"""
+            click.echo(maintain_app_logs())
 
-        # 定时任务部分
-        scheduler = APScheduler()
-        scheduler.init_app(app)
-        scheduler.start()
+        @app.cli.command('migrate-playlist-storage')
+        def migrate_playlist_storage_command():
+            """把 playlists 的旧 LONGTEXT 记录转换为 哈希 + 压缩 格式"""
+            from modules.playlist.services import migrate_playlist_storage
+            click.echo(f"已转换 {migrate_playlist_storage()} 条歌单记录")
 
-        # 定义并添加定时任务
-        def flush_redis_play_logs_job():
+    if start_background:
+        start_background_jobs(app)
+    return app
+
+
+def start_background_jobs(app, cluster_jobs=None):
+    """
+    启动本进程的 APScheduler：进程内任务（二维码池、播放事件本地日志重放）每个 web 进程都需要；
+    集群级任务（写回播放日志、维护 app_logs）默认按 SCHEDULER_MODE 决定，cluster_jobs=False 时不注册
+    """
+    from flask_apscheduler import APScheduler
+
+    with app.app_context():
+        check_play_log_shards()
+    scheduler = APScheduler()
+    scheduler.init_app(app)
+    scheduler.start()
+
+    if cluster_jobs is None:
+        cluster_jobs = app.config.get('SCHEDULER_MODE', 'embedded') == 'embedded'
+    if cluster_jobs:
+        register_cluster_jobs(app, scheduler)
+
+    if app.config.get('QRCODE_POOL_ENABLED', True):
+        def refill_qrcode_pool_job():
             with app.app_context():
-                flush_redis_play_logs()
+                refill_qrcode_pool()
 
+        # 预热登录二维码池，按发放速率补充，替换即将过期的 unikey
         scheduler.add_job(
-            id='flush_redis_play_logs_task',
-            func=flush_redis_play_logs_job,
+            id='refill_qrcode_pool_task',
+            func=refill_qrcode_pool_job,
             trigger='interval',
-            seconds=60
+            seconds=app.config.get('QRCODE_POOL_REFILL_INTERVAL', 2)
         )
 
-    return app
+    if app.config.get('PLAY_EVENTS_ENABLED', False):
+        def replay_play_event_spool_job():
+            with app.app_context():
+                replay_play_event_spool()
+
+        # Redis 恢复后把本进程写入本地日志的播放事件重新写入事件流
+        scheduler.add_job(
+            id='replay_play_event_spool_task',
+            func=replay_play_event_spool_job,
+            trigger='interval',
+            seconds=app.config.get('PLAY_EVENT_SPOOL_REPLAY_INTERVAL', 10)
+        )
+    return scheduler
+
+
+def init_worker(app):
+    """
+    gunicorn 预加载时在每个 worker fork 之后调用（见 gunicorn.conf.py 的 post_fork）：
+    丢弃从 master 继承的数据库连接池，启动本进程的进程内定时任务；集群级任务由 scheduler.py 单独运行
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
+    start_background_jobs(app, cluster_jobs=False)
+
+
+def run_scheduler(app):
+    """
+    阻塞运行集群级定时任务（scheduler.py 与 flask run-scheduler 共用）
+    """
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    with app.app_context():
+        check_play_log_shards()
+    blocking = BlockingScheduler()
+    register_cluster_jobs(app, blocking)
+    app.logger.info("定时任务进程已启动")
+    blocking.start()
+
+
+def register_cluster_jobs(app, scheduler):
+    """
+    注册整个集群只需要一份的定时任务。各进程都注册也没有问题：
+    写回按分片加 Redis 租约，维护任务整体加租约，同一时间只有一个进程真正执行。
+    """
+    def flush_redis_play_logs_job():
+        with app.app_context():
+            flush_redis_play_logs()
+
+    scheduler.add_job(
+        id='flush_redis_play_logs_task',
+        func=flush_redis_play_logs_job,
+        trigger='interval',
+        seconds=app.config.get('PLAY_LOG_FLUSH_INTERVAL', 60)
+    )
+
+    if app.config.get('PLAY_EVENTS_ENABLED', False):
+        def consume_play_events_job():
+            with app.app_context():
+                consume_play_events(max_seconds=app.config.get('PLAY_EVENT_CONSUME_INTERVAL', 5) * 10)
+
+        # 把播放事件流写入 play_events，并由事件派生 play_logs 的最新进度；每个进程都是消费组中的一个消费者
+        scheduler.add_job(
+            id='consume_play_events_task',
+            func=consume_play_events_job,
+            trigger='interval',
+            seconds=app.config.get('PLAY_EVENT_CONSUME_INTERVAL', 5)
+        )
+
+    def maintain_app_logs_job():
+        with app.app_context():
+            lease = RedisLease(get_redis_client(), MAINTAIN_LOCK_KEY, app.config.get('LOG_MAINTAIN_LEASE_TTL', 3600))
+            if not lease.acquire():
+                return
+            try:
+                maintain_app_logs()
+            finally:
+                lease.release()
 
-# 移除原来的装饰器定义
-def cron_flush_redis_play_logs():
-    flush_redis_play_logs()
+    # 每天凌晨维护 app_logs：预建分区、压缩旧日志、删除过期分区
+    scheduler.add_job(
+        id='maintain_app_logs_task',
+        func=maintain_app_logs_job,
+        trigger='cron',
+        hour=3
+    )
 
 if __name__ == '__main__':
     # 播放器~启动~
-    app = create_app()
+    # debug 模式的 reloader 父进程只监视文件、重启子进程，后台任务只在实际处理请求的子进程（WERKZEUG_RUN_MAIN）中启动
+    app = create_app(start_background=os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
     app.run('0.0.0.0', debug=True, port=5000)
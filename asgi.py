@@ -0,0 +1,49 @@
+"""
+asyncio（ASGI）运行方式：user / playlist / play_log 中等待上游或 Redis 的接口由协程处理，
+一个进程可以同时挂起上千个上游请求；需要查询 MySQL 的接口（播放历史、统计、管理接口等）
+交给挂载的 Flask 应用（在线程池中执行），路径与返回结构与同步版本完全一致。
+
+启动：uvicorn --factory asgi:create_asgi_app --host 0.0.0.0 --port 5000
+生产环境（预加载 + 多 worker）：APP_MODE=asgi gunicorn -c gunicorn.conf.py
+"""
+import contextlib
+
+import anyio.to_thread
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Mount
+
+from app import create_app
+
+
+def create_asgi_app(config=None, start_background=True):
+    # 配置、日志、定时任务、二维码池等与同步版本共用同一个 Flask 应用
+    flask_app = create_app(config, start_background=start_background)
+
+    with flask_app.app_context():
+        from modules.user.async_views import routes as user_routes
+        from modules.playlist.async_views import routes as playlist_routes
+        from modules.play_log.async_views import routes as play_log_routes
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        # run_sync（数据库读写、图片渲染）使用 anyio 的线程池
+        anyio.to_thread.current_default_thread_limiter().total_tokens = flask_app.config.get("ASGI_THREAD_LIMIT", 40)
+        yield
+        from utils.async_upstream import close_async_upstream_client
+        from utils.redis_client import close_async_redis_client
+        await close_async_upstream_client()
+        await close_async_redis_client()
+
+    app = Starlette(
+        routes=user_routes + playlist_routes + play_log_routes + [
+            # 其余接口由 Flask 应用在独立的线程池中处理
+            Mount("/", WSGIMiddleware(flask_app, workers=flask_app.config.get("ASGI_WSGI_WORKERS", 16)))
+        ],
+        middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+        lifespan=lifespan
+    )
+    app.state.flask_app = flask_app
+    return app
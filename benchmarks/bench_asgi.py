@@ -0,0 +1,205 @@
+# benchmarks/bench_asgi.py
+"""
+同步（Flask，固定数量的 worker 线程）与 asyncio（uvicorn + asgi.create_asgi_app）两种运行方式的对比：
+上游为 benchmarks.fake_netease，默认延迟 300 ms；关闭上游全局预算与歌单详情缓存，让每个请求都真正等待上游。
+同步版本模拟 gunicorn 同步 worker：每个线程同一时间只处理一个请求，不保持连接。
+压测客户端为 httpx.AsyncClient，按并发数逐档测试，输出吞吐、p50 / p99 与错误数。
+
+用法（在仓库根目录）：python -m benchmarks.bench_asgi [--concurrency 50,200,1000] [--duration 15]
+"""
+import argparse
+import asyncio
+import math
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from benchmarks import sqlite_compat
+from benchmarks.common import _free_port, bench_redis_url
+from benchmarks.fake_netease import serve as serve_fake_netease
+from benchmarks.loadtest import PLAYLIST_ID_BASE, _inject_redis, _make_app, _prepare_app, _wait_for_port
+
+# 只等待上游的接口：注销（一次上游请求）与歌单详情（一次上游请求 + 处理曲目）
+TARGETS = [
+    ("GET /api/user/logout", "/api/user/logout"),
+    ("GET /api/playlist/detail", "/api/playlist/detail?id={playlist_id}&offset=0&limit=50"),
+]
+CLIENT_CONNECTIONS = 25
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="同步 / asyncio 运行方式对比")
+    parser.add_argument("--concurrency", default="50,200,1000", help="逐档测试的并发数，逗号分隔")
+    parser.add_argument("--duration", type=float, default=15, help="每档压测时长（秒）")
+    parser.add_argument("--warmup", type=float, default=2, help="每档预热时长（秒）")
+    parser.add_argument("--latency-ms", type=float, default=300, help="上游平均延迟")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="上游延迟抖动")
+    parser.add_argument("--sync-workers", type=int, default=16, help="同步版本的 worker 线程数")
+    parser.add_argument("--playlist-size", type=int, default=200, help="每个歌单的曲目数")
+    return parser.parse_args(argv)
+
+
+def serve_sync(port, config, redis_url, workers):
+    """同步版本：固定 workers 个线程，每个请求处理完即关闭连接（与同步 worker 的行为一致）"""
+    import logging
+
+    from werkzeug.serving import BaseWSGIServer
+
+    class PooledWSGIServer(BaseWSGIServer):
+        request_queue_size = 1024
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        def process_request(self, request, client_address):
+            self.executor.submit(self._process, request, client_address)
+
+        def _process(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    app = _make_app(config, redis_url)
+    PooledWSGIServer("127.0.0.1", port, app).serve_forever()
+
+
+def serve_async(port, config, redis_url):
+    """asyncio 版本：单进程 uvicorn"""
+    import uvicorn
+
+    from asgi import create_asgi_app
+
+    _inject_redis(redis_url)
+    app = create_asgi_app(config)
+    _prepare_app(app.state.flask_app)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False, backlog=2048)
+
+
+async def _run_level(base_url, concurrency, seconds):
+    """concurrency 个协程轮流请求各个接口，返回 {接口: [(耗时, 是否成功)]}"""
+    samples = {label: [] for label, _ in TARGETS}
+    deadline = time.monotonic() + seconds
+    cookies = {"MUSIC_U": "bench", "__csrf": "bench"}
+    # 与 AsyncUpstreamClient 相同的原因（httpx 大连接池的分配开销），每 CLIENT_CONNECTIONS 个协程共用一个客户端
+    clients = [
+        httpx.AsyncClient(base_url=base_url, timeout=60, cookies=cookies,
+                          limits=httpx.Limits(max_connections=CLIENT_CONNECTIONS,
+                                              max_keepalive_connections=CLIENT_CONNECTIONS))
+        for _ in range(math.ceil(concurrency / CLIENT_CONNECTIONS))
+    ]
+
+    async def worker(i):
+        client = clients[i // CLIENT_CONNECTIONS]
+        n = i
+        while time.monotonic() < deadline:
+            label, path = TARGETS[n % len(TARGETS)]
+            n += 1
+            start = time.perf_counter()
+            try:
+                resp = await client.get(path.format(playlist_id=PLAYLIST_ID_BASE + n % 20))
+                ok = resp.status_code == 200 and resp.json().get("code") == 200
+            except (httpx.HTTPError, ValueError):
+                ok = False
+            samples[label].append((time.perf_counter() - start, ok))
+
+    try:
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    finally:
+        for client in clients:
+            await client.aclose()
+    return samples
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def measure(base_url, concurrency, args):
+    if args.warmup > 0:
+        asyncio.run(_run_level(base_url, min(concurrency, 50), args.warmup))
+    start = time.perf_counter()
+    samples = asyncio.run(_run_level(base_url, concurrency, args.duration))
+    elapsed = time.perf_counter() - start
+
+    result = {}
+    for label, values in samples.items():
+        latencies = sorted(seconds * 1000 for seconds, _ in values) or [0.0]
+        result[label] = {
+            "count": len(values),
+            "errors": sum(1 for _, ok in values if not ok),
+            "throughput": round(len(values) / elapsed, 1),
+            "p50_ms": round(_percentile(latencies, 0.50), 1),
+            "p99_ms": round(_percentile(latencies, 0.99), 1),
+        }
+    return result
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    workdir = tempfile.mkdtemp(prefix="netease-bench-asgi-")
+    redis_url = bench_redis_url()
+
+    ctx = multiprocessing.get_context("spawn")
+    fake_port = _free_port()
+    fake = ctx.Process(target=serve_fake_netease, args=(fake_port,), kwargs={
+        "latency": args.latency_ms / 1000, "jitter": args.jitter_ms / 1000, "playlist_size": args.playlist_size
+    }, daemon=True)
+    fake.start()
+
+    config = {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "NETEASE_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "SCHEDULER_MODE": "standalone",
+        "QRCODE_POOL_ENABLED": False,
+        # 只比较等待上游的开销：不限制上游调用速率，不缓存歌单详情
+        "UPSTREAM_RATE_LIMIT_ENABLED": False,
+        "PLAYLIST_DETAIL_CACHE_TTL": 0,
+    }
+
+    local_app = _make_app(config, redis_url)
+    with local_app.app_context():
+        from utils.db import db
+        sqlite_compat.create_schema(db.engine)
+
+    results = {}
+    modes = [
+        (f"sync ({args.sync_workers} 线程)", serve_sync, (config, redis_url, args.sync_workers)),
+        ("asyncio (uvicorn 单进程)", serve_async, (config, redis_url)),
+    ]
+    try:
+        for mode, target, target_args in modes:
+            port = _free_port()
+            server = ctx.Process(target=target, args=(port,) + target_args, daemon=True)
+            server.start()
+            try:
+                _wait_for_port(port)
+                for concurrency in levels:
+                    results[(mode, concurrency)] = measure(f"http://127.0.0.1:{port}", concurrency, args)
+                    print(f"{mode} 并发 {concurrency} 完成")
+            finally:
+                server.terminate()
+                server.join()
+    finally:
+        fake.terminate()
+
+    print(f"\n上游延迟 {args.latency_ms:.0f} ms，每档 {args.duration:.0f} 秒")
+    print(f"{'运行方式':<26} {'并发':>6} {'接口':<26} {'请求数':>8} {'错误':>6} {'req/s':>8} {'p50':>9} {'p99':>9}")
+    for (mode, concurrency), endpoints in results.items():
+        for label, s in endpoints.items():
+            print(f"{mode:<26} {concurrency:>6} {label:<26} {s['count']:>8} {s['errors']:>6} "
+                  f"{s['throughput']:>8.1f} {s['p50_ms']:>9.1f} {s['p99_ms']:>9.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
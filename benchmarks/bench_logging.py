@@ -0,0 +1,162 @@
+# benchmarks/bench_logging.py
+"""
+请求延迟基准：关闭数据库日志 / 旧的同步逐条提交 / 新的异步批量 Handler。
+默认使用临时 SQLite 文件承载 app_logs，可用 BENCH_DATABASE_URI 指向 MySQL。
+另外对比 INFO 级别下热点路径每次调用的日志开销：f-string 的 DEBUG 日志与 utils.log 的惰性日志、
+旧的 LOG_BUFFER 汇总与 Aggregator。
+用法（在仓库根目录）：python -m benchmarks.bench_logging [请求数]
+"""
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, text
+
+from utils import log as struct_log
+from utils.my_sql_handler import INSERT_LOG_SQL, MySQLLogHandler
+
+# check_login_status_once / get_user_profile 记录的上游响应大小
+UPSTREAM_RESULT = {"code": 200, "account": {"id": 1677021648, "userName": "1_13800000000", "type": 1},
+                   "profile": {"userId": 1677021648, "nickname": "bench", "signature": "x" * 200,
+                               "followeds": 12, "follows": 34, "playlistCount": 56}}
+
+CREATE_SQLITE_TABLE = """
+    CREATE TABLE IF NOT EXISTS app_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        level VARCHAR(50) NOT NULL,
+        message TEXT NOT NULL,
+        pathname VARCHAR(255),
+        funcname VARCHAR(100),
+        lineno INT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+class SyncLogHandler(logging.Handler):
+    """旧实现：每条日志一次 INSERT + commit"""
+
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+
+    def emit(self, record):
+        with self.engine.begin() as conn:
+            conn.execute(INSERT_LOG_SQL, {
+                "level": record.levelname,
+                "message": self.format(record),
+                "pathname": record.pathname,
+                "funcname": record.funcName,
+                "lineno": record.lineno,
+                "created_at": None
+            })
+
+
+def make_app(handler):
+    app = Flask("bench_logging")
+    app.logger.handlers.clear()
+    app.logger.propagate = False
+    if handler:
+        app.logger.addHandler(handler)
+    app.logger.setLevel(logging.DEBUG)
+
+    @app.route("/ping")
+    def ping():
+        # 与 show_playlist 相当：一次请求输出几条日志
+        app.logger.info("进入 ping")
+        app.logger.debug("准备查询")
+        app.logger.debug("查询完成")
+        app.logger.info("返回结果")
+        return jsonify({"code": 200})
+
+    return app
+
+
+def run(name, app, n):
+    client = app.test_client()
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        client.get("/ping")
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<12} 平均 {statistics.mean(latencies):.3f} ms  p50 {latencies[len(latencies) // 2]:.3f} ms  p99 {p99:.3f} ms")
+
+
+def _per_call_ns(func, n):
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        func()
+    return (time.perf_counter_ns() - start) / n
+
+
+def hot_path(n):
+    """INFO 级别下（DEBUG 未开启）热点路径每次调用的日志开销"""
+    app = Flask("bench_hot_path")
+    app.logger.handlers.clear()
+    app.logger.propagate = False
+    app.logger.addHandler(logging.NullHandler())
+    app.config["LOG_LEVEL"] = "INFO"
+    struct_log.init_app(app)
+    log = struct_log.get_logger("bench")
+    entry = (1677021648, 186016, "song", 12.5, 240.0)
+
+    buffer, state, lock = [], {"count": 0, "last": time.time()}, threading.Lock()
+
+    def legacy_summary():
+        # 旧实现：模块级 LOG_BUFFER / LOG_COUNT / LAST_FLUSH_TIME，加锁累计
+        now = time.time()
+        with lock:
+            state["count"] += 1
+            if len(buffer) < 3:
+                buffer.extend([entry][:3 - len(buffer)])
+            if now - state["last"] < 60:
+                return
+            state["last"] = now
+        app.logger.info(f"共有 {state['count']} 条播放日志被记录。示例: {buffer}")
+
+    aggregator = log.aggregator("播放日志记录汇总", interval=60, samples=3)
+    cases = [
+        ("f-string DEBUG（上游 JSON）", lambda: app.logger.debug(f"登录状态返回: {UPSTREAM_RESULT}")),
+        ("惰性 DEBUG（上游 JSON）", lambda: log.debug("登录状态返回", result=UPSTREAM_RESULT)),
+        ("旧的心跳汇总", legacy_summary),
+        ("Aggregator 心跳汇总", lambda: aggregator.add(1, (entry,))),
+    ]
+    print(f"\nINFO 级别下每次调用的日志开销（{n} 次）")
+    for name, func in cases:
+        print(f"  {name:<24} {_per_call_ns(func, n):8.0f} ns")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    uri = os.environ.get("BENCH_DATABASE_URI")
+    if not uri:
+        uri = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_logs.db")
+    engine = create_engine(uri)
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.execute(text(CREATE_SQLITE_TABLE))
+
+    run("关闭", make_app(None), n)
+    run("同步逐条", make_app(SyncLogHandler(engine)), n)
+
+    handler = MySQLLogHandler(engine)
+    run("异步批量", make_app(handler), n)
+    start = time.perf_counter()
+    handler.close()
+    print(f"关闭时排空队列耗时 {(time.perf_counter() - start) * 1000:.1f} ms，丢弃 {handler.dropped} 条")
+
+    with engine.connect() as conn:
+        print(f"app_logs 行数: {conn.execute(text('SELECT COUNT(*) FROM app_logs')).scalar()}")
+
+    hot_path(n * 100)
+
+
+if __name__ == "__main__":
+    main()
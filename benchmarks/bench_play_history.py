@@ -0,0 +1,142 @@
+# benchmarks/bench_play_history.py
+"""
+播放历史查询基准：单个用户 100 万条 play_logs。
+对比旧查询（只有 uniq_user_song，ORDER BY played_at DESC LIMIT 100 需要 filesort）、
+OFFSET 深分页，与 (user_id, played_at, id, ...) 覆盖索引上的 keyset 分页，以及合并 Redis 未写回记录后的完整接口耗时。
+默认使用内存 SQLite；设置 BENCH_DATABASE_URL 指向一个空的 MySQL 库可以得到与线上一致的结果（会建表、删表）。
+用法（在仓库根目录）：python -m benchmarks.bench_play_history [行数]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import (BigInteger, Column, DateTime, Float, Index, Integer, MetaData, String, Table,
+                        UniqueConstraint, text)
+
+from benchmarks.common import use_bench_redis
+from modules.play_log.services import _query_db_history, _write_play_logs, get_play_logs
+from utils.db import db
+
+USER_ID = 1677021648
+PAGE_SIZE = 100
+PENDING = 200  # Redis 中尚未写回的记录数
+
+metadata = MetaData()
+play_logs = Table(
+    "play_logs", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", BigInteger, nullable=False),
+    Column("song_id", BigInteger, nullable=False),
+    Column("song_name", String(255)),
+    Column("current_position", Float, nullable=False, default=0),
+    Column("song_duration", Float, nullable=False, default=0),
+    Column("played_at", DateTime),
+    Column("update_time", DateTime),
+    UniqueConstraint("user_id", "song_id", name="uniq_user_song")
+)
+history_index = Index(
+    "idx_user_played", play_logs.c.user_id, play_logs.c.played_at, play_logs.c.id, play_logs.c.song_id,
+    play_logs.c.current_position, play_logs.c.song_duration, play_logs.c.song_name
+)
+
+
+def timeit(func, n=5):
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start) / n * 1000
+
+
+def populate(n):
+    start_at = datetime(2024, 1, 1)
+    rng = random.Random(42)
+    batch = []
+    for i in range(n):
+        batch.append({
+            "user_id": USER_ID,
+            "song_id": 1_000_000 + i,
+            "song_name": f"song-{i}",
+            "current_position": rng.uniform(0, 240),
+            "song_duration": 240.0,
+            "played_at": start_at + timedelta(seconds=rng.randrange(0, 365 * 86400)),
+            "update_time": start_at
+        })
+        if len(batch) >= 20000:
+            db.session.execute(play_logs.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(play_logs.insert(), batch)
+    db.session.commit()
+
+
+def legacy_query():
+    sql = text("""
+        SELECT song_id, song_name, current_position, song_duration, played_at
+        FROM play_logs WHERE user_id = :user_id ORDER BY played_at DESC LIMIT 100
+    """)
+    return db.session.execute(sql, {"user_id": USER_ID}).fetchall()
+
+
+def offset_page(page):
+    sql = text("""
+        SELECT id, song_id, song_name, current_position, song_duration, played_at
+        FROM play_logs WHERE user_id = :user_id ORDER BY played_at DESC, id DESC LIMIT 100 OFFSET :offset
+    """)
+    return db.session.execute(sql, {"user_id": USER_ID, "offset": page * PAGE_SIZE}).fetchall()
+
+
+def keyset_walk(pages):
+    before = None
+    for _ in range(pages):
+        rows = _query_db_history(USER_ID, PAGE_SIZE, before)
+        before = (rows[-1]["played_at"], rows[-1]["id"])
+    return before
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("BENCH_DATABASE_URL", "sqlite://")
+    db.init_app(app)
+    redis_client = use_bench_redis()
+
+    with app.app_context():
+        metadata.drop_all(db.engine)
+        metadata.create_all(db.engine)
+        history_index.drop(db.engine)
+
+        start = time.perf_counter()
+        populate(n)
+        print(f"写入 {n} 行: {time.perf_counter() - start:.1f} s（{db.engine.dialect.name}）")
+
+        print(f"旧查询（filesort）第 1 页:        {timeit(legacy_query, 3):9.2f} ms")
+        print(f"OFFSET 第 100 页（无新索引）:     {timeit(lambda: offset_page(99), 3):9.2f} ms")
+
+        history_index.create(db.engine)
+        print(f"keyset 第 1 页:                  {timeit(lambda: _query_db_history(USER_ID, PAGE_SIZE, None)):9.2f} ms")
+        print(f"OFFSET 第 1000 页（有新索引）:    {timeit(lambda: offset_page(999), 3):9.2f} ms")
+        deep = keyset_walk(999)
+        print(f"keyset 第 1000 页:               "
+              f"{timeit(lambda: _query_db_history(USER_ID, PAGE_SIZE, deep)):9.2f} ms")
+
+        # Redis 中还有 PENDING 条未写回（其中一半覆盖已有歌曲）
+        _write_play_logs([
+            (USER_ID, 1_000_000 + i * 2 if i % 2 else 9_000_000 + i, f"pending-{i}", 30.0, 240.0)
+            for i in range(PENDING)
+        ])
+        with app.test_request_context(f"/api/play_log/get?user_id={USER_ID}"):
+            resp = get_play_logs()
+            data = resp.get_json()
+            assert data["code"] == 200, data
+            assert sum(1 for log in data["data"] if log["song_name"].startswith("pending-")) == PAGE_SIZE
+            print(f"完整接口第 1 页（合并 {PENDING} 条 Redis 记录）: {timeit(get_play_logs):9.2f} ms")
+
+        metadata.drop_all(db.engine)
+    redis_client.flushdb()
+
+
+if __name__ == "__main__":
+    main()
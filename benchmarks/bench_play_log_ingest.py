@@ -0,0 +1,54 @@
+# benchmarks/bench_play_log_ingest.py
+"""
+播放心跳写入基准：旧的 6 次 hset + expire 与新的单次 pipeline、批量写入对比。
+用法（在仓库根目录）：python -m benchmarks.bench_play_log_ingest [心跳数]
+"""
+import sys
+import time
+
+from benchmarks.common import report, use_bench_redis
+from modules.play_log.services import PLAY_LOG_TTL, _write_play_logs
+
+
+def legacy_write(redis_client, entry):
+    """旧实现：每个字段一次 hset，再 expire，共 7 次往返"""
+    user_id, song_id, song_name, current_time_, duration = entry
+    key = f"play_log:{user_id}:{song_id}"
+    redis_client.hset(key, "user_id", user_id)
+    redis_client.hset(key, "song_id", song_id)
+    redis_client.hset(key, "song_name", song_name)
+    redis_client.hset(key, "current_time", current_time_)
+    redis_client.hset(key, "duration", duration)
+    redis_client.hset(key, "last_update", time.time())
+    redis_client.expire(key, PLAY_LOG_TTL)
+
+
+def make_entries(n):
+    return [(1000 + i % 500, 2000 + i, f"song-{i}", float(i % 240), 240.0) for i in range(n)]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    redis_client = use_bench_redis()
+    entries = make_entries(n)
+
+    start = time.perf_counter()
+    for entry in entries:
+        legacy_write(redis_client, entry)
+    report("旧实现 (7 次往返/心跳)", n, time.perf_counter() - start)
+
+    redis_client.flushdb()
+    start = time.perf_counter()
+    for entry in entries:
+        _write_play_logs([entry])
+    report("pipeline (1 次往返/心跳)", n, time.perf_counter() - start)
+
+    redis_client.flushdb()
+    start = time.perf_counter()
+    for i in range(0, n, 50):
+        _write_play_logs(entries[i:i + 50])
+    report("set_batch (每批 50 条)", n, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_playlist_storage.py
+"""
+歌单存储格式基准：LONGTEXT JSON + 深比较 vs. 内容哈希 + zlib 压缩 payload。
+以 netease_cloud.sql 中最大的一条歌单记录为模板，放大成大账号（默认 1000 个歌单）。
+用法（在仓库根目录）：python -m benchmarks.bench_playlist_storage [歌单数]
+"""
+import json
+import re
+import sys
+import time
+
+import zlib
+
+from modules.playlist.storage import content_hash
+
+ROW_PATTERN = re.compile(r"INSERT INTO `playlists` VALUES \((\d+), (\d+), '(.*)', '([^']*)'\);$")
+
+
+def load_fixture():
+    largest = None
+    with open("netease_cloud.sql", encoding="utf-8") as f:
+        for line in f:
+            if not line.startswith("INSERT INTO `playlists`"):
+                continue
+            raw = ROW_PATTERN.match(line.strip()).group(3)
+            raw = raw.replace('\\"', '"').replace("\\'", "'").replace("\\\\", "\\")
+            data = json.loads(raw)
+            if largest is None or len(data["playlist"]) > len(largest["playlist"]):
+                largest = data
+    return largest
+
+
+def scale(data, n):
+    template = data["playlist"]
+    playlists = []
+    for i in range(n):
+        item = dict(template[i % len(template)])
+        item["id"] = 10_000_000 + i
+        item["name"] = f"{item.get('name', '')}-{i}"
+        playlists.append(item)
+    return dict(data, playlist=playlists)
+
+
+def timeit(func, n=20):
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start) / n * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    data = scale(load_fixture(), n)
+    # 上游原始响应字节
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    # 旧格式
+    old_text = json.dumps(data)
+    # 新格式
+    digest = content_hash(raw)
+    payload = zlib.compress(raw, 6)
+
+    print(f"歌单数: {n}")
+    print(f"行大小  LONGTEXT: {len(old_text.encode('utf-8')) / 1024:10.1f} KB")
+    print(f"行大小  payload:  {len(payload) / 1024:10.1f} KB  (+64 B 哈希)")
+
+    old_compare = timeit(lambda: json.loads(old_text) == json.loads(raw))
+    new_compare = timeit(lambda: content_hash(raw) == digest)
+    print(f"变更判断  解析两份数据+深比较: {old_compare:8.2f} ms   哈希比较: {new_compare:8.2f} ms")
+
+    old_serve = timeit(lambda: json.dumps({"code": 200, "msg": "", "data": json.loads(old_text)}))
+    new_serve = timeit(lambda: b'{"code": 200, "msg": "", "data": ' + zlib.decompress(payload) + b"}")
+    print(f"数据库降级返回  解析+重新编码: {old_serve:8.2f} ms   解压+拼接: {new_serve:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
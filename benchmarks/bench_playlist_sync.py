@@ -0,0 +1,134 @@
+# benchmarks/bench_playlist_sync.py
+"""
+歌单增量同步基准（SQLite 代替 MySQL）：以 netease_cloud.sql 中最大的歌单记录放大成大账号，
+分别对歌单列表与歌单曲目做"改一个 / 移到最前 / 在头部插入 / 删除一个"，统计每次同步写入的行数，
+并对比全量响应（/show 的歌单 JSON、全部曲目）与 /api/playlist/changes 增量响应的字节数。
+用法（在仓库根目录）：python -m benchmarks.bench_playlist_sync [歌单数] [--tracks 1000]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import event
+
+from benchmarks import sqlite_compat
+from benchmarks.bench_playlist_storage import load_fixture, scale
+from benchmarks.common import use_bench_redis
+from benchmarks.loadtest import _prepare_app
+
+UID = 1001
+PLAYLIST_ID = 20_000_000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="歌单增量同步的写入行数与响应大小")
+    parser.add_argument("playlists", type=int, nargs="?", default=1000, help="歌单数")
+    parser.add_argument("--tracks", type=int, default=1000, help="歌单曲目数")
+    return parser.parse_args(argv)
+
+
+class RowCounter:
+    """累计 INSERT / UPDATE / DELETE 影响的行数"""
+
+    def __init__(self, engine):
+        self.rows = 0
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in ("INSERT", "UPDATE", "DELETE") and cursor.rowcount > 0:
+            self.rows += cursor.rowcount
+
+    def take(self):
+        rows, self.rows = self.rows, 0
+        return rows
+
+
+def _size(obj):
+    return len(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+
+def _playlist_steps(data):
+    playlists = data["playlist"]
+    renamed = [dict(p) for p in playlists]
+    renamed[len(renamed) // 2]["name"] += "（改名）"
+    moved = [renamed[-1]] + renamed[:-1]
+    added = [dict(renamed[0], id=9_000_000, name="新歌单")] + moved
+    removed = added[:10] + added[11:]
+    return [("首次同步", playlists), ("改一个歌单名", renamed), ("最后一个移到最前", moved),
+            ("头部新增一个", added), ("删除一个", removed)]
+
+
+def _track_steps(n):
+    songs = list(range(3_000_000, 3_000_000 + n))
+    moved = [songs[-1]] + songs[:-1]
+    added = [2_999_999] + moved
+    removed = added[:10] + added[11:]
+    return [("首次同步", songs), ("最后一首移到最前", moved), ("头部新增一首", added), ("删除一首", removed)]
+
+
+def run_playlists(data, counter):
+    from modules.playlist.delta import query_playlist_changes
+    from modules.playlist.services import _apply_playlist_response
+
+    print(f"{'歌单列表':<16} {'写入行数':>8} {'耗时':>10} {'全量响应':>12} {'增量响应':>12}")
+    version = 0
+    for name, playlists in _playlist_steps(data):
+        raw = json.dumps(dict(data, playlist=playlists), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        counter.take()
+        start = time.perf_counter()
+        code, _, _ = _apply_playlist_response(UID, 200, raw)
+        elapsed = time.perf_counter() - start
+        assert code == 200
+        rows = counter.take()
+        changes = query_playlist_changes(UID, version)
+        full = query_playlist_changes(UID, 0)
+        assert [e["playlist"]["id"] for e in full["added"]] == list(dict.fromkeys(p["id"] for p in playlists))
+        version = changes["version"]
+        print(f"{name:<16} {rows:>8} {elapsed * 1000:>7.1f} ms {len(raw) / 1024:>9.1f} KB "
+              f"{_size(changes) / 1024:>9.1f} KB")
+
+
+def run_tracks(n, counter):
+    from modules.playlist.delta import query_track_changes
+    from modules.playlist.services import _sync_detail_tracks
+
+    print(f"\n{'歌单曲目':<16} {'写入行数':>8} {'耗时':>10} {'全量曲目 ID':>12} {'增量响应':>12}")
+    version = 0
+    for step, (name, songs) in enumerate(_track_steps(n)):
+        processed = {"playlist_id": PLAYLIST_ID, "private": False, "track_update_time": step + 1,
+                     "tracks": [{"song_id": s} for s in songs]}
+        counter.take()
+        start = time.perf_counter()
+        _sync_detail_tracks(processed, None)
+        elapsed = time.perf_counter() - start
+        rows = counter.take()
+        changes = query_track_changes(PLAYLIST_ID, version)
+        full = query_track_changes(PLAYLIST_ID, 0)
+        assert [e["song_id"] for e in full["added"]] == songs
+        version = changes["version"]
+        print(f"{name:<16} {rows:>8} {elapsed * 1000:>7.1f} ms {_size(songs) / 1024:>9.1f} KB "
+              f"{_size(changes) / 1024:>9.1f} KB")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from app import create_app
+    from utils.db import db
+
+    use_bench_redis()
+    workdir = tempfile.mkdtemp(prefix="netease-bench-playlist-sync-")
+    app = _prepare_app(create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "QRCODE_POOL_ENABLED": False,
+    }, start_background=False))
+    with app.app_context():
+        sqlite_compat.create_schema(db.engine)
+        counter = RowCounter(db.engine)
+        run_playlists(scale(load_fixture(), args.playlists), counter)
+        run_tracks(args.tracks, counter)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/bench_redis_modes.py
+"""
+同一份播放心跳分别在单机、哨兵与集群模式的 Redis 上写入并写回 MySQL（SQLite 代替），
+对比各模式的写入 / 写回吞吐，并校验写回的 play_logs 完全一致、Redis 中没有残留的 key 与索引。
+客户端通过 create_redis_client 按 REDIS_MODE 创建，与线上使用同一套连接池与超时配置。
+用法（在仓库根目录）：python -m benchmarks.bench_redis_modes [心跳数] [--shards N]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import text
+
+import utils.redis_client
+from benchmarks import sqlite_compat
+from benchmarks.common import _start_redis_server, report, start_redis_cluster, start_redis_sentinel
+from benchmarks.loadtest import _prepare_app
+
+BATCH = 50  # 每次 _write_play_logs 写入的心跳数（一次 pipeline）
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="单机 / 哨兵 / 集群模式下的播放记录写入与写回")
+    parser.add_argument("count", type=int, nargs="?", default=20000, help="心跳数")
+    parser.add_argument("--users", type=int, default=500, help="用户数")
+    parser.add_argument("--shards", type=int, default=None, help="PLAY_LOG_FLUSH_SHARDS（默认按模式自动选择）")
+    return parser.parse_args(argv)
+
+
+def make_entries(n, users):
+    return [(1000 + i % users, 2000 + i // users, f"song-{i // users}", float(i % 240), 240.0) for i in range(n)]
+
+
+def run(mode, redis_config, entries, shards, workdir):
+    from app import create_app
+    from modules.play_log.services import _write_play_logs, check_play_log_shards, flush_redis_play_logs
+    from utils.db import db
+
+    config = dict(
+        redis_config,
+        REDIS_MODE=mode,
+        REDIS_PASSWORD=None,
+        PLAY_LOG_FLUSH_SHARDS=shards,
+        QRCODE_POOL_ENABLED=False,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(workdir, f'{mode}.db')}",
+    )
+    utils.redis_client._redis_client = None
+    app = _prepare_app(create_app(config, start_background=False))
+    with app.app_context():
+        sqlite_compat.create_schema(db.engine)
+        redis_client = utils.redis_client.get_redis_client()
+        check_play_log_shards()
+
+        start = time.perf_counter()
+        for i in range(0, len(entries), BATCH):
+            _write_play_logs(entries[i:i + BATCH])
+        report(f"{mode} 写入", len(entries), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = flush_redis_play_logs(threshold_seconds=-1).get_json()
+        assert result["code"] == 200, result["msg"]
+        flushed = result["flushed"]
+        report(f"{mode} 写回", flushed, time.perf_counter() - start)
+
+        leftover = sum(1 for pattern in ("play_log:*", "play_log_user:*", "play_log_dirty:*")
+                       for _ in redis_client.scan_iter(match=pattern, count=1000))
+        rows = db.session.execute(text(
+            "SELECT user_id, song_id, song_name, current_position, song_duration FROM play_logs "
+            "ORDER BY user_id, song_id"
+        )).fetchall()
+    utils.redis_client._redis_client = None
+    return [tuple(row) for row in rows], leftover
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    entries = make_entries(args.count, args.users)
+    workdir = tempfile.mkdtemp(prefix="netease-bench-redis-modes-")
+
+    modes = [("standalone", {"REDIS_URL": _start_redis_server()})]
+    sentinels = start_redis_sentinel()
+    if sentinels:
+        modes.append(("sentinel", {"REDIS_SENTINELS": sentinels, "REDIS_SENTINEL_SERVICE": "mymaster"}))
+    nodes = start_redis_cluster()
+    if nodes:
+        modes.append(("cluster", {"REDIS_CLUSTER_NODES": nodes}))
+    if modes[0][1]["REDIS_URL"] is None:
+        raise SystemExit("需要本机的 redis-server")
+
+    results = {}
+    for mode, redis_config in modes:
+        rows, leftover = run(mode, redis_config, entries, args.shards, workdir)
+        results[mode] = rows
+        print(f"{mode}: play_logs {len(rows)} 行，Redis 残留 key {leftover} 个")
+        assert leftover == 0, f"{mode} 模式写回后 Redis 中仍有 {leftover} 个 key"
+
+    expected = results["standalone"]
+    for mode, rows in results.items():
+        assert rows == expected, f"{mode} 模式写回的 play_logs 与单机模式不一致"
+    print(f"各模式写回的 play_logs 一致（{len(expected)} 行）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# benchmarks/bench_startup.py
+"""
+worker 冷启动基准：
+1. 全新解释器中 import app、create_app 与第一个请求的耗时（不预加载时每个 worker 都要付出的时间）
+2. 按 gunicorn.conf.py 启动 gunicorn，对比 preload_app 开 / 关：每个 worker 从 fork 到可以处理请求的耗时、
+   全部 worker 就绪的总耗时，以及各进程的 PSS（预加载时 worker 与 master 共享的内存页按进程数分摊）
+
+用法（在仓库根目录）：python -m benchmarks.bench_startup [--workers 4] [--runs 5]
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks import sqlite_compat
+from benchmarks.common import BENCH_ADMIN_TOKEN, _free_port, bench_redis_url
+from benchmarks.loadtest import _wait_for_port
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_START_CODE = """
+import json, sys, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+from benchmarks.loadtest import _inject_redis, _prepare_app
+_inject_redis(sys.argv[2])
+app = _prepare_app(create_app(json.loads(sys.argv[1]), start_background=False))
+t2 = time.perf_counter()
+app.test_client().get("/metrics", headers={"X-Admin-Token": app.config["ADMIN_TOKEN"]})
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "create_app": t2 - t1, "first_request": t3 - t2,
+                  "modules": len(sys.modules), "deferred": [m for m in ("qrcode", "PIL", "apscheduler")
+                                                            if m not in sys.modules]}))
+"""
+
+# 在仓库的 gunicorn.conf.py 之上覆盖监听地址、worker 数与应用，并记录每个 worker 的 fork / 就绪时间
+GUNICORN_CONF = """
+import json, os, runpy, time
+
+globals().update({{k: v for k, v in runpy.run_path({conf!r}).items() if not k.startswith("__")}})
+_post_fork = post_fork
+
+bind = {bind!r}
+workers = {workers}
+preload_app = {preload}
+wsgi_app = "benchmarks.bench_startup:bench_app()"
+accesslog = None
+loglevel = "warning"
+
+
+def _record(event, worker):
+    with open({events!r}, "a") as f:
+        f.write(json.dumps({{"event": event, "age": worker.age, "pid": os.getpid(), "t": time.time()}}) + "\\n")
+
+
+def pre_fork(server, worker):
+    _record("fork", worker)
+
+
+def post_fork(server, worker):
+    _post_fork(server, worker)
+
+
+def post_worker_init(worker):
+    _record("ready", worker)
+"""
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="worker 冷启动基准")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker 数")
+    parser.add_argument("--runs", type=int, default=5, help="全新解释器冷启动的重复次数")
+    return parser.parse_args(argv)
+
+
+def bench_app():
+    """gunicorn 加载的应用：使用压测的 SQLite 与 Redis，不启动后台任务（由 post_fork 中的 init_worker 启动）"""
+    from app import create_app
+    from benchmarks.loadtest import _inject_redis, _prepare_app
+
+    _inject_redis(os.environ["BENCH_STARTUP_REDIS_URL"])
+    return _prepare_app(create_app(json.loads(os.environ["BENCH_STARTUP_CONFIG"]), start_background=False))
+
+
+def cold_start(config, redis_url, runs):
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", COLD_START_CODE, json.dumps(config), redis_url],
+                             cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    return results
+
+
+def _pss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def gunicorn_start(config, redis_url, workers, preload, workdir):
+    events = os.path.join(workdir, f"events-{preload}.jsonl")
+    conf = os.path.join(workdir, f"gunicorn-{preload}.conf.py")
+    port = _free_port()
+    with open(conf, "w") as f:
+        f.write(GUNICORN_CONF.format(conf=os.path.join(ROOT, "gunicorn.conf.py"), bind=f"127.0.0.1:{port}",
+                                     workers=workers, preload=preload, events=events))
+
+    env = dict(os.environ, BENCH_STARTUP_CONFIG=json.dumps(config), BENCH_STARTUP_REDIS_URL=redis_url)
+    start = time.time()
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", conf], cwd=ROOT, env=env)
+    try:
+        deadline = time.monotonic() + 60
+        ready = {}
+        while len(ready) < workers:
+            if time.monotonic() > deadline or proc.poll() is not None:
+                raise RuntimeError("gunicorn worker 未能在 60 秒内全部就绪")
+            time.sleep(0.05)
+            if os.path.exists(events):
+                with open(events) as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+                forks = {r["age"]: r for r in records if r["event"] == "fork"}
+                ready = {r["age"]: (r, forks[r["age"]]) for r in records if r["event"] == "ready"}
+        all_ready = max(r["t"] for r, _ in ready.values()) - start
+
+        _wait_for_port(port)
+        metrics = urllib.request.Request(f"http://127.0.0.1:{port}/metrics", headers={"X-Admin-Token": BENCH_ADMIN_TOKEN})
+        with urllib.request.urlopen(metrics, timeout=10) as resp:
+            assert resp.status == 200
+        pss = [_pss_kb(r["pid"]) for r, _ in ready.values()]
+        return {
+            "worker_start": sorted(r["t"] - f["t"] for r, f in ready.values()),
+            "all_ready": all_ready,
+            "master_pss_kb": _pss_kb(proc.pid),
+            "worker_pss_kb": pss,
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="netease-bench-startup-")
+    redis_url = bench_redis_url()
+    config = {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "QRCODE_POOL_ENABLED": False,
+        "ADMIN_TOKEN": BENCH_ADMIN_TOKEN,
+    }
+
+    from app import create_app
+    from benchmarks.loadtest import _inject_redis, _prepare_app
+    from utils.db import db
+
+    _inject_redis(redis_url)
+    local_app = _prepare_app(create_app(config, start_background=False))
+    with local_app.app_context():
+        sqlite_compat.create_schema(db.engine)
+
+    runs = cold_start(config, redis_url, args.runs)
+    print(f"全新解释器冷启动（{args.runs} 次的中位数）")
+    for key in ("import", "create_app", "first_request"):
+        print(f"  {key:<14} {statistics.median(r[key] for r in runs) * 1000:8.1f} ms")
+    print(f"  已加载模块 {runs[0]['modules']} 个，延迟到首次使用才导入：{', '.join(runs[0]['deferred']) or '无'}")
+
+    print(f"\ngunicorn（{args.workers} 个 worker）")
+    print(f"{'preload_app':<12} {'worker 启动 p50':>16} {'最慢 worker':>12} {'全部就绪':>10} "
+          f"{'master PSS':>12} {'worker PSS 合计':>16}")
+    for preload in (False, True):
+        r = gunicorn_start(config, redis_url, args.workers, preload, workdir)
+        worker_pss = sum(p for p in r["worker_pss_kb"] if p) / 1024
+        print(f"{str(preload):<12} {statistics.median(r['worker_start']) * 1000:>13.1f} ms "
+              f"{r['worker_start'][-1] * 1000:>9.1f} ms {r['all_ready'] * 1000:>7.0f} ms "
+              f"{(r['master_pss_kb'] or 0) / 1024:>9.1f} MB {worker_pss:>13.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
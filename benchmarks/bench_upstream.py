@@ -0,0 +1,91 @@
+# benchmarks/bench_upstream.py
+"""
+上游客户端演示/基准：本地起一个桩 HTTP 服务，观察连接复用与熔断的打开、恢复，
+并断言共享连接池串行请求只用 1 个 TCP 连接、熔断按 closed -> open -> half_open -> closed 转换。
+用法（在仓库根目录）：python -m benchmarks.bench_upstream [请求数]
+"""
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from utils.upstream import CircuitBreaker, CircuitOpenError, UpstreamClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+    disable_nagle_algorithm = True
+    status = 200
+    ports = set()
+    hits = 0
+
+    def do_GET(self):
+        StubHandler.ports.add(self.client_address[1])
+        StubHandler.hits += 1
+        body = b'{"code":200}'
+        self.send_response(StubHandler.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api"
+
+    # 1. 每次新建连接 vs. 共享连接池
+    StubHandler.ports.clear()
+    start = time.perf_counter()
+    for _ in range(n):
+        requests.get(url)
+    plain = time.perf_counter() - start
+    print(f"requests.get:   {n} 次请求, {len(StubHandler.ports)} 个 TCP 连接, {plain / n * 1000:.3f} ms/次")
+
+    client = UpstreamClient(retries=0, failure_threshold=3, recovery_timeout=1)
+    StubHandler.ports.clear()
+    start = time.perf_counter()
+    for _ in range(n):
+        client.get(url)
+    pooled = time.perf_counter() - start
+    print(f"UpstreamClient: {n} 次请求, {len(StubHandler.ports)} 个 TCP 连接, {pooled / n * 1000:.3f} ms/次")
+    assert len(StubHandler.ports) == 1, f"共享连接池串行请求应只用 1 个 TCP 连接，实际 {len(StubHandler.ports)} 个"
+
+    # 2. 熔断：连续 5xx 后打开，快速失败；恢复时间过后探测成功则关闭
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    StubHandler.status = 503
+    for _ in range(3):
+        client.get(url)
+    print(f"连续 3 次 503 后熔断状态: {client.breaker.state}")
+    assert client.breaker.state == CircuitBreaker.OPEN
+    hits = StubHandler.hits
+    try:
+        client.get(url)
+    except CircuitOpenError as e:
+        print(f"熔断打开期间请求被拒绝: {e}")
+    else:
+        raise AssertionError("熔断打开期间请求应被拒绝")
+    assert StubHandler.hits == hits, "熔断打开期间请求不应到达上游"
+
+    StubHandler.status = 200
+    time.sleep(1.1)
+    print(f"恢复时间过后熔断状态: {client.breaker.state}")
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    client.get(url)
+    print(f"探测请求成功后熔断状态: {client.breaker.state}")
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert StubHandler.hits == hits + 1
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
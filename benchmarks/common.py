@@ -0,0 +1,156 @@
+# benchmarks/common.py
+"""
+基准脚本共用的辅助函数
+"""
+import os
+import socket
+import threading
+import time
+
+import redis
+
+import utils.redis_client
+
+BENCH_ADMIN_TOKEN = "bench-admin-token"  # 压测应用的管理口令（/api/admin/*、/metrics）
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_redis_server():
+    """在本地随机端口启动一个临时 redis-server（不落盘），进程退出时一并结束"""
+    import atexit
+    import shutil
+    import subprocess
+
+    if not shutil.which("redis-server"):
+        return None
+    port = _free_port()
+    proc = subprocess.Popen(
+        ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    atexit.register(proc.terminate)
+    client = redis.Redis(port=port)
+    for _ in range(50):
+        try:
+            client.ping()
+            break
+        except redis.ConnectionError:
+            time.sleep(0.05)
+    return f"redis://127.0.0.1:{port}/0"
+
+
+def _free_cluster_port():
+    """集群节点的端口：总线端口固定为端口 + 10000，两者都要可用"""
+    while True:
+        port = _free_port()
+        if port + 10000 > 65535:
+            continue
+        with socket.socket() as s:
+            try:
+                s.bind(("127.0.0.1", port + 10000))
+            except OSError:
+                continue
+        return port
+
+
+def _wait_for_redis(port, check=None):
+    client = redis.Redis(port=port, decode_responses=True, socket_connect_timeout=0.5)
+    for _ in range(100):
+        try:
+            if check is None or check(client):
+                client.ping()
+                return
+        except redis.RedisError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"Redis 127.0.0.1:{port} 未能启动")
+
+
+def start_redis_cluster(nodes=3):
+    """
+    在本地随机端口启动一个 nodes 个主节点（无副本、不落盘）的临时 Redis Cluster，进程退出时一并结束。
+    返回 REDIS_CLUSTER_NODES 格式的地址（"host:port,..."）；没有 redis-server / redis-cli 时返回 None
+    """
+    import atexit
+    import shutil
+    import subprocess
+    import tempfile
+
+    if not shutil.which("redis-server") or not shutil.which("redis-cli"):
+        return None
+    workdir = tempfile.mkdtemp(prefix="netease-redis-cluster-")
+    ports = [_free_cluster_port() for _ in range(nodes)]
+    for port in ports:
+        proc = subprocess.Popen(
+            ["redis-server", "--port", str(port), "--cluster-enabled", "yes", "--dir", workdir,
+             "--cluster-config-file", f"nodes-{port}.conf", "--save", "", "--appendonly", "no"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        atexit.register(proc.terminate)
+    for port in ports:
+        _wait_for_redis(port)
+    addrs = [f"127.0.0.1:{port}" for port in ports]
+    subprocess.run(["redis-cli", "--cluster", "create", *addrs, "--cluster-replicas", "0", "--cluster-yes"],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for port in ports:
+        _wait_for_redis(port, lambda client: client.cluster("info")["cluster_state"] == "ok")
+    return ",".join(addrs)
+
+
+def start_redis_sentinel(service="mymaster"):
+    """
+    启动一个临时主节点及监控它的哨兵，返回 REDIS_SENTINELS 格式的哨兵地址；没有 redis-server 时返回 None
+    """
+    import atexit
+    import shutil
+    import subprocess
+    import tempfile
+
+    if not shutil.which("redis-server"):
+        return None
+    master_url = _start_redis_server()
+    master_port = int(master_url.rsplit(":", 1)[1].split("/")[0])
+    port = _free_port()
+    conf = os.path.join(tempfile.mkdtemp(prefix="netease-redis-sentinel-"), "sentinel.conf")
+    with open(conf, "w") as f:
+        f.write(f"port {port}\nsentinel monitor {service} 127.0.0.1 {master_port} 1\n")
+    proc = subprocess.Popen(["redis-server", conf, "--sentinel"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    atexit.register(proc.terminate)
+    _wait_for_redis(port, lambda client: client.sentinel_get_master_addr_by_name(service))
+    return f"127.0.0.1:{port}"
+
+
+def _start_fake_redis():
+    from fakeredis import TcpFakeServer
+    port = _free_port()
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    time.sleep(0.1)
+    return f"redis://127.0.0.1:{port}/0"
+
+
+def bench_redis_url():
+    """
+    依次尝试：BENCH_REDIS_URL、本机 redis-server 临时实例、fakeredis TCP 服务（都保留真实的网络往返）
+    """
+    return os.environ.get("BENCH_REDIS_URL") or _start_redis_server() or _start_fake_redis()
+
+
+def use_bench_redis():
+    """
+    连接 bench_redis_url() 并清空，返回的客户端会同时注入 utils.redis_client，供业务代码使用
+    """
+    url = bench_redis_url()
+    client = utils.redis_client.InstrumentedRedis.from_url(url, decode_responses=True)
+    client.flushdb()
+    utils.redis_client._redis_client = client
+    return client
+
+
+def report(name, count, seconds):
+    print(f"{name:<28} {count:>8} 条  {seconds:8.3f} s  {count / seconds:12.0f} 条/秒")
@@ -0,0 +1,209 @@
+# benchmarks/fake_netease.py
+"""
+本地的 music.163.com 替身：按 benchmarks/fixtures/ 中录制的响应结构返回数据，可配置延迟。
+覆盖本服务用到的全部上游接口；大歌单按 track.json 合成，响应字节预先序列化，避免替身本身成为瓶颈。
+weapi 请求体是加密的，无法得知轮询的是哪个 unikey，扫码状态按概率返回 801 / 802 / 803。
+单独运行（在仓库根目录）：python -m benchmarks.fake_netease [端口]
+"""
+import copy
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SONG_ID_BASE = 1_400_000_000
+USER_ID_BASE = 1_600_000_000
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def song_id_of(playlist_id, index):
+    """歌单中第 index 首歌的 ID（与压测客户端约定的合成规则）"""
+    return SONG_ID_BASE + (playlist_id % 1000) * 100_000 + index
+
+
+class FakeNetease:
+    """
+    响应生成与统计；latency / jitter 单位为秒，confirm_rate 为每次扫码状态查询返回 803 的概率
+    """
+
+    def __init__(self, latency=0.02, jitter=0.01, playlist_size=1000, confirm_rate=0.2, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.playlist_size = playlist_size
+        self.confirm_rate = confirm_rate
+        self.rng = random.Random(seed)
+        self.track = load_fixture("track.json")
+        self.account = load_fixture("account.json")
+        self.user_playlist = load_fixture("user_playlist.json")
+        self._lock = threading.Lock()
+        self._bodies = {}
+        self.requests = {}
+
+    def _cached(self, key, build):
+        body = self._bodies.get(key)
+        if body is None:
+            body = build()
+            with self._lock:
+                self._bodies[key] = body
+        return body
+
+    def count(self, path):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+    def make_track(self, song_id, index):
+        track = copy.deepcopy(self.track)
+        track["id"] = song_id
+        track["name"] = f"{self.track['name']} {index}"
+        track["duration"] = 120_000 + song_id % 240_000
+        track["album"]["id"] = song_id // 10
+        return track
+
+    def playlist_detail(self, playlist_id):
+        def build():
+            tracks = [self.make_track(song_id_of(playlist_id, i), i) for i in range(self.playlist_size)]
+            return _dumps({"code": 200, "result": {
+                "id": playlist_id,
+                "name": f"歌单 {playlist_id}",
+                "privacy": 0,
+                "trackCount": len(tracks),
+                "trackUpdateTime": 1740745689093,
+                "tracks": tracks
+            }})
+        return self._cached(("playlist", playlist_id), build)
+
+    def user_playlists(self, uid):
+        def build():
+            data = copy.deepcopy(self.user_playlist)
+            for playlist in data["playlist"]:
+                playlist["userId"] = uid
+                playlist["creator"]["userId"] = uid
+            return _dumps(data)
+        return self._cached(("user_playlist", uid), build)
+
+    def song_details(self, song_ids):
+        return _dumps({"code": 200, "songs": [self.make_track(song_id, song_id % 100_000) for song_id in song_ids]})
+
+    def account_for(self, user_id):
+        def build():
+            data = copy.deepcopy(self.account)
+            data["account"]["id"] = data["profile"]["userId"] = user_id
+            data["profile"]["nickname"] = f"bench-{user_id}"
+            return _dumps(data)
+        return self._cached(("account", user_id), build)
+
+    def login_status(self):
+        """返回 (响应字节, Set-Cookie 列表)"""
+        roll = self.rng.random()
+        if roll < self.confirm_rate:
+            user_id = USER_ID_BASE + self.rng.randrange(1_000_000)
+            cookies = [f"MUSIC_U=bench{user_id}; Path=/", f"__csrf={uuid.uuid4().hex}; Path=/"]
+            return _dumps({"code": 803, "message": "授权登录成功"}), cookies
+        if roll < (1 + self.confirm_rate) / 2:
+            return _dumps({"code": 802, "message": "授权中", "nickname": "云村用户"}), []
+        return _dumps({"code": 801, "message": "等待扫码"}), []
+
+
+class FakeNeteaseHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive，与上游连接池行为一致
+    disable_nagle_algorithm = True
+    fake = None  # FakeNetease，由 make_server 设置
+
+    def _send(self, body, status=200, cookies=()):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        for cookie in cookies:
+            self.send_header("Set-Cookie", cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path.rstrip("/")
+        fake = self.fake
+        fake.count(path)
+        fake.delay()
+
+        if path == "/weapi/login/qrcode/unikey":
+            return self._send(_dumps({"code": 200, "unikey": str(uuid.uuid4())}))
+        if path == "/weapi/login/qrcode/client/login":
+            body, cookies = fake.login_status()
+            return self._send(body, cookies=cookies)
+        if path == "/weapi/w/nuser/account/get":
+            cookie = self.headers.get("Cookie", "")
+            user_id = USER_ID_BASE
+            for part in cookie.split(";"):
+                name, _, value = part.strip().partition("=")
+                if name == "MUSIC_U" and value.startswith("bench"):
+                    user_id = int(value[5:])
+            return self._send(fake.account_for(user_id))
+        if path == "/api/user/playlist":
+            return self._send(fake.user_playlists(int(query.get("uid", ["0"])[0])))
+        if path == "/api/playlist/detail":
+            return self._send(fake.playlist_detail(int(query.get("id", ["0"])[0])))
+        if path == "/api/song/detail":
+            ids = json.loads(query.get("ids", ["[]"])[0])
+            return self._send(fake.song_details(ids))
+        if path == "/api/logout":
+            return self._send(_dumps({"code": 200}))
+        return self._send(_dumps({"code": 404, "msg": "not found"}), status=404)
+
+    def do_GET(self):
+        self._route()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self._route()
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    # 上千个并发连接同时建立时，默认的 listen 队列（5）会让连接超时重试
+    request_queue_size = 1024
+
+
+def make_server(port=0, **kwargs):
+    """
+    创建替身服务（未启动），kwargs 传给 FakeNetease；server.fake 可以读取请求统计
+    """
+    fake = FakeNetease(**kwargs)
+    handler = type("Handler", (FakeNeteaseHandler,), {"fake": fake})
+    server = _Server(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.fake = fake
+    return server
+
+
+def serve(port, **kwargs):
+    """在当前进程中阻塞运行（供 multiprocessing 启动）"""
+    make_server(port, **kwargs).serve_forever()
+
+
+if __name__ == "__main__":
+    server = make_server(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    print(f"fake music.163.com: http://127.0.0.1:{server.server_port}")
+    server.serve_forever()
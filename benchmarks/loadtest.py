@@ -0,0 +1,466 @@
+# benchmarks/loadtest.py
+"""
+离线压测：不依赖线上的 MySQL、Redis 与 music.163.com。
+- 数据库：默认 SQLite 文件（经 benchmarks.sqlite_compat 改写 MySQL 方言）；BENCH_DATABASE_URL 可指向一个已执行
+  netease_cloud.sql 与 migrations/ 的空 MySQL 库，得到与线上一致的结果
+- Redis：BENCH_REDIS_URL、本机 redis-server 临时实例或 fakeredis（见 benchmarks.common）
+- 上游：benchmarks.fake_netease，延迟可配置
+应用运行在独立进程（werkzeug 多线程），压测线程通过 HTTP 访问；结束后在本进程执行一次写回，统计 flush 耗时。
+结果输出为 JSON（--out），可以用 --compare 与之前的结果对比。
+
+用法（在仓库根目录）：
+    python -m benchmarks.loadtest --mix heartbeat --duration 30 --concurrency 32 --out results/heartbeat.json
+    python -m benchmarks.loadtest --mix mixed --compare results/mixed-baseline.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import redis
+import requests
+from sqlalchemy import text
+
+import utils.redis_client
+from benchmarks import sqlite_compat
+from benchmarks.common import BENCH_ADMIN_TOKEN, _free_port, bench_redis_url
+from benchmarks.fake_netease import USER_ID_BASE, serve as serve_fake_netease, song_id_of
+
+PLAYLIST_ID_BASE = 5_061_606_000
+HISTORY_SONGS = 50  # 预置的每个用户的播放记录数
+
+# 每种场景中各操作的权重
+MIXES = {
+    # 播放心跳为主，少量历史 / 续播进度查询
+    "heartbeat": {"heartbeat": 90, "history": 5, "positions": 5},
+    # 大量客户端同时扫码登录
+    "login": {"login": 100},
+    # 浏览大歌单：分页、附带续播进度、批量单曲详情
+    "playlist": {"playlist_show": 20, "playlist_detail": 60, "song_details": 20},
+    "mixed": {"heartbeat": 60, "history": 5, "positions": 5, "login": 5, "playlist_show": 5,
+              "playlist_detail": 15, "song_details": 5},
+}
+LOGIN_CODES = {800, 801, 802, 803}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="离线压测")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--duration", type=float, default=20, help="压测时长（秒）")
+    parser.add_argument("--warmup", type=float, default=3, help="预热时长（秒），不计入结果")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发客户端数")
+    parser.add_argument("--users", type=int, default=1000, help="预置用户数")
+    parser.add_argument("--playlists", type=int, default=20, help="歌单数")
+    parser.add_argument("--playlist-size", type=int, default=1000, help="每个歌单的曲目数")
+    parser.add_argument("--latency-ms", type=float, default=30, help="上游平均延迟")
+    parser.add_argument("--jitter-ms", type=float, default=10, help="上游延迟抖动")
+    parser.add_argument("--confirm-rate", type=float, default=0.2, help="每次扫码状态查询返回 803 的概率")
+    parser.add_argument("--login-poll-interval", type=float, default=1.0, help="客户端轮询 check_login 的间隔")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="结果 JSON 路径")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    return parser.parse_args(argv)
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError(f"端口 {port} 上的服务未能启动")
+
+
+def _inject_redis(redis_url):
+    utils.redis_client._redis_client = utils.redis_client.InstrumentedRedis.from_url(
+        redis_url, decode_responses=True)
+    utils.redis_client._async_redis_client = utils.redis_client.InstrumentedAsyncRedis.from_url(
+        redis_url, decode_responses=True)
+
+
+def _prepare_app(app):
+    from flask.logging import default_handler
+
+    from utils.db import db
+
+    # 只保留写 app_logs 的 handler，控制台输出会拖慢服务并淹没压测结果
+    app.logger.removeHandler(default_handler)
+    with app.app_context():
+        sqlite_compat.install(db.engine)
+        # create_app 期间可能已经建立了连接，丢弃后新连接才会带上改写钩子
+        db.engine.dispose()
+    return app
+
+
+def _make_app(config, redis_url):
+    from app import create_app
+
+    _inject_redis(redis_url)
+    return _prepare_app(create_app(config))
+
+
+def serve_app(port, config, redis_url):
+    """应用进程入口（multiprocessing spawn）"""
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    app = _make_app(config, redis_url)
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+
+def seed(app, users, seed_value):
+    """预置用户与播放记录（history / positions / with_progress 才有数据可查）"""
+    from utils.db import db
+
+    rng = random.Random(seed_value)
+    start_at = datetime.now() - timedelta(days=30)
+    with app.app_context():
+        sqlite_compat.create_schema(db.engine)
+        db.session.execute(text("""
+            INSERT INTO users (user_id, nickname, cookies, create_time, update_time)
+            VALUES (:user_id, :nickname, :cookies, :now, :now)
+        """), [{"user_id": USER_ID_BASE + i, "nickname": f"bench-{i}", "cookies": "{}", "now": start_at}
+               for i in range(users)])
+        rows = []
+        for i in range(users):
+            for j in range(HISTORY_SONGS):
+                rows.append({
+                    "user_id": USER_ID_BASE + i,
+                    "song_id": song_id_of(PLAYLIST_ID_BASE + j % 5, rng.randrange(1000)),
+                    "song_name": f"seed-{j}",
+                    "position": rng.uniform(0, 240),
+                    "duration": 240.0,
+                    "played_at": start_at + timedelta(seconds=rng.randrange(30 * 86400)),
+                })
+        db.session.execute(text("""
+            INSERT INTO play_logs (user_id, song_id, song_name, current_position, song_duration, played_at, update_time)
+            VALUES (:user_id, :song_id, :song_name, :position, :duration, :played_at, :played_at)
+            ON DUPLICATE KEY UPDATE song_name = VALUES(song_name)
+        """), rows)
+        db.session.commit()
+
+
+class Recorder:
+    """按接口记录每个请求的耗时；每个线程一份列表，结束时合并，记录时不加锁"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+        self.enabled = True
+
+    def _samples(self):
+        samples = getattr(self._local, "samples", None)
+        if samples is None:
+            samples = self._local.samples = []
+            with self._lock:
+                self._all.append(samples)
+        return samples
+
+    def record(self, label, seconds, ok):
+        if self.enabled:
+            self._samples().append((label, seconds, ok))
+
+    def reset(self):
+        with self._lock:
+            for samples in self._all:
+                samples.clear()
+
+    def samples(self):
+        with self._lock:
+            return [sample for samples in self._all for sample in samples]
+
+
+class Client:
+    """一个模拟客户端：固定的用户身份，心跳按歌曲进度推进"""
+
+    def __init__(self, base_url, args, recorder, rng, deadline):
+        self.base_url = base_url
+        self.deadline = deadline
+        self.args = args
+        self.recorder = recorder
+        self.rng = rng
+        self.session = requests.Session()
+        self.user_id = USER_ID_BASE + rng.randrange(args.users)
+        self.session.cookies.set("MUSIC_U", f"bench{self.user_id}")
+        self.session.cookies.set("__csrf", "bench")
+        self.song_id = None
+        self.position = 0.0
+
+    def request(self, label, method, path, ok_codes=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(method, self.base_url + path, timeout=60, **kwargs)
+            elapsed = time.perf_counter() - start
+            if resp.headers.get("Content-Type", "").startswith("application/json"):
+                body = resp.json()
+                ok = resp.status_code == 200 and body.get("code") in ok_codes
+            else:
+                body = None
+                ok = resp.status_code == 200
+        except (requests.RequestException, ValueError):
+            elapsed = time.perf_counter() - start
+            body, ok = None, False
+        self.recorder.record(label, elapsed, ok)
+        return body
+
+    def _playlist_id(self):
+        return PLAYLIST_ID_BASE + self.rng.randrange(self.args.playlists)
+
+    def heartbeat(self):
+        if self.song_id is None or self.position >= 240:
+            self.song_id = song_id_of(self._playlist_id(), self.rng.randrange(self.args.playlist_size))
+            self.position = 0.0
+        self.position += 15
+        self.request("POST /api/play_log/set", "POST", "/api/play_log/set", json={
+            "user_id": self.user_id, "song_id": self.song_id, "song_name": f"song-{self.song_id}",
+            "current_time": self.position, "duration": 240.0
+        })
+
+    def history(self):
+        self.request("GET /api/play_log/get", "GET", f"/api/play_log/get?user_id={self.user_id}&limit=50")
+
+    def positions(self):
+        playlist_id = self._playlist_id()
+        ids = ",".join(str(song_id_of(playlist_id, i)) for i in self.rng.sample(range(self.args.playlist_size), 100))
+        self.request("GET /api/play_log/positions", "GET", f"/api/play_log/positions?user_id={self.user_id}&ids={ids}")
+
+    def login(self):
+        start = time.perf_counter()
+        body = self.request("GET /api/user/qrcode", "GET", "/api/user/qrcode")
+        if not body or body.get("code") != 200:
+            return
+        unikey = body["data"]["unikey"]
+        while time.monotonic() < self.deadline:
+            body = self.request("GET /api/user/check_login", "GET", f"/api/user/check_login?unikey={unikey}",
+                                ok_codes=LOGIN_CODES)
+            if body and body.get("code") in (800, 803):
+                self.recorder.record("login flow (qrcode -> 803)", time.perf_counter() - start,
+                                     body.get("code") == 803)
+                return
+            time.sleep(self.args.login_poll_interval)
+
+    def playlist_show(self):
+        self.request("GET /api/playlist/show", "GET", f"/api/playlist/show?uid={self.user_id}")
+
+    def playlist_detail(self):
+        offset = self.rng.randrange(0, self.args.playlist_size, 100)
+        path = f"/api/playlist/detail?id={self._playlist_id()}&offset={offset}&limit=100"
+        if self.rng.random() < 0.3:
+            self.request("GET /api/playlist/detail?with_progress", "GET",
+                         f"{path}&with_progress=1&user_id={self.user_id}")
+        else:
+            self.request("GET /api/playlist/detail", "GET", path)
+
+    def song_details(self):
+        playlist_id = self._playlist_id()
+        ids = ",".join(str(song_id_of(playlist_id, i)) for i in self.rng.sample(range(self.args.playlist_size), 50))
+        self.request("GET /api/playlist/song_details", "GET", f"/api/playlist/song_details?ids={ids}")
+
+
+def run_clients(base_url, args, recorder, seconds):
+    mix = MIXES[args.mix]
+    actions, weights = list(mix), list(mix.values())
+    deadline = time.monotonic() + seconds
+
+    def worker(i):
+        rng = random.Random(args.seed * 1000 + i)
+        client = Client(base_url, args, recorder, rng, deadline)
+        while time.monotonic() < deadline:
+            getattr(client, rng.choices(actions, weights)[0])()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(samples, seconds):
+    by_label = {}
+    for label, elapsed, ok in samples:
+        by_label.setdefault(label, []).append((elapsed, ok))
+
+    endpoints = {}
+    for label, values in sorted(by_label.items()):
+        latencies = sorted(elapsed * 1000 for elapsed, _ in values)
+        endpoints[label] = {
+            "count": len(values),
+            "errors": sum(1 for _, ok in values if not ok),
+            "throughput": round(len(values) / seconds, 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 3),
+            "p50_ms": round(_percentile(latencies, 0.50), 3),
+            "p95_ms": round(_percentile(latencies, 0.95), 3),
+            "p99_ms": round(_percentile(latencies, 0.99), 3),
+            "max_ms": round(latencies[-1], 3),
+        }
+    requests_only = [v for k, v in endpoints.items() if not k.startswith("login flow")]
+    total = {
+        "count": sum(v["count"] for v in requests_only),
+        "errors": sum(v["errors"] for v in requests_only),
+        "throughput": round(sum(v["count"] for v in requests_only) / seconds, 2)
+    }
+    return endpoints, total
+
+
+def measure_flush(app):
+    """在本进程执行一次写回（threshold=0，写回全部未写回的心跳），返回耗时与条数"""
+    from modules.play_log.services import flush_redis_play_logs, play_log_flush_lag
+
+    with app.app_context():
+        pending = play_log_flush_lag()["pending"]
+        start = time.perf_counter()
+        result = flush_redis_play_logs(threshold_seconds=0).get_json()
+        seconds = time.perf_counter() - start
+    flushed = result.get("flushed", 0)
+    return {
+        "pending_keys": pending,
+        "flushed": flushed,
+        "seconds": round(seconds, 4),
+        "rows_per_second": round(flushed / seconds, 1) if seconds else None,
+        "ok": result.get("code") == 200
+    }
+
+
+def _server_stats(base_url):
+    stats = {}
+    for name in ("cache_stats", "upstream_stats", "flush_stats"):
+        try:
+            stats[name] = requests.get(f"{base_url}/api/admin/{name}", headers={"X-Admin-Token": BENCH_ADMIN_TOKEN},
+                                       timeout=10).json().get("data")
+        except (requests.RequestException, ValueError):
+            stats[name] = None
+    return stats
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    print(f"\n场景 {result['meta']['mix']}：{result['meta']['duration']} 秒，{result['meta']['concurrency']} 个并发客户端，"
+          f"数据库 {result['meta']['database']}")
+    print(f"{'接口':<44} {'请求数':>8} {'错误':>6} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for label, s in result["endpoints"].items():
+        print(f"{label:<44} {s['count']:>8} {s['errors']:>6} {s['throughput']:>9.1f} "
+              f"{s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f}")
+    total = result["total"]
+    print(f"{'合计':<44} {total['count']:>8} {total['errors']:>6} {total['throughput']:>9.1f}")
+    flush = result["flush"]
+    print(f"写回: {flush['pending_keys']} 个待写回 key，写回 {flush['flushed']} 条，耗时 {flush['seconds']:.3f} s")
+
+
+def print_comparison(result, baseline):
+    print(f"\n对比 {baseline['meta'].get('revision')}（{baseline['meta'].get('started_at')}）：")
+    print(f"{'接口':<44} {'req/s':>16} {'p50 ms':>18} {'p99 ms':>18}")
+
+    def change(old, new):
+        return f"{(new - old) / old * 100:+6.1f}%" if old else "   n/a"
+
+    for label, s in result["endpoints"].items():
+        old = baseline["endpoints"].get(label)
+        if not old:
+            continue
+        print(f"{label:<44} {s['throughput']:>8.1f} {change(old['throughput'], s['throughput'])} "
+              f"{s['p50_ms']:>10.2f} {change(old['p50_ms'], s['p50_ms'])} "
+              f"{s['p99_ms']:>10.2f} {change(old['p99_ms'], s['p99_ms'])}")
+    old_flush, new_flush = baseline.get("flush", {}), result["flush"]
+    if old_flush.get("seconds"):
+        print(f"写回耗时 {new_flush['seconds']:.3f} s {change(old_flush['seconds'], new_flush['seconds'])}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="netease-loadtest-")
+    database_url = os.environ.get("BENCH_DATABASE_URL") or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    redis_url = bench_redis_url()
+    redis.Redis.from_url(redis_url).flushdb()
+
+    ctx = multiprocessing.get_context("spawn")
+    fake_port, app_port = _free_port(), _free_port()
+    fake = ctx.Process(target=serve_fake_netease, args=(fake_port,), kwargs={
+        "latency": args.latency_ms / 1000, "jitter": args.jitter_ms / 1000, "playlist_size": args.playlist_size,
+        "confirm_rate": args.confirm_rate, "seed": args.seed
+    }, daemon=True)
+    fake.start()
+
+    config = {
+        "SQLALCHEMY_DATABASE_URI": database_url,
+        "NETEASE_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        # 写回只由本进程在压测结束后执行一次，便于单独统计耗时
+        "SCHEDULER_MODE": "standalone",
+        "PLAY_EVENT_SPOOL_DIR": os.path.join(workdir, "spool"),
+        "ADMIN_TOKEN": BENCH_ADMIN_TOKEN,
+    }
+    local_app = _make_app(dict(config, QRCODE_POOL_ENABLED=False), redis_url)
+    seed(local_app, args.users, args.seed)
+
+    server = ctx.Process(target=serve_app, args=(app_port, config, redis_url), daemon=True)
+    server.start()
+    try:
+        _wait_for_port(app_port)
+        base_url = f"http://127.0.0.1:{app_port}"
+        recorder = Recorder()
+        if args.warmup > 0:
+            run_clients(base_url, args, recorder, args.warmup)
+            recorder.reset()
+
+        started_at = datetime.now().isoformat(timespec="seconds")
+        start = time.perf_counter()
+        run_clients(base_url, args, recorder, args.duration)
+        elapsed = time.perf_counter() - start
+        recorder.enabled = False
+
+        endpoints, total = summarize(recorder.samples(), elapsed)
+        result = {
+            "meta": {
+                "mix": args.mix,
+                "duration": round(elapsed, 2),
+                "concurrency": args.concurrency,
+                "started_at": started_at,
+                "revision": _git_revision(),
+                "database": database_url.split(":", 1)[0],
+                "python": platform.python_version(),
+                "args": vars(args)
+            },
+            "endpoints": endpoints,
+            "total": total,
+            "server": _server_stats(base_url),
+            "flush": measure_flush(local_app)
+        }
+    finally:
+        server.terminate()
+        fake.terminate()
+
+    print_report(result)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(result, json.load(f))
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+        print(f"结果已保存到 {args.out}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
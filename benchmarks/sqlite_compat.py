@@ -0,0 +1,210 @@
+# benchmarks/sqlite_compat.py
+"""
+让业务代码里的 MySQL 方言 SQL 在 SQLite 上运行（只用于本地基准 / 压测，不用于线上）：
+- 执行前改写语句：INSERT IGNORE、ON DUPLICATE KEY UPDATE / VALUES(col)、IF / GREATEST / LEAST
+- 注册 FROM_UNIXTIME、UNIX_TIMESTAMP、NOW 函数
+- 按 migrations/ 的最终结构建表（索引、唯一键与线上一致）
+"""
+import re
+from datetime import datetime
+
+from sqlalchemy import event, text
+
+_ON_DUPLICATE = re.compile(r"ON\s+DUPLICATE\s+KEY\s+UPDATE", re.I)
+_VALUES_FN = re.compile(r"\bVALUES\((\w+)\)", re.I)
+_REWRITES = [
+    (re.compile(r"\bINSERT\s+IGNORE\s+INTO\b", re.I), "INSERT OR IGNORE INTO"),
+    (re.compile(r"\bIF\(", re.I), "IIF("),
+    (re.compile(r"\bGREATEST\(", re.I), "MAX("),
+    (re.compile(r"\bLEAST\(", re.I), "MIN("),
+]
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        nickname VARCHAR(100),
+        avatar_url VARCHAR(255),
+        cookies TEXT,
+        create_time DATETIME,
+        update_time DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS playlists (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id BIGINT UNIQUE,
+        playlist_data TEXT,
+        content_hash CHAR(64),
+        payload BLOB,
+        update_time DATETIME,
+        version BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_playlist_items (
+        user_id BIGINT NOT NULL,
+        playlist_id BIGINT NOT NULL,
+        sort_key DOUBLE NOT NULL,
+        update_time BIGINT,
+        track_update_time BIGINT,
+        content_hash CHAR(64) NOT NULL,
+        data TEXT NOT NULL,
+        created_version BIGINT NOT NULL,
+        version BIGINT NOT NULL,
+        deleted BOOLEAN NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, playlist_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_user_version ON user_playlist_items (user_id, version)",
+    """
+    CREATE TABLE IF NOT EXISTS playlist_track_state (
+        playlist_id BIGINT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        track_update_time BIGINT,
+        updated_at DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS playlist_tracks (
+        playlist_id BIGINT NOT NULL,
+        song_id BIGINT NOT NULL,
+        sort_key DOUBLE NOT NULL,
+        created_version BIGINT NOT NULL,
+        version BIGINT NOT NULL,
+        deleted BOOLEAN NOT NULL DEFAULT 0,
+        PRIMARY KEY (playlist_id, song_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_playlist_version ON playlist_tracks (playlist_id, version)",
+    """
+    CREATE TABLE IF NOT EXISTS play_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id BIGINT NOT NULL,
+        song_id BIGINT NOT NULL,
+        song_name VARCHAR(255),
+        current_position FLOAT NOT NULL DEFAULT 0,
+        song_duration FLOAT NOT NULL DEFAULT 0,
+        played_at DATETIME,
+        update_time DATETIME,
+        CONSTRAINT uniq_user_song UNIQUE (user_id, song_id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_user_played
+        ON play_logs (user_id, played_at, id, song_id, current_position, song_duration, song_name)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS app_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        level VARCHAR(50) NOT NULL,
+        message TEXT NOT NULL,
+        pathname VARCHAR(255),
+        funcname VARCHAR(100),
+        lineno INTEGER,
+        created_at DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_listening_stats (
+        user_id INTEGER PRIMARY KEY,
+        total_seconds DOUBLE NOT NULL DEFAULT 0,
+        play_count INTEGER NOT NULL DEFAULT 0,
+        completed_count INTEGER NOT NULL DEFAULT 0,
+        updated_at DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_song_stats (
+        user_id BIGINT NOT NULL,
+        song_id BIGINT NOT NULL,
+        play_count INTEGER NOT NULL DEFAULT 0,
+        listened_seconds DOUBLE NOT NULL DEFAULT 0,
+        completed_count INTEGER NOT NULL DEFAULT 0,
+        last_played_at DATETIME,
+        PRIMARY KEY (user_id, song_id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_user_top ON user_song_stats (user_id, play_count DESC, listened_seconds DESC)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS play_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event_id VARCHAR(32) NOT NULL UNIQUE,
+        user_id BIGINT NOT NULL,
+        song_id BIGINT NOT NULL,
+        event_type VARCHAR(16) NOT NULL,
+        position FLOAT NOT NULL DEFAULT 0,
+        duration FLOAT NOT NULL DEFAULT 0,
+        seek_from FLOAT,
+        occurred_at DATETIME NOT NULL,
+        created_at DATETIME
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_user_time ON play_events (user_id, occurred_at)",
+]
+
+
+def rewrite_mysql(statement):
+    """
+    把 MySQL 方言改写为 SQLite 3.35+ 的等价写法；ON DUPLICATE KEY UPDATE 之后的 VALUES(col) 改为 excluded.col
+    """
+    for pattern, repl in _REWRITES:
+        statement = pattern.sub(repl, statement)
+    match = _ON_DUPLICATE.search(statement)
+    if match:
+        head, tail = statement[:match.start()], statement[match.end():]
+        statement = head + "ON CONFLICT DO UPDATE SET" + _VALUES_FN.sub(r"excluded.\1", tail)
+    return statement
+
+
+def _datetime_str(value):
+    # 与 SQLAlchemy 在 SQLite 中保存 DateTime 的格式一致，便于直接比较
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _from_unixtime(ts):
+    return None if ts is None else _datetime_str(datetime.fromtimestamp(float(ts)))
+
+
+def _unix_timestamp(value):
+    return None if value is None else int(datetime.fromisoformat(value).timestamp())
+
+
+def _now():
+    return _datetime_str(datetime.now())
+
+
+def install(engine):
+    """
+    为 SQLite engine 注册改写钩子与函数，并开启 WAL（压测时多线程读写）；其它数据库直接返回
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        dbapi_conn.create_function("FROM_UNIXTIME", 1, _from_unixtime, deterministic=True)
+        dbapi_conn.create_function("UNIX_TIMESTAMP", 1, _unix_timestamp, deterministic=True)
+        dbapi_conn.create_function("NOW", 0, _now)
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        return rewrite_mysql(statement), parameters
+
+
+def create_schema(engine):
+    """
+    建表；SQLite 使用本文件的 DDL，MySQL 请先执行 netease_cloud.sql 与 migrations/
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for ddl in SCHEMA:
+            conn.execute(text(ddl))
@@ -0,0 +1,47 @@
+"""
+生产环境启动配置：gunicorn -c gunicorn.conf.py
+- preload_app：master 进程先导入并创建应用再 fork，worker 与 master 共享已加载的代码与只读内存页（copy-on-write），
+  worker 启动只需 fork，不再各自导入 Flask / SQLAlchemy / Redis 等模块
+- 预加载时 master 不启动后台线程；每个 worker 在 post_fork 中丢弃继承的数据库连接池，
+  启动本进程的进程内定时任务（二维码池等），集群级任务（写回播放日志、维护 app_logs）由 scheduler.py 单独运行
+- APP_MODE=asgi 时使用 uvicorn worker 运行 asgi.create_asgi_app（协程处理等待上游的接口）
+
+环境变量：BIND（默认 0.0.0.0:5000）、WEB_CONCURRENCY（worker 数，默认 CPU 核数 * 2 + 1）、
+GUNICORN_THREADS（同步模式每个 worker 的线程数，默认 8）、APP_MODE（wsgi / asgi）
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+
+if os.environ.get("APP_MODE", "wsgi") == "asgi":
+    wsgi_app = "asgi:create_asgi_app(start_background=False)"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "app:create_app(start_background=False)"
+    # 长轮询（login_wait / login_events）会占住线程，使用 gthread 而不是默认的单线程 sync worker
+    worker_class = "gthread"
+    threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# gthread / uvicorn worker 的 timeout 是 worker 心跳超时，不限制长轮询、SSE 等单个请求的时长
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+# 定期重启 worker，避免内存碎片持续增长；加抖动避免所有 worker 同时重启
+max_requests = 10000
+max_requests_jitter = 1000
+accesslog = "-"
+
+
+def _flask_app(server):
+    application = server.app.wsgi()
+    # ASGI 模式下加载的是 Starlette 应用，Flask 应用在 state.flask_app 上
+    return getattr(getattr(application, "state", None), "flask_app", application)
+
+
+def post_fork(server, worker):
+    from app import init_worker
+
+    init_worker(_flask_app(server))
@@ -0,0 +1,33 @@
+-- app_logs 按天分区 + (created_at, level, funcname) 索引 + 汇总表
+-- 分区键必须包含在主键中，因此主键改为 (id, created_at)
+-- 之后由定时任务 maintain_app_logs 负责预建新分区、压缩旧日志、删除过期分区
+
+UPDATE `app_logs` SET `created_at` = NOW() WHERE `created_at` IS NULL;
+
+ALTER TABLE `app_logs`
+  MODIFY `created_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (`id`, `created_at`) USING BTREE,
+  ADD INDEX `idx_created_level_func`(`created_at` ASC, `level` ASC, `funcname` ASC) USING BTREE;
+
+-- 存量数据全部落在 p20250228（可按实际数据调整边界），之后的每日分区由定时任务从 p_future 中拆出：
+-- 首次维护时把 2025-03-01 至今的数据按天拆分（早于保留期的部分合并为一个补齐分区并删除），数据按日期正常过期
+ALTER TABLE `app_logs` PARTITION BY RANGE (TO_DAYS(`created_at`)) (
+  PARTITION `p20250228` VALUES LESS THAN (TO_DAYS('2025-03-01')),
+  PARTITION `p_future` VALUES LESS THAN MAXVALUE
+);
+
+-- 低级别重复日志压缩后的计数汇总
+CREATE TABLE IF NOT EXISTS `app_log_rollups`  (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `day` date NOT NULL,
+  `level` varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL,
+  `funcname` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT NULL,
+  `template` varchar(512) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL COMMENT '数字替换为 # 后的消息',
+  `sample_message` text CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL,
+  `count` int NOT NULL DEFAULT 0,
+  `first_at` datetime NULL DEFAULT NULL,
+  `last_at` datetime NULL DEFAULT NULL,
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `idx_day_level_func`(`day` ASC, `level` ASC, `funcname` ASC) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
@@ -0,0 +1,7 @@
+-- playlists 改为 内容哈希 + zlib 压缩 payload 存储（payload 为上游返回的紧凑 JSON 字节）
+-- 执行后运行 `flask --app app:create_app migrate-playlist-storage` 转换存量记录（转换后 playlist_data 置空）
+
+ALTER TABLE `playlists`
+  MODIFY `playlist_data` longtext CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL COMMENT '旧格式，迁移后为空',
+  ADD COLUMN `content_hash` char(64) CHARACTER SET ascii COLLATE ascii_bin NULL DEFAULT NULL COMMENT '上游原始 JSON 字节的 sha256' AFTER `playlist_data`,
+  ADD COLUMN `payload` longblob NULL COMMENT 'zlib 压缩的上游原始 JSON 字节' AFTER `content_hash`;
@@ -0,0 +1,5 @@
+-- 播放历史按 (user_id, played_at) 倒序 keyset 分页，覆盖查询所需的全部列，避免 filesort 与回表
+-- 显式放入 id 作为第三列，ORDER BY played_at DESC, id DESC 直接走反向索引扫描
+
+ALTER TABLE `play_logs`
+  ADD INDEX `idx_user_played`(`user_id` ASC, `played_at` ASC, `id` ASC, `song_id`, `current_position`, `song_duration`, `song_name`) USING BTREE;
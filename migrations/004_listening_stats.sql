@@ -0,0 +1,22 @@
+-- 收听统计汇总表，flush_redis_play_logs 写回播放记录时在同一事务内增量更新
+-- 建表后运行 `flask --app app:create_app backfill-listening-stats` 按已有的 play_logs 回填
+
+CREATE TABLE `user_listening_stats`  (
+  `user_id` bigint NOT NULL,
+  `total_seconds` double NOT NULL DEFAULT 0 COMMENT '累计收听时长（秒）',
+  `play_count` int NOT NULL DEFAULT 0 COMMENT '播放次数',
+  `completed_count` int NOT NULL DEFAULT 0 COMMENT '播放到 90% 以上的次数',
+  `updated_at` datetime NULL DEFAULT NULL,
+  PRIMARY KEY (`user_id`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
+
+CREATE TABLE `user_song_stats`  (
+  `user_id` bigint NOT NULL,
+  `song_id` bigint NOT NULL,
+  `play_count` int NOT NULL DEFAULT 0,
+  `listened_seconds` double NOT NULL DEFAULT 0,
+  `completed_count` int NOT NULL DEFAULT 0,
+  `last_played_at` datetime NULL DEFAULT NULL,
+  PRIMARY KEY (`user_id`, `song_id`) USING BTREE,
+  INDEX `idx_user_top`(`user_id` ASC, `play_count` DESC, `listened_seconds` DESC) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
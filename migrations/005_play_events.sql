@@ -0,0 +1,18 @@
+-- 只追加的播放事件表，由 Redis Stream `play_events` 的消费组批量写入（PLAY_EVENTS_ENABLED = True 时启用）
+-- event_id 为流中的 ID，重复投递时 INSERT IGNORE 跳过
+
+CREATE TABLE `play_events`  (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `event_id` varchar(32) CHARACTER SET ascii COLLATE ascii_bin NOT NULL COMMENT 'Redis Stream ID',
+  `user_id` bigint NOT NULL,
+  `song_id` bigint NOT NULL,
+  `event_type` varchar(16) CHARACTER SET ascii COLLATE ascii_bin NOT NULL COMMENT 'start / heartbeat / pause / seek / stop',
+  `position` float NOT NULL DEFAULT 0 COMMENT '事件发生时的播放位置（秒）',
+  `duration` float NOT NULL DEFAULT 0 COMMENT '歌曲总时长（秒）',
+  `seek_from` float NULL DEFAULT NULL COMMENT 'seek 前的位置（秒）',
+  `occurred_at` datetime(3) NOT NULL,
+  `created_at` datetime NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `uniq_event_id`(`event_id` ASC) USING BTREE,
+  INDEX `idx_user_time`(`user_id` ASC, `occurred_at` ASC) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
@@ -0,0 +1,42 @@
+-- 歌单的规范化存储与增量同步（GET /api/playlist/changes）：
+-- playlists.version 为每个用户歌单列表的变更版本；user_playlist_items 按歌单 ID 存放列表中的每个歌单，
+-- playlist_tracks 存放公开歌单的曲目从属关系（请求歌单详情时同步），版本在 playlist_track_state 中。
+-- 每次同步只写入有变化的行，删除的歌单 / 曲目保留为墓碑（deleted = 1），增量接口按 version 返回变化。
+-- 存量用户在下一次刷新歌单时自动写入，无需单独迁移数据
+
+ALTER TABLE `playlists`
+  ADD COLUMN `version` bigint NOT NULL DEFAULT 0 COMMENT '歌单列表的变更版本，同步出变化时 +1' AFTER `payload`;
+
+CREATE TABLE `user_playlist_items`  (
+  `user_id` bigint NOT NULL,
+  `playlist_id` bigint NOT NULL,
+  `sort_key` double NOT NULL COMMENT '在列表中的顺序，调整顺序时只改动被移动的行',
+  `update_time` bigint NULL DEFAULT NULL COMMENT '上游 updateTime（毫秒）',
+  `track_update_time` bigint NULL DEFAULT NULL COMMENT '上游 trackUpdateTime（毫秒）',
+  `content_hash` char(64) CHARACTER SET ascii COLLATE ascii_bin NOT NULL COMMENT '歌单对象 canonical JSON 的 sha256',
+  `data` text CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL COMMENT '上游返回的歌单对象（紧凑 JSON）',
+  `created_version` bigint NOT NULL COMMENT '加入列表时的版本',
+  `version` bigint NOT NULL COMMENT '最近一次变化的版本',
+  `deleted` tinyint(1) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`, `playlist_id`) USING BTREE,
+  INDEX `idx_user_version`(`user_id` ASC, `version` ASC) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
+
+CREATE TABLE `playlist_track_state`  (
+  `playlist_id` bigint NOT NULL,
+  `version` bigint NOT NULL DEFAULT 0 COMMENT '曲目的变更版本，同步出变化时 +1',
+  `track_update_time` bigint NULL DEFAULT NULL COMMENT '最近一次同步的上游 trackUpdateTime（毫秒）',
+  `updated_at` datetime NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`playlist_id`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
+
+CREATE TABLE `playlist_tracks`  (
+  `playlist_id` bigint NOT NULL,
+  `song_id` bigint NOT NULL,
+  `sort_key` double NOT NULL COMMENT '在歌单中的顺序，调整顺序时只改动被移动的行',
+  `created_version` bigint NOT NULL COMMENT '加入歌单时的版本',
+  `version` bigint NOT NULL COMMENT '最近一次变化的版本',
+  `deleted` tinyint(1) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`playlist_id`, `song_id`) USING BTREE,
+  INDEX `idx_playlist_version`(`playlist_id` ASC, `version` ASC) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
@@ -0,0 +1,12 @@
+-- app_logs 维护任务已压缩过的日期：没有可合并日志的日期也会记录，之后不再重复扫描
+-- 已有汇总记录的日期视为已压缩
+
+CREATE TABLE IF NOT EXISTS `app_log_compacted_days`  (
+  `day` date NOT NULL,
+  `compacted_rows` int NOT NULL DEFAULT 0 COMMENT '压缩掉的日志条数',
+  `compacted_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`day`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+
+INSERT IGNORE INTO `app_log_compacted_days` (`day`, `compacted_rows`)
+SELECT DISTINCT `day`, 0 FROM `app_log_rollups`;
@@ -0,0 +1,289 @@
+import re
+from datetime import date, datetime, timedelta
+
+from flask import jsonify, request, current_app
+from sqlalchemy import text
+from modules.play_log.services import play_log_flush_lag
+from utils.auth import check_admin_token
+from utils.cache import get_cache_stats
+from utils.db import db
+from utils.metrics import REGISTRY
+from utils.upstream import get_upstream_client
+
+PARTITION_NAME = re.compile(r"^p(\d{8})$")
+MAX_PAGE_SIZE = 500
+
+
+def _parse_cursor(cursor):
+    """
+    游标格式：<created_at ISO 格式>,<id>
+    """
+    created_at, log_id = cursor.rsplit(",", 1)
+    return datetime.fromisoformat(created_at), int(log_id)
+
+
+def query_app_logs():
+    """
+    按 created_at 倒序分页查询 app_logs，使用 keyset 分页（before=<created_at>,<id>），
+    支持 level / funcname / since / until 过滤，依赖 (created_at, level, funcname) 索引与按天分区裁剪。
+    """
+    if not check_admin_token():
+        current_app.logger.warning("[query_app_logs] 管理口令校验失败")
+        return jsonify({"code": 403, "msg": "无权访问"})
+
+    try:
+        limit = max(1, min(int(request.args.get("limit", 100)), MAX_PAGE_SIZE))
+        conditions = []
+        params = {"limit": limit}
+
+        level = request.args.get("level")
+        if level:
+            levels = [lv.strip().upper() for lv in level.split(",") if lv.strip()]
+            placeholders = []
+            for i, lv in enumerate(levels):
+                params[f"level_{i}"] = lv
+                placeholders.append(f":level_{i}")
+            conditions.append(f"level IN ({', '.join(placeholders)})")
+
+        funcname = request.args.get("funcname")
+        if funcname:
+            conditions.append("funcname = :funcname")
+            params["funcname"] = funcname
+
+        since = request.args.get("since")
+        if since:
+            conditions.append("created_at >= :since")
+            params["since"] = datetime.fromisoformat(since)
+
+        until = request.args.get("until")
+        if until:
+            conditions.append("created_at < :until")
+            params["until"] = datetime.fromisoformat(until)
+
+        before = request.args.get("before")
+        if before:
+            params["before_at"], params["before_id"] = _parse_cursor(before)
+            conditions.append(
+                "(created_at < :before_at OR (created_at = :before_at AND id < :before_id))"
+            )
+    except (ValueError, TypeError) as e:
+        return jsonify({"code": 400, "msg": f"参数格式错误: {e}"})
+
+    try:
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = text(f"""
+            SELECT id, level, message, pathname, funcname, lineno, created_at
+            FROM app_logs
+            {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT :limit
+        """)
+        logs = [dict(row._mapping) for row in db.session.execute(sql, params)]
+
+        next_cursor = None
+        if len(logs) == limit:
+            last = logs[-1]
+            next_cursor = f"{last['created_at'].isoformat()},{last['id']}"
+        for log in logs:
+            log["created_at"] = log["created_at"].isoformat()
+
+        return jsonify({"code": 200, "data": {"logs": logs, "next": next_cursor}})
+    except Exception as e:
+        current_app.logger.error(f"[query_app_logs] 查询日志出现异常: {e}")
+        return jsonify({"code": 500, "msg": str(e)})
+
+
+def cache_stats():
+    """
+    返回各进程内缓存的命中 / 过期命中 / 未命中 / 刷新计数（仅当前进程）
+    """
+    if not check_admin_token():
+        return jsonify({"code": 403, "msg": "无权访问"})
+    return jsonify({"code": 200, "data": get_cache_stats()})
+
+
+def upstream_stats():
+    """
+    上游调用预算：各优先级的排队数、等待时间、拒绝次数，以及熔断器状态
+    """
+    if not check_admin_token():
+        return jsonify({"code": 403, "msg": "无权访问"})
+    client = get_upstream_client()
+    data = {"breaker": client.breaker.state}
+    if client.scheduler is not None:
+        data["scheduler"] = client.scheduler.stats()
+    async_client = None
+    try:
+        from utils.async_upstream import peek_async_upstream_client
+        async_client = peek_async_upstream_client()
+    except ImportError:
+        # 未安装 ASGI 模式的依赖（httpx）
+        pass
+    if async_client is not None:
+        data["async"] = {"breaker": async_client.breaker.state}
+        if async_client.scheduler is not None:
+            data["async"]["scheduler"] = async_client.scheduler.stats()
+    return jsonify({"code": 200, "data": data})
+
+
+def flush_stats():
+    """
+    播放日志写回延迟：各分片待写回数量、最早未写回心跳的时间、是否正在写回
+    """
+    if not check_admin_token():
+        return jsonify({"code": 403, "msg": "无权访问"})
+    return jsonify({"code": 200, "data": play_log_flush_lag()})
+
+
+def _list_day_partitions():
+    """
+    返回 app_logs 现有的按天分区 {date: 分区名}
+    """
+    rows = db.session.execute(text("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'app_logs' AND PARTITION_NAME IS NOT NULL
+    """))
+    partitions = {}
+    for (name,) in rows:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime.strptime(match.group(1), "%Y%m%d").date()] = name
+    return partitions
+
+
+def _partition_definition(day, end):
+    return f"PARTITION p{day:%Y%m%d} VALUES LESS THAN (TO_DAYS('{end:%Y-%m-%d}'))"
+
+
+def _ensure_future_partitions(partitions, today, days_ahead, retention_cutoff):
+    """
+    从 p_future 中拆出到 today + days_ahead 为止尚不存在的每日分区（只能在已有分区之后追加）。
+    最后一个分区与今天之间的空档（迁移后首次运行、维护任务停了几天）同样按天拆分，数据按日期正常过期；
+    空档中早于保留期的部分合并为一个以保留期前一天命名的补齐分区，随本次维护删除。返回新分区的日期
+    """
+    start = max(partitions) + timedelta(days=1) if partitions else today
+    new_days = []
+    definitions = []
+    if start < retention_cutoff:
+        catch_up = retention_cutoff - timedelta(days=1)
+        new_days.append(catch_up)
+        definitions.append(_partition_definition(catch_up, retention_cutoff))
+        start = retention_cutoff
+    day = start
+    while day <= today + timedelta(days=days_ahead):
+        new_days.append(day)
+        definitions.append(_partition_definition(day, day + timedelta(days=1)))
+        day += timedelta(days=1)
+    if not new_days:
+        return []
+
+    definitions.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+    db.session.execute(text(
+        f"ALTER TABLE app_logs REORGANIZE PARTITION p_future INTO ({', '.join(definitions)})"
+    ))
+    return new_days
+
+
+def _compact_day(day, levels, min_count):
+    """
+    把某一天内重复的低级别日志（数字归一化后消息相同）合并为 app_log_rollups 中的一条计数记录，
+    并在 app_log_compacted_days 中记下这一天（没有可合并的日志也记录，之后不再扫描）
+    """
+    params = {"start": day, "end": day + timedelta(days=1), "day": day, "min_count": min_count}
+    placeholders = []
+    for i, level in enumerate(levels):
+        params[f"level_{i}"] = level
+        placeholders.append(f":level_{i}")
+    level_in = ", ".join(placeholders)
+
+    db.session.execute(text(f"""
+        INSERT INTO app_log_rollups (day, level, funcname, template, sample_message, count, first_at, last_at)
+        SELECT :day, level, funcname, LEFT(REGEXP_REPLACE(message, '[0-9]+', '#'), 512) AS template,
+               MIN(message), COUNT(*), MIN(created_at), MAX(created_at)
+        FROM app_logs
+        WHERE created_at >= :start AND created_at < :end AND level IN ({level_in})
+        GROUP BY level, funcname, template
+        HAVING COUNT(*) >= :min_count
+    """), params)
+    result = db.session.execute(text(f"""
+        DELETE l FROM app_logs l
+        JOIN app_log_rollups r
+          ON r.day = :day AND r.level = l.level AND r.funcname <=> l.funcname
+         AND r.template = LEFT(REGEXP_REPLACE(l.message, '[0-9]+', '#'), 512)
+        WHERE l.created_at >= :start AND l.created_at < :end AND l.level IN ({level_in})
+    """), params)
+    db.session.execute(
+        text("INSERT INTO app_log_compacted_days (day, compacted_rows) VALUES (:day, :rows)"),
+        {"day": day, "rows": result.rowcount}
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def maintain_app_logs():
+    """
+    app_logs 维护任务：
+    1. 预建未来几天的每日分区
+    2. 把超过 LOG_COMPACT_AFTER_DAYS 天的重复低级别日志压缩为计数汇总
+    3. 删除超过 LOG_RETENTION_DAYS 天的分区
+    """
+    config = current_app.config
+    retention_days = config.get("LOG_RETENTION_DAYS", 30)
+    compact_after_days = config.get("LOG_COMPACT_AFTER_DAYS", 3)
+    levels = config.get("LOG_COMPACT_LEVELS", ("DEBUG",))
+    min_count = config.get("LOG_COMPACT_MIN_COUNT", 10)
+    days_ahead = config.get("LOG_PARTITION_DAYS_AHEAD", 3)
+
+    today = date.today()
+    retention_cutoff = today - timedelta(days=retention_days)
+    compact_cutoff = today - timedelta(days=compact_after_days)
+
+    try:
+        partitions = _list_day_partitions()
+        created = _ensure_future_partitions(partitions, today, days_ahead, retention_cutoff)
+        partitions.update({d: f"p{d:%Y%m%d}" for d in created})
+
+        # 已经压缩过的日期不再重复处理
+        compacted_days = {
+            row[0] for row in db.session.execute(
+                text("SELECT day FROM app_log_compacted_days WHERE day >= :start"),
+                {"start": retention_cutoff}
+            )
+        }
+        compacted_rows = 0
+        day = retention_cutoff
+        while day < compact_cutoff:
+            if day not in compacted_days:
+                compacted_rows += _compact_day(day, levels, min_count)
+            day += timedelta(days=1)
+
+        expired = [name for d, name in sorted(partitions.items()) if d < retention_cutoff]
+        if expired:
+            db.session.execute(text(f"ALTER TABLE app_logs DROP PARTITION {', '.join(expired)}"))
+            db.session.execute(
+                text("DELETE FROM app_log_rollups WHERE day < :cutoff"), {"cutoff": retention_cutoff}
+            )
+            db.session.execute(
+                text("DELETE FROM app_log_compacted_days WHERE day < :cutoff"), {"cutoff": retention_cutoff}
+            )
+            db.session.commit()
+
+        current_app.logger.info(
+            f"[maintain_app_logs] 新建分区 {len(created)} 个，压缩日志 {compacted_rows} 条，删除过期分区 {len(expired)} 个"
+        )
+        return {"created": len(created), "compacted": compacted_rows, "dropped": expired}
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"[maintain_app_logs] 维护 app_logs 出现异常: {e}")
+        raise
+
+
+def render_metrics():
+    """
+    Prometheus 文本格式的指标（本进程）；同样需要 X-Admin-Token
+    """
+    if not check_admin_token():
+        current_app.logger.warning("[render_metrics] 管理口令校验失败")
+        # 返回 403 状态码，抓取端才会把这次抓取记为失败
+        return jsonify({"code": 403, "msg": "无权访问"}), 403
+    return current_app.response_class(REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,26 @@
+from flask import Blueprint
+from .services import query_app_logs, cache_stats, upstream_stats, flush_stats, render_metrics
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+# Prometheus 约定的抓取路径，不带 /api/admin 前缀
+metrics_bp = Blueprint('metrics', __name__)
+
+@admin_bp.route('/logs', methods=['GET'])
+def logs():
+    return query_app_logs()
+
+@admin_bp.route('/cache_stats', methods=['GET'])
+def caches():
+    return cache_stats()
+
+@admin_bp.route('/upstream_stats', methods=['GET'])
+def upstream():
+    return upstream_stats()
+
+@admin_bp.route('/flush_stats', methods=['GET'])
+def flush():
+    return flush_stats()
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return render_metrics()
@@ -0,0 +1,95 @@
+"""
+播放日志写入接口的 asyncio 版本（ASGI 模式）：请求解析、写入的 Redis 命令与同步版本共用，
+只把 pipeline 换成 redis.asyncio。读取历史 / 统计 / 续播进度需要查询 MySQL，仍由同步视图处理。
+"""
+import time
+
+import redis
+from flask import current_app
+
+from utils.async_support import endpoint, json_response
+from utils.redis_client import get_async_redis_client
+from .events import add_events, stream_backlog_async
+from .services import (_count_event, _events_enabled, _flush_shards, _make_play_events, _parse_play_events,
+                       _parse_play_log_batch, _parse_single_play_log, _queue_play_logs, _record_play_log_summary,
+                       _shed_heartbeats, _spool_play_events, _write_result)
+
+
+async def _write_play_logs_async(entries, event_types=None, seek_froms=None):
+    """
+    _write_play_logs 的 asyncio 版本：一次 pipeline 往返写入播放记录（以及播放事件）
+    """
+    redis_client = get_async_redis_client()
+    pipe = redis_client.pipeline(transaction=False)
+    now = time.time()
+    _queue_play_logs(pipe, entries, now, _flush_shards())
+
+    if not _events_enabled():
+        await pipe.execute()
+        return True
+
+    events = _make_play_events(entries, event_types, seek_froms, now)
+    appended = _shed_heartbeats(events, await stream_backlog_async(redis_client))
+    add_events(pipe, appended, current_app.config.get("PLAY_EVENT_STREAM_MAXLEN", 1000000))
+
+    try:
+        await pipe.execute()
+    except redis.RedisError as e:
+        _spool_play_events(events, e)
+        return False
+    _count_event("appended", len(appended))
+    return True
+
+
+async def _read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+@endpoint
+async def set_play_log(request):
+    try:
+        entry, response = _parse_single_play_log(await _read_json(request))
+        if response is not None:
+            return json_response(response)
+        written = await _write_play_logs_async([entry])
+        _record_play_log_summary([entry])
+        return json_response(_write_result(written, "播放记录已缓存至Redis"))
+
+    except Exception as e:
+        current_app.logger.error(f"【错误】在 set_play_log 中出现异常: {str(e)}")
+        return json_response({"code": 500, "msg": str(e)})
+
+
+@endpoint
+async def set_play_logs_batch(request):
+    try:
+        entries, response = _parse_play_log_batch(await _read_json(request))
+        if response is not None:
+            return json_response(response)
+
+        written = await _write_play_logs_async(entries)
+        _record_play_log_summary(entries)
+        return json_response(_write_result(written, "播放记录已批量缓存至Redis", len(entries)))
+
+    except Exception as e:
+        current_app.logger.error(f"【错误】在 set_play_logs_batch 中出现异常: {str(e)}")
+        return json_response({"code": 500, "msg": str(e)})
+
+
+@endpoint
+async def set_play_events(request):
+    try:
+        entries, event_types, seek_froms, error = _parse_play_events(await _read_json(request))
+        if error is not None:
+            return json_response(error)
+
+        written = await _write_play_logs_async(entries, event_types, seek_froms)
+        _record_play_log_summary(entries)
+        return json_response(_write_result(written, "播放事件已记录", len(entries)))
+
+    except Exception as e:
+        current_app.logger.error(f"【错误】在 set_play_events 中出现异常: {str(e)}")
+        return json_response({"code": 500, "msg": str(e)})
@@ -0,0 +1,9 @@
+from utils.async_support import route
+from .async_services import set_play_log, set_play_logs_batch, set_play_events
+
+# 与 play_log_bp 相同的路径；未列出的接口（/get、/stats、/positions）由挂载的 Flask 应用处理
+routes = [
+    route('/api/play_log/set', set_play_log, methods=['POST']),
+    route('/api/play_log/set_batch', set_play_logs_batch, methods=['POST']),
+    route('/api/play_log/event', set_play_events, methods=['POST']),
+]
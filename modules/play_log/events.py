@@ -0,0 +1,181 @@
+import glob
+import json
+import os
+import threading
+import time
+
+import redis
+
+PLAY_EVENT_STREAM_KEY = "play_events"  # 播放事件流（Redis Stream）
+PLAY_EVENT_GROUP = "play_event_writers"  # 写库的消费组
+EVENT_TYPES = ("start", "heartbeat", "pause", "seek", "stop")
+EVENT_FIELDS = ("user_id", "song_id", "song_name", "type", "position", "duration", "seek_from", "ts")
+
+_spool_lock = threading.Lock()
+_backlog_lock = threading.Lock()
+_backlog = {"checked_at": 0.0, "length": 0}
+
+
+def make_event(user_id, song_id, song_name, position, duration, event_type="heartbeat", ts=None, seek_from=None):
+    """
+    构造一条事件（字段均为字符串，可直接 XADD）；ts 与同时写入的 play_log hash 的 last_update 一致
+    """
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"未知的事件类型: {event_type}")
+    return {
+        "user_id": str(user_id),
+        "song_id": str(song_id),
+        "song_name": song_name or "",
+        "type": event_type,
+        "position": str(position),
+        "duration": str(duration),
+        "seek_from": "" if seek_from is None else str(seek_from),
+        "ts": str(ts if ts is not None else time.time())
+    }
+
+
+def add_events(pipe, events, maxlen):
+    """
+    把事件加入 pipeline；MAXLEN ~ 为流长度的硬上限（超出时裁掉最旧的事件，保护 Redis 内存）
+    """
+    for event in events:
+        pipe.xadd(PLAY_EVENT_STREAM_KEY, event, maxlen=maxlen, approximate=True)
+
+
+def _cached_backlog(now, cache_seconds):
+    with _backlog_lock:
+        if now - _backlog["checked_at"] < cache_seconds:
+            return _backlog["length"]
+    return None
+
+
+def _store_backlog(now, length):
+    with _backlog_lock:
+        _backlog.update(checked_at=now, length=length)
+    return length
+
+
+def stream_backlog(redis_client, cache_seconds=1.0):
+    """
+    流中尚未写库的事件数（写库后会 XDEL，XLEN 即积压量），每个进程最多每 cache_seconds 秒查询一次
+    """
+    now = time.monotonic()
+    length = _cached_backlog(now, cache_seconds)
+    if length is not None:
+        return length
+    try:
+        length = redis_client.xlen(PLAY_EVENT_STREAM_KEY)
+    except redis.RedisError:
+        length = 0
+    return _store_backlog(now, length)
+
+
+async def stream_backlog_async(async_redis_client, cache_seconds=1.0):
+    """stream_backlog 的 asyncio 版本（与同步版本共用进程内缓存）"""
+    now = time.monotonic()
+    length = _cached_backlog(now, cache_seconds)
+    if length is not None:
+        return length
+    try:
+        length = await async_redis_client.xlen(PLAY_EVENT_STREAM_KEY)
+    except redis.RedisError:
+        length = 0
+    return _store_backlog(now, length)
+
+
+def ensure_group(redis_client):
+    try:
+        redis_client.xgroup_create(PLAY_EVENT_STREAM_KEY, PLAY_EVENT_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+# ---------- Redis 不可用时的本地日志 ----------
+
+def _spool_path(spool_dir, pid):
+    return os.path.join(spool_dir, f"events-{pid}.log")
+
+
+def spool_events(spool_dir, events):
+    """
+    Redis 不可用时把事件追加到本进程的本地日志文件（每行一个 JSON），恢复后由 replay_spool 重新写入流
+    """
+    os.makedirs(spool_dir, exist_ok=True)
+    lines = "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+    with _spool_lock:
+        with open(_spool_path(spool_dir, os.getpid()), "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner_pid(path, prefix):
+    try:
+        return int(os.path.basename(path)[len(prefix):].split("-", 1)[0].split(".", 1)[0])
+    except ValueError:
+        return None
+
+
+def _claim(path, spool_dir, me):
+    target = os.path.join(spool_dir, f"replay-{me}-{time.time_ns()}.log")
+    try:
+        with _spool_lock:
+            os.replace(path, target)
+    except FileNotFoundError:
+        # 已被其它进程认领
+        return None
+    return target
+
+
+def replay_spool(redis_client, spool_dir, maxlen, batch_size=1000):
+    """
+    把本进程（以及本机已退出进程）留下的本地日志重新写入事件流，返回写入的事件数。
+    先把文件改名为 replay-<本进程 pid>-*.log 再读取，改名之后新的事件写入新文件；
+    写入失败时把剩余事件写回该文件，下次重试。
+    """
+    if not os.path.isdir(spool_dir):
+        return 0
+
+    me = os.getpid()
+    for path in glob.glob(os.path.join(spool_dir, "events-*.log")):
+        pid = _owner_pid(path, "events-")
+        if pid is None or (pid != me and _pid_alive(pid)):
+            continue
+        _claim(path, spool_dir, me)
+
+    replayed = 0
+    for path in sorted(glob.glob(os.path.join(spool_dir, "replay-*.log"))):
+        pid = _owner_pid(path, "replay-")
+        if pid is None or (pid != me and _pid_alive(pid)):
+            # 其它进程正在重放
+            continue
+        if pid != me:
+            # 已退出进程没有重放完的文件，先改名认领，避免多个进程重复重放
+            path = _claim(path, spool_dir, me)
+            if path is None:
+                continue
+        with open(path, encoding="utf-8") as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        for i in range(0, len(events), batch_size):
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                add_events(pipe, events[i:i + batch_size], maxlen)
+                pipe.execute()
+            except Exception:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events[i:]))
+                raise
+            replayed += len(events[i:i + batch_size])
+        os.remove(path)
+    return replayed
@@ -10,3 +10,39 @@ class PlayLog(db.Model):
     current_time = db.Column('current_position', db.Float)
     duration = db.Column('song_duration', db.Float)
     played_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class UserListeningStats(db.Model):
+    """每个用户的收听汇总，flush_redis_play_logs 写回时增量更新"""
+    __tablename__ = 'user_listening_stats'
+    user_id = db.Column(db.BigInteger, primary_key=True)
+    total_seconds = db.Column(db.Float, default=0)
+    play_count = db.Column(db.Integer, default=0)
+    completed_count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class UserSongStats(db.Model):
+    """每个用户每首歌的播放次数与收听时长，用于 top 歌曲"""
+    __tablename__ = 'user_song_stats'
+    user_id = db.Column(db.BigInteger, primary_key=True)
+    song_id = db.Column(db.BigInteger, primary_key=True)
+    play_count = db.Column(db.Integer, default=0)
+    listened_seconds = db.Column(db.Float, default=0)
+    completed_count = db.Column(db.Integer, default=0)
+    last_played_at = db.Column(db.DateTime)
+
+
+class PlayEvent(db.Model):
+    """只追加的播放事件（start / heartbeat / pause / seek / stop），由事件流的消费者批量写入"""
+    __tablename__ = 'play_events'
+    id = db.Column(db.BigInteger, primary_key=True)
+    event_id = db.Column(db.String(32), unique=True)  # Redis Stream 中的 ID
+    user_id = db.Column(db.BigInteger)
+    song_id = db.Column(db.BigInteger)
+    event_type = db.Column(db.String(16))
+    position = db.Column(db.Float)
+    duration = db.Column(db.Float)
+    seek_from = db.Column(db.Float)
+    occurred_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1,191 +1,1117 @@
+import logging
+import os
+import random
+import socket
+import threading
 import time
-from flask import jsonify, request, current_app
-from sqlalchemy import text
+import zlib
+from datetime import datetime
+
+import redis
+from flask import jsonify, request, current_app, has_app_context
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import DataError, IntegrityError
 from utils.db import db
-from utils.redis_client import get_redis_client
+from utils.log import get_logger
+from utils.metrics import REGISTRY
+from utils.redis_client import get_redis_client, max_block_ms
+from utils.redis_lease import RedisLease
+from .events import (PLAY_EVENT_GROUP, PLAY_EVENT_STREAM_KEY, add_events, ensure_group, make_event, replay_spool,
+                     spool_events, stream_backlog)
+from .stats import query_listening_stats, update_listening_stats
 
-LOG_BUFFER = []  # 存储日志的临时列表
-LAST_FLUSH_TIME = 0
-FLUSH_INTERVAL = 60  # 间隔多少秒汇总一次
+PLAY_LOG_TTL = 24 * 3600  # Redis 中播放记录的过期时间
+# 播放记录相关的 key 都带分片号的 hash tag（如 play_log:{3}:<user_id>:<song_id>），分片号由 user_id 决定：
+# 同一用户的播放记录、用户索引与所在分片的待写回索引位于同一个 slot，集群模式下 Lua 脚本也能一次处理
+PLAY_LOG_KEY = "play_log:{{{shard}}}:{user_id}:{song_id}"  # 播放记录（HASH）
+PLAY_LOG_USER_KEY = "play_log_user:{{{shard}}}:{user_id}"  # 每个用户尚未写回的歌曲索引（ZSET，member 为 song_id，score 为 last_update）
+PLAY_LOG_DIRTY_KEY = "play_log_dirty:{{{shard}}}"  # 每个分片待写回的 key 索引（ZSET，score 为 last_update）
+FLUSH_LOCK_KEY = "play_log_flush_lock:{{{shard}}}"  # 每个分片的写回租约
+FLUSH_LAST_KEY = "play_log_flush_last:{{{shard}}}"  # 每个分片最近一次完成写回的时间
+PLAY_LOG_DEAD_KEY = "play_log_dead:{{{shard}}}"  # 每个分片无法写回的 key（ZSET，score 为移入时间），hash 保留到过期供排查
+MAX_HISTORY_PAGE_SIZE = 500
+MAX_TOP_SONGS = 100
+MAX_POSITION_IDS = 5000  # 单次查询续播进度的最大歌曲数
+POSITION_QUERY_CHUNK = 1000  # IN 列表的分块大小
+FLUSH_BATCH_SIZE = 500  # 每批写回的条数
+CLUSTER_FLUSH_SHARDS = 64  # 集群模式下 PLAY_LOG_FLUSH_SHARDS 的默认值：分片号即 hash tag，分片越多 slot 越分散
+LOG_SAMPLE_SIZE = 3  # 批量汇总日志中保留的示例条数
+LOG_SUMMARY_INTERVAL = 60  # 间隔多少秒汇总一次
 
-def set_play_log():
+logger = get_logger("play_log")
+# 每条心跳只累加计数，每隔 LOG_SUMMARY_INTERVAL 秒输出一条汇总（前 LOG_SAMPLE_SIZE 条作为示例）
+_play_log_summary = logger.aggregator("【批量日志】播放日志记录汇总", interval=LOG_SUMMARY_INTERVAL,
+                                   samples=LOG_SAMPLE_SIZE)
+
+# 写回各阶段耗时：lease（取得分片租约）、scan（取出待写回 key）、read（pipeline 读取 hash）、
+# write（收听统计 + 多行写库 + 提交）、unlink（条件删除）、total（一次 flush 的总耗时）
+FLUSH_STAGE_SECONDS = REGISTRY.histogram(
+    "play_log_flush_stage_duration_seconds", "播放日志写回各阶段耗时", ("stage",))
+FLUSH_ROWS = REGISTRY.counter("play_log_flushed_rows_total", "写回 MySQL 的播放记录数")
+PLAY_LOG_RECORDS = REGISTRY.counter("play_log_records_total", "写入 Redis 的播放记录数")
+
+_event_stats_lock = threading.Lock()
+EVENT_STATS = {"appended": 0, "shed": 0, "spooled": 0, "replayed": 0, "written": 0}  # 本进程的事件计数
+
+
+def _parse_id(value, name):
+    # JSON 数字或纯数字字符串；其它值（如 "abc"）写回时会让整批写库失败，在入口处拒绝
+    if isinstance(value, bool) or not (isinstance(value, int) or (isinstance(value, str) and value.isdigit())):
+        raise ValueError(f"{name} 必须是非负整数")
+    value = int(value)
+    if value < 0:
+        raise ValueError(f"{name} 必须是非负整数")
+    return value
+
+
+def _parse_number(value, name):
+    if isinstance(value, bool):
+        raise ValueError(f"{name} 必须是数字")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} 必须是数字") from None
+
+
+def _parse_play_log(data):
     """
-    将播放日志先存入Redis，减少频繁写数据库的压力。
+    从请求数据中取出一条播放记录，缺少必填字段时抛出 KeyError，字段类型不对时抛出 ValueError
     """
-    global LAST_FLUSH_TIME
+    return (
+        _parse_id(data['user_id'], "user_id"),
+        _parse_id(data['song_id'], "song_id"),
+        data.get('song_name', '') or '',
+        _parse_number(data['current_time'], "current_time"),
+        _parse_number(data['duration'], "duration")
+    )
 
+
+def _parse_single_play_log(data):
+    """
+    解析单条写入的请求体，返回 (entry, 需要直接返回的结果)
+    """
     try:
-        data = request.json
-        # 将“收到请求的数据”日志改为中文
-        # current_app.logger.debug(f"【调试】收到 set_play_log 请求，数据: {data}")
+        return _parse_play_log(data), None
+    except (KeyError, TypeError) as e:
+        current_app.logger.warning(f"【警告】set_play_log 请求缺少必填字段: {e}")
+        return None, {"code": 400, "msg": f"播放记录缺少必填字段: {e}"}
+    except ValueError as e:
+        current_app.logger.warning(f"【警告】set_play_log 请求字段格式错误: {e}")
+        return None, {"code": 400, "msg": f"播放记录格式错误: {e}"}
 
-        # 获取Redis连接
-        redis_client = get_redis_client()
 
-        user_id = data['user_id']
-        song_id = data['song_id']
-        song_name = data.get('song_name', '')
-        current_time_ = data['current_time']
-        duration = data['duration']
+def _flush_shards():
+    """
+    播放记录的分片数（PLAY_LOG_FLUSH_SHARDS），写入端与写回端必须一致；
+    未配置时单机 / 哨兵为 1，集群模式为 CLUSTER_FLUSH_SHARDS
+    """
+    if not has_app_context():
+        return 1
+    shards = current_app.config.get("PLAY_LOG_FLUSH_SHARDS")
+    if shards is None:
+        shards = CLUSTER_FLUSH_SHARDS if current_app.config.get("REDIS_MODE") == "cluster" else 1
+    return max(1, shards)
+
+
+def check_play_log_shards():
+    """
+    集群模式下分片数少于主节点数时，部分节点上没有任何播放记录（全部落在少数几个 slot 上），拒绝启动
+    """
+    if current_app.config.get("REDIS_MODE") != "cluster":
+        return
+    shards = _flush_shards()
+    primaries = len(get_redis_client().get_primaries())
+    if shards < primaries:
+        raise RuntimeError(
+            f"PLAY_LOG_FLUSH_SHARDS={shards} 少于 Redis 集群的主节点数 {primaries}，播放记录无法分布到所有节点；"
+            f"请调大（建议为节点数的数倍）后执行 rebuild-play-log-index"
+        )
+
+
+def _shard_of(user_id, shards):
+    # str() 让 JSON 中的数字与字符串形式的 user_id 落在同一分片
+    return zlib.crc32(str(user_id).encode()) % shards
+
+
+def _play_log_key(user_id, song_id, shards):
+    return PLAY_LOG_KEY.format(shard=_shard_of(user_id, shards), user_id=user_id, song_id=song_id)
+
+
+def _user_key(user_id, shards):
+    return PLAY_LOG_USER_KEY.format(shard=_shard_of(user_id, shards), user_id=user_id)
+
 
-        # Redis的Key，可以根据业务做更灵活的设计
-        key = f"play_log:{user_id}:{song_id}"
+def _dirty_key(shard):
+    return PLAY_LOG_DIRTY_KEY.format(shard=shard)
 
-        # 使用 hset 命令存储多个字段
-        redis_client.hset(key, "user_id", user_id)
-        redis_client.hset(key, "song_id", song_id)
-        redis_client.hset(key, "song_name", song_name)
-        redis_client.hset(key, "current_time", current_time_)
-        redis_client.hset(key, "duration", duration)
-        redis_client.hset(key, "last_update", time.time())  # 设置最后更新时间
 
+def _split_play_log_key(key):
+    """play_log key -> (user_id, song_id)，兼容不带分片号的旧 key"""
+    _, user_id, song_id = key.rsplit(":", 2)
+    return user_id, song_id
+
+
+def _events_enabled():
+    return has_app_context() and current_app.config.get("PLAY_EVENTS_ENABLED", False)
+
+
+def _count_event(name, n):
+    with _event_stats_lock:
+        EVENT_STATS[name] += n
+
+
+def _queue_play_logs(pipe, entries, now, shards):
+    """
+    把写入播放记录 hash 及两个索引的命令加入 pipeline（同步与 asyncio 的 pipeline 通用）
+    """
+    for user_id, song_id, song_name, current_time_, duration in entries:
+        shard = _shard_of(user_id, shards)
+        key = PLAY_LOG_KEY.format(shard=shard, user_id=user_id, song_id=song_id)
+        pipe.hset(key, mapping={
+            "user_id": user_id,
+            "song_id": song_id,
+            "song_name": song_name,
+            "current_time": current_time_,
+            "duration": duration,
+            "last_update": now  # 设置最后更新时间
+        })
+        # 这段心跳的起始进度（写回后 hash 被删除，下一段重新记录），写回时据此区分继续播放与重新播放
+        pipe.hsetnx(key, "start_position", current_time_)
         # 设置Key的过期时间为1天（可选）
-        redis_client.expire(key, 24 * 3600)
-
-        # === 记录到内存 LOG_BUFFER，用于定期做批量汇总日志 ===
-        LOG_BUFFER.append((user_id, song_id, song_name, current_time_, duration))
-
-        now = time.time()
-        # 如果超过指定时间（FLUSH_INTERVAL）才真正批量输出一次
-        if now - LAST_FLUSH_TIME >= FLUSH_INTERVAL:
-            # 将日志改为中文
-            log_message = (
-                f"【批量日志】在过去 {FLUSH_INTERVAL} 秒内，共有 {len(LOG_BUFFER)} 条播放日志被记录。"
-                f"示例(前3条): {LOG_BUFFER[:3]}"
-            )
-            current_app.logger.info(log_message)
+        pipe.expire(key, PLAY_LOG_TTL)
+        # 记录到待写回索引，flush 时只需按 score 范围取出过期的 key
+        pipe.zadd(_dirty_key(shard), {key: now})
+        # 记录到用户索引，查询播放历史时不需要扫描 keyspace
+        user_key = PLAY_LOG_USER_KEY.format(shard=shard, user_id=user_id)
+        pipe.zadd(user_key, {song_id: now})
+        pipe.expire(user_key, PLAY_LOG_TTL)
+
+
+def _make_play_events(entries, event_types, seek_froms, now):
+    event_types = event_types or ["heartbeat"] * len(entries)
+    seek_froms = seek_froms or [None] * len(entries)
+    # ts 与 hash 的 last_update 相同，消费者写库后据此判断 hash 能否删除
+    return [
+        make_event(*entry, event_type=event_type, ts=now, seek_from=seek_from)
+        for entry, event_type, seek_from in zip(entries, event_types, seek_froms)
+    ]
+
+
+def _shed_heartbeats(events, backlog):
+    """
+    积压过多时丢弃心跳事件（最新进度仍写入 hash，由 flush 写回），只保留 start / pause / seek / stop
+    """
+    if backlog < current_app.config.get("PLAY_EVENT_STREAM_HIGH_WATER", 200000):
+        return events
+    appended = [event for event in events if event["type"] != "heartbeat"]
+    _count_event("shed", len(events) - len(appended))
+    return appended
+
+
+def _spool_play_events(events, error):
+    spool_events(current_app.config.get("PLAY_EVENT_SPOOL_DIR", "spool/play_events"), events)
+    _count_event("spooled", len(events))
+    current_app.logger.error(f"【错误】Redis 不可用，{len(events)} 条播放事件已写入本地日志: {error}")
+
+
+def _write_play_logs(entries, event_types=None, seek_froms=None):
+    """
+    用一个 pipeline 把多条播放记录写入 Redis（一次往返）；开启 PLAY_EVENTS_ENABLED 时同时追加到播放事件流。
+    event_types / seek_froms 与 entries 一一对应，默认均为 heartbeat。
+    Redis 不可用且开启了事件流时，事件写入本地日志，返回 False；正常写入返回 True。
+    """
+    redis_client = get_redis_client()
+    pipe = redis_client.pipeline(transaction=False)
+    now = time.time()
+    _queue_play_logs(pipe, entries, now, _flush_shards())
 
-            # 清空列表，更新时间
-            LOG_BUFFER.clear()
-            LAST_FLUSH_TIME = now
+    if not _events_enabled():
+        pipe.execute()
+        return True
+
+    events = _make_play_events(entries, event_types, seek_froms, now)
+    appended = _shed_heartbeats(events, stream_backlog(redis_client))
+    add_events(pipe, appended, current_app.config.get("PLAY_EVENT_STREAM_MAXLEN", 1000000))
+
+    try:
+        pipe.execute()
+    except redis.RedisError as e:
+        _spool_play_events(events, e)
+        return False
+    _count_event("appended", len(appended))
+    return True
+
+
+def _record_play_log_summary(entries):
+    """
+    累计播放日志条数，每隔 LOG_SUMMARY_INTERVAL 秒输出一次汇总日志（线程安全）
+    """
+    PLAY_LOG_RECORDS.inc(amount=len(entries))
+    _play_log_summary.add(len(entries), entries)
+    if logger.enabled(logging.DEBUG):
+        # 按 user_id 确定性采样，被选中用户的每条播放记录都会输出，便于跟踪单个用户
+        rate = current_app.config.get("PLAY_LOG_DEBUG_SAMPLE_RATE", 0.01)
+        for entry in entries:
+            logger.sample(rate, entry[0]).debug("【调试】收到播放记录", entry=entry)
 
-        return jsonify({"code": 200, "msg": "播放记录已缓存至Redis"})
+
+def _parse_play_log_batch(data):
+    """
+    解析批量写入的请求体（播放记录数组，或 {"logs": [...]}），返回 (entries, 需要直接返回的结果)
+    """
+    if isinstance(data, dict):
+        data = data.get('logs')
+    if not isinstance(data, list):
+        current_app.logger.warning("【警告】set_play_logs_batch 请求体不是数组。")
+        return None, {"code": 400, "msg": "请求体应为播放记录数组"}
+    if not data:
+        return None, {"code": 200, "msg": "没有需要缓存的播放记录", "count": 0}
+
+    entries = []
+    for idx, item in enumerate(data):
+        try:
+            entries.append(_parse_play_log(item))
+        except (KeyError, TypeError):
+            current_app.logger.warning(f"【警告】set_play_logs_batch 第 {idx} 条记录缺少必填字段。")
+            return None, {"code": 400, "msg": f"第 {idx} 条播放记录缺少必填字段"}
+        except ValueError as e:
+            current_app.logger.warning(f"【警告】set_play_logs_batch 第 {idx} 条记录格式错误: {e}")
+            return None, {"code": 400, "msg": f"第 {idx} 条播放记录格式错误: {e}"}
+    return entries, None
+
+
+def _parse_play_events(data):
+    """
+    解析播放事件请求体（单个事件、事件数组或 {"events": [...]}），返回 (entries, event_types, seek_froms, 错误结果)
+    """
+    if isinstance(data, dict):
+        data = data.get('events', [data])
+    if not isinstance(data, list) or not data:
+        return None, None, None, {"code": 400, "msg": "请求体应为播放事件或事件数组"}
+
+    entries, event_types, seek_froms = [], [], []
+    for idx, item in enumerate(data):
+        try:
+            item = dict(item)
+            item.setdefault('current_time', item.get('position'))
+            if item['current_time'] is None:
+                return None, None, None, {"code": 400, "msg": f"第 {idx} 条播放事件缺少 position"}
+            entry = _parse_play_log(item)
+            event_type = item.get('type', 'heartbeat')
+            make_event(*entry, event_type=event_type)
+        except (KeyError, TypeError, ValueError) as e:
+            current_app.logger.warning(f"【警告】set_play_events 第 {idx} 条事件格式错误: {e}")
+            return None, None, None, {"code": 400, "msg": f"第 {idx} 条播放事件格式错误: {e}"}
+        entries.append(entry)
+        event_types.append(event_type)
+        seek_froms.append(item.get('seek_from'))
+    return entries, event_types, seek_froms, None
+
+
+def _write_result(written, msg, count=None):
+    result = {"code": 200, "msg": msg if written else "Redis 不可用，播放事件已写入本地日志"}
+    if count is not None:
+        result["count"] = count
+    return result
+
+
+def set_play_log():
+    """
+    将播放日志先存入Redis，减少频繁写数据库的压力。
+    """
+    try:
+        entry, response = _parse_single_play_log(request.json)
+        if response is not None:
+            return jsonify(response)
+        written = _write_play_logs([entry])
+        _record_play_log_summary([entry])
+        return jsonify(_write_result(written, "播放记录已缓存至Redis"))
 
     except Exception as e:
         current_app.logger.error(f"【错误】在 set_play_log 中出现异常: {str(e)}")
         return jsonify({"code": 500, "msg": str(e)})
 
 
+def set_play_logs_batch():
+    """
+    批量写入播放记录（离线补传、多标签页），所有记录在一次 Redis 往返内写入。
+    请求体为播放记录数组，或 {"logs": [...]}。
+    """
+    try:
+        entries, response = _parse_play_log_batch(request.json)
+        if response is not None:
+            return jsonify(response)
+
+        written = _write_play_logs(entries)
+        _record_play_log_summary(entries)
+        return jsonify(_write_result(written, "播放记录已批量缓存至Redis", len(entries)))
+
+    except Exception as e:
+        current_app.logger.error(f"【错误】在 set_play_logs_batch 中出现异常: {str(e)}")
+        return jsonify({"code": 500, "msg": str(e)})
+
+
+def set_play_events():
+    """
+    上报播放事件（start / heartbeat / pause / seek / stop），请求体为单个事件、事件数组或 {"events": [...]}。
+    每个事件：user_id、song_id、type、position（或 current_time）、duration，可选 song_name、seek_from（seek 前的位置）。
+    最新进度照常写入 Redis hash，事件追加到播放事件流，由消费者批量写入 play_events。
+    """
+    try:
+        entries, event_types, seek_froms, error = _parse_play_events(request.json)
+        if error is not None:
+            return jsonify(error)
+
+        written = _write_play_logs(entries, event_types, seek_froms)
+        _record_play_log_summary(entries)
+        return jsonify(_write_result(written, "播放事件已记录", len(entries)))
+
+    except Exception as e:
+        current_app.logger.error(f"【错误】在 set_play_events 中出现异常: {str(e)}")
+        return jsonify({"code": 500, "msg": str(e)})
+
+
+def _parse_history_cursor(cursor):
+    """
+    游标格式：<played_at ISO 格式>,<id>；尚未写回的记录 id 为 -song_id
+    """
+    played_at, log_id = cursor.rsplit(",", 1)
+    return datetime.fromisoformat(played_at), int(log_id)
+
+
+def _adjusted_position(current_time_, duration):
+    # 超过 90% 时长视为播放完毕，进度归零
+    return 0 if current_time_ >= duration * 0.9 else current_time_
+
+
+def _query_db_history(user_id, limit, before):
+    """
+    基于 (user_id, played_at, id, ...) 覆盖索引按 played_at 倒序的 keyset 查询
+    """
+    params = {"user_id": user_id, "limit": limit}
+    condition = ""
+    if before:
+        params["before_at"], params["before_id"] = before
+        # 冗余的 played_at <= :before_at 让优化器直接按索引范围扫描
+        condition = (
+            "AND played_at <= :before_at "
+            "AND (played_at < :before_at OR (played_at = :before_at AND id < :before_id))"
+        )
+    sql = text(f"""
+        SELECT
+            id,
+            song_id,
+            song_name,
+            CASE
+                WHEN current_position >= song_duration * 0.9 THEN 0
+                ELSE current_position
+            END AS adjusted_current_time,
+            song_duration,
+            played_at
+        FROM play_logs
+        WHERE user_id = :user_id {condition}
+        ORDER BY played_at DESC, id DESC
+        LIMIT :limit
+    """).columns(played_at=db.DateTime)
+    return [dict(row._mapping) for row in db.session.execute(sql, params)]
+
+
+def _query_redis_history(redis_client, user_id, limit, before):
+    """
+    通过用户索引读取尚未写回 MySQL 的播放记录，返回按 (played_at, id) 倒序的前 limit 条，
+    以及该用户所有未写回的 song_id（其在 MySQL 中的旧记录需要被覆盖）
+    """
+    shards = _flush_shards()
+    pending = redis_client.zrevrange(_user_key(user_id, shards), 0, -1, withscores=True)
+    pending_songs = {int(song_id) for song_id, _ in pending}
+
+    candidates = []
+    for song_id, score in pending:
+        item_key = (datetime.fromtimestamp(score), -int(song_id))
+        if before is None or item_key < before:
+            candidates.append((item_key, int(song_id)))
+    candidates.sort(reverse=True)
+    candidates = candidates[:limit]
+
+    pipe = redis_client.pipeline(transaction=False)
+    for _, song_id in candidates:
+        pipe.hgetall(_play_log_key(user_id, song_id, shards))
+    logs = []
+    for ((played_at, log_id), song_id), data in zip(candidates, pipe.execute()):
+        if not data:
+            # 已写回并删除，MySQL 中的记录会被查到
+            pending_songs.discard(song_id)
+            continue
+        current_time_ = float(data.get("current_time", 0))
+        duration = float(data.get("duration", 0))
+        logs.append({
+            "id": log_id,
+            "song_id": song_id,
+            "song_name": data.get("song_name", ""),
+            "adjusted_current_time": _adjusted_position(current_time_, duration),
+            "song_duration": duration,
+            "played_at": played_at
+        })
+    return logs, pending_songs
+
+
 def get_play_logs():
     """
-    从MySQL获取播放日志示例
+    按 played_at 倒序分页查询播放历史（before=<played_at>,<id> 的 keyset 分页），
+    并合并 Redis 中尚未写回的最新进度
     """
     try:
         user_id = request.args.get('user_id')
 
         # 将“收到请求”的日志改为中文
-        current_app.logger.debug(f"【调试】收到 get_play_logs 请求，user_id={user_id}")
+        logger.debug("【调试】收到 get_play_logs 请求", user_id=user_id)
 
         if not user_id:
             current_app.logger.warning("【警告】get_play_logs 缺少 user_id 参数。")
             return jsonify({"code": 400, "msg": "缺少 user_id 参数"})
 
-        sql = text("""
-            SELECT
-                song_id,
-                song_name,
-                CASE
-                    WHEN current_position >= song_duration * 0.9 THEN 0
-                    ELSE current_position
-                END AS adjusted_current_time,
-                song_duration,
-                played_at
-            FROM play_logs
-            WHERE user_id = :user_id
-            ORDER BY played_at DESC
-            LIMIT 100
-        """)
-
-        result = db.session.execute(sql, {'user_id': user_id})
-        logs = [dict(row._mapping) for row in result]
+        try:
+            user_id = int(user_id)
+            limit = max(1, min(int(request.args.get("limit", 100)), MAX_HISTORY_PAGE_SIZE))
+            before = request.args.get("before")
+            before = _parse_history_cursor(before) if before else None
+        except (ValueError, TypeError) as e:
+            return jsonify({"code": 400, "msg": f"参数格式错误: {e}"})
+
+        # 各多取一条用于判断是否还有下一页
+        redis_logs, pending_songs = _query_redis_history(get_redis_client(), user_id, limit + 1, before)
+        # 再多取 len(pending_songs) 条，抵消被 Redis 中新进度覆盖的旧记录
+        db_logs = [
+            log for log in _query_db_history(user_id, limit + 1 + len(pending_songs), before)
+            if log["song_id"] not in pending_songs
+        ]
+
+        logs = sorted(redis_logs + db_logs, key=lambda log: (log["played_at"], log["id"]), reverse=True)
+        next_cursor = None
+        if len(logs) > limit:
+            logs = logs[:limit]
+            last = logs[-1]
+            next_cursor = f"{last['played_at'].isoformat()},{last['id']}"
+        for log in logs:
+            del log["id"]
 
         current_app.logger.info(f"【信息】成功查询到 user_id={user_id} 的播放日志，共 {len(logs)} 条。")
 
-        return jsonify({"code": 200, "data": logs})
+        return jsonify({"code": 200, "data": logs, "next": next_cursor})
     except Exception as e:
         current_app.logger.error(f"【错误】在 get_play_logs 中出现异常: {str(e)}")
         return jsonify({"code": 500, "msg": str(e)})
 
 
-def flush_redis_play_logs(threshold_seconds=30):
+def get_resume_positions(user_id, song_ids):
     """
-    将Redis里的播放日志写回MySQL。
-    threshold_seconds: 距离上次更新超过多少秒，才视为需要写回
+    批量查询续播进度，返回 {song_id: {"current_time", "adjusted_current_time", "song_duration"}}，
+    没有记录的歌曲不在结果中。MySQL 走 uniq_user_song 索引按 IN 分块查询，
+    再用用户索引找出 Redis 中尚未写回的歌曲，一次 pipeline 读取并覆盖。
+    """
+    song_ids = list(dict.fromkeys(int(song_id) for song_id in song_ids))
+    if not song_ids:
+        return {}
+
+    positions = {}
+    sql = text("""
+        SELECT song_id, current_position, song_duration
+        FROM play_logs
+        WHERE user_id = :user_id AND song_id IN :song_ids
+    """).bindparams(bindparam("song_ids", expanding=True))
+    for i in range(0, len(song_ids), POSITION_QUERY_CHUNK):
+        chunk = song_ids[i:i + POSITION_QUERY_CHUNK]
+        for row in db.session.execute(sql, {"user_id": user_id, "song_ids": chunk}):
+            positions[row.song_id] = (row.current_position, row.song_duration)
+
+    redis_client = get_redis_client()
+    shards = _flush_shards()
+    wanted = set(song_ids)
+    pending = [
+        int(song_id) for song_id in redis_client.zrange(_user_key(user_id, shards), 0, -1)
+        if int(song_id) in wanted
+    ]
+    if pending:
+        pipe = redis_client.pipeline(transaction=False)
+        for song_id in pending:
+            pipe.hmget(_play_log_key(user_id, song_id, shards), "current_time", "duration")
+        for song_id, (current_time_, duration) in zip(pending, pipe.execute()):
+            if current_time_ is not None and duration is not None:
+                positions[song_id] = (float(current_time_), float(duration))
+
+    return {
+        song_id: {
+            "current_time": current_time_,
+            "adjusted_current_time": _adjusted_position(current_time_, duration),
+            "song_duration": duration
+        }
+        for song_id, (current_time_, duration) in positions.items()
+    }
+
+
+def get_positions():
+    """
+    批量续播进度：GET ?user_id=&ids=1,2,3 或 POST {"user_id": ..., "ids": [...]}
     """
     try:
-        # 可以改成中文
-        print("【信息】开始执行 flush_redis_play_logs")
-        redis_client = get_redis_client()
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            user_id, raw_ids = data.get('user_id'), data.get('ids') or []
+        else:
+            user_id = request.args.get('user_id')
+            raw_ids = [i for i in request.args.get('ids', '').split(',') if i.strip()]
+        if not user_id:
+            current_app.logger.warning("【警告】get_positions 缺少 user_id 参数。")
+            return jsonify({"code": 400, "msg": "缺少 user_id 参数"})
+        user_id = int(user_id)
+        song_ids = [int(i) for i in raw_ids]
+    except (ValueError, TypeError) as e:
+        return jsonify({"code": 400, "msg": f"参数格式错误: {e}"})
+    if len(song_ids) > MAX_POSITION_IDS:
+        return jsonify({"code": 400, "msg": f"一次最多查询 {MAX_POSITION_IDS} 首歌曲"})
+
+    try:
+        positions = get_resume_positions(user_id, song_ids)
+        return jsonify({"code": 200, "data": {str(song_id): pos for song_id, pos in positions.items()}})
+    except Exception as e:
+        current_app.logger.error(f"【错误】在 get_positions 中出现异常: {str(e)}")
+        return jsonify({"code": 500, "msg": str(e)})
+
+
+def get_listening_stats():
+    """
+    返回用户的收听统计：总时长、播放次数、播完次数与播完率、播放次数最多的 top 首歌。
+    统计在 flush_redis_play_logs 写回时增量维护，这里只读汇总表。
+    """
+    user_id = request.args.get('user_id')
+    if not user_id:
+        current_app.logger.warning("【警告】get_listening_stats 缺少 user_id 参数。")
+        return jsonify({"code": 400, "msg": "缺少 user_id 参数"})
+    try:
+        user_id = int(user_id)
+        top = max(0, min(int(request.args.get("top", 10)), MAX_TOP_SONGS))
+    except (ValueError, TypeError) as e:
+        return jsonify({"code": 400, "msg": f"参数格式错误: {e}"})
+
+    try:
+        stats = query_listening_stats(user_id, top)
+        if stats is None:
+            stats = {
+                "user_id": user_id, "total_seconds": 0.0, "play_count": 0, "completed_count": 0,
+                "completion_rate": 0.0, "updated_at": None, "top_songs": []
+            }
+        return jsonify({"code": 200, "data": stats})
+    except Exception as e:
+        current_app.logger.error(f"【错误】在 get_listening_stats 中出现异常: {str(e)}")
+        return jsonify({"code": 500, "msg": str(e)})
+
+
+# 仅当 last_update 与写回时读到的一致才删除，避免误删 flush 期间到达的新心跳。
+# 一次处理同一分片的一批 key：KEYS[1] 为待写回索引，之后每两个为（播放记录，用户索引），
+# ARGV 每两个为（读到的 last_update，song_id）；所有 key 带同一个 hash tag，集群模式下也在同一个 slot
+_UNLINK_IF_UNCHANGED = """
+local removed = 0
+for i = 2, #KEYS, 2 do
+    local last_update = redis.call('HGET', KEYS[i], 'last_update')
+    if last_update == false or last_update == ARGV[i - 1] then
+        redis.call('UNLINK', KEYS[i])
+        redis.call('ZREM', KEYS[1], KEYS[i])
+        redis.call('ZREM', KEYS[i + 1], ARGV[i])
+        removed = removed + 1
+    end
+end
+return removed
+"""
+_unlink_script = None
+
+
+def _get_unlink_script(redis_client):
+    global _unlink_script
+    if _unlink_script is None:
+        _unlink_script = redis_client.register_script(_UNLINK_IF_UNCHANGED)
+    return _unlink_script
+
 
-        pattern = "play_log:*"
-        keys = redis_client.keys(pattern)
-        now_ts = time.time()
+def _unlink_unchanged(redis_client, shard, items):
+    """
+    条件删除同一分片中已写回的播放记录，items 为 [(key, 读到的 last_update)]；
+    集群模式下 pipeline 不能执行脚本，每个分片直接调用一次
+    """
+    keys = [_dirty_key(shard)]
+    args = []
+    for key, last_update in items:
+        user_id, song_id = _split_play_log_key(key)
+        keys += [key, PLAY_LOG_USER_KEY.format(shard=shard, user_id=user_id)]
+        args += [last_update, song_id]
+    _get_unlink_script(redis_client)(keys=keys, args=args, client=redis_client)
+
+
+def _upsert_play_logs(rows):
+    """
+    用一条多行 INSERT ... ON DUPLICATE KEY UPDATE 写回一批播放记录。
+    只有不早于已有记录的进度才会覆盖（本地日志重放的旧事件不会覆盖新进度），played_at 最后更新。
+    """
+    values = []
+    params = {}
+    for i, row in enumerate(rows):
+        values.append(
+            f"(:user_id_{i}, :song_id_{i}, :song_name_{i}, :current_position_{i}, :song_duration_{i}, "
+            f"FROM_UNIXTIME(:played_at_{i}), NOW())"
+        )
+        params[f"user_id_{i}"] = row["user_id"]
+        params[f"song_id_{i}"] = row["song_id"]
+        params[f"song_name_{i}"] = row.get("song_name", "")
+        params[f"current_position_{i}"] = row.get("current_time", "0")
+        params[f"song_duration_{i}"] = row.get("duration", "0")
+        # played_at 取最后一次心跳时间，与合并 Redis 记录时的排序一致
+        params[f"played_at_{i}"] = int(float(row.get("last_update") or time.time()))
+
+    sql = text(f"""
+        INSERT INTO play_logs
+            (user_id, song_id, song_name, current_position, song_duration, played_at, update_time)
+        VALUES
+            {", ".join(values)}
+        ON DUPLICATE KEY UPDATE
+            song_name        = IF(VALUES(played_at) >= IFNULL(played_at, VALUES(played_at)),
+                                  VALUES(song_name), song_name),
+            current_position = IF(VALUES(played_at) >= IFNULL(played_at, VALUES(played_at)),
+                                  VALUES(current_position), current_position),
+            song_duration    = IF(VALUES(played_at) >= IFNULL(played_at, VALUES(played_at)),
+                                  VALUES(song_duration), song_duration),
+            update_time      = VALUES(update_time),
+            played_at        = GREATEST(IFNULL(played_at, VALUES(played_at)), VALUES(played_at))
+    """)
+    db.session.execute(sql, params)
+
+
+# 由某一行数据本身引起的写库错误（非数字的 ID、外键不存在、超出列范围等），重试不会成功
+_ROW_ERRORS = (ValueError, TypeError, DataError, IntegrityError)
+
+
+def _write_play_log_rows(rows):
+    try:
+        with FLUSH_STAGE_SECONDS.time("write"):
+            # 统计增量依赖写回前的进度，需在 upsert 之前、同一事务内计算
+            update_listening_stats(rows)
+            _upsert_play_logs(rows)
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _write_play_log_rows_one_by_one(rows, keys, shard):
+    """
+    整批写库因某一行的数据失败时逐条重试，返回写不进去的 key；其它异常（数据库不可用等）照常抛出
+    """
+    dead = []
+    for row, key in zip(rows, keys):
+        try:
+            _write_play_log_rows([row])
+        except _ROW_ERRORS as e:
+            current_app.logger.error(f"【错误】分片 {shard} 的播放记录 {key} 无法写回MySQL，移入死信索引: {e}")
+            dead.append(key)
+    return dead
+
+
+def _dead_letter(redis_client, shard, keys):
+    """把无法写回的 key 从待写回索引移到死信索引，之后的写回不再被它卡住"""
+    dead_key = PLAY_LOG_DEAD_KEY.format(shard=shard)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zadd(dead_key, {key: time.time() for key in keys})
+    pipe.expire(dead_key, PLAY_LOG_TTL)
+    pipe.zrem(_dirty_key(shard), *keys)
+    pipe.execute()
 
-        current_app.logger.debug(f"【调试】执行 flush_redis_play_logs，共找到 {len(keys)} 个匹配 {pattern} 的Key。")
 
+def _flush_play_log_batch(redis_client, keys, shard):
+    """
+    写回同一分片的一批 key：pipeline 读取 -> 单事务内更新收听统计并多行写库 -> 一次脚本调用条件删除。
+    某一行的数据导致整批失败时逐条重试，写不进去的 key 移入死信索引。返回写回的条数。
+    """
+    with FLUSH_STAGE_SECONDS.time("read"):
+        pipe = redis_client.pipeline(transaction=False)
         for key in keys:
-            data = redis_client.hgetall(key)
-            if not data:
-                continue
+            pipe.hgetall(key)
+        hashes = pipe.execute()
+
+    rows = []
+    row_keys = []
+    snapshot = []  # (key, 读到的 last_update)
+    for key, data in zip(keys, hashes):
+        snapshot.append((key, data.get("last_update", "")))
+        # 已过期或数据不完整的 key 不写库，只从索引中移除
+        if data and "user_id" in data and "song_id" in data:
+            rows.append(data)
+            row_keys.append(key)
+
+    dead = []
+    if rows:
+        try:
+            _write_play_log_rows(rows)
+        except _ROW_ERRORS as e:
+            current_app.logger.warning(f"【警告】分片 {shard} 本批 {len(rows)} 条写回失败，逐条重试: {e}")
+            dead = _write_play_log_rows_one_by_one(rows, row_keys, shard)
+        FLUSH_ROWS.inc(amount=len(rows) - len(dead))
+
+    # 写库成功后，删除Redis中的key
+    with FLUSH_STAGE_SECONDS.time("unlink"):
+        if dead:
+            _dead_letter(redis_client, shard, dead)
+            dead_keys = set(dead)
+            snapshot = [item for item in snapshot if item[0] not in dead_keys]
+        if snapshot:
+            _unlink_unchanged(redis_client, shard, snapshot)
+    return len(rows) - len(dead)
+
+
+def _flush_shard(redis_client, shard, cutoff, batch_size, lease):
+    """
+    写回一个分片中早于 cutoff 的 key，每批之后续约；租约丢失（例如写库过慢）时停止。
+    返回 (写回条数, 批数)
+    """
+    dirty_key = _dirty_key(shard)
+    flushed = 0
+    batches = 0
+    while True:
+        with FLUSH_STAGE_SECONDS.time("scan"):
+            keys = redis_client.zrangebyscore(dirty_key, "-inf", cutoff, start=0, num=batch_size)
+        if not keys:
+            break
+        try:
+            flushed += _flush_play_log_batch(redis_client, keys, shard)
+            batches += 1
+        except Exception as e:
+            # 数据库不可用等与数据无关的失败：记录日志，key 仍在索引中，下次定时任务还会再尝试写回
+            current_app.logger.error(
+                f"【错误】分片 {shard} 写回MySQL失败，本批 {len(keys)} 个key，异常信息={str(e)}"
+            )
+            break
+        if len(keys) < batch_size:
+            break
+        if not lease.renew():
+            current_app.logger.warning(f"【警告】分片 {shard} 的写回租约已丢失，停止本轮写回。")
+            break
+    redis_client.set(FLUSH_LAST_KEY.format(shard=shard), time.time())
+    return flushed, batches
+
 
-            # 解码 Redis 返回的 bytes -> str (Python3)
-            decoded = {k: v for k, v in data.items()}
+def flush_redis_play_logs(threshold_seconds=None, batch_size=FLUSH_BATCH_SIZE):
+    """
+    将Redis里的播放日志写回MySQL。
+    threshold_seconds: 距离上次更新超过多少秒，才视为需要写回
+    播放记录按 user_id 的哈希分为 PLAY_LOG_FLUSH_SHARDS 片，每片由 Redis 租约保证同一时间只有一个进程写回；
+    各进程从随机的分片开始依次尝试，多个 worker 可以并行写回互不相交的分片。
+    """
+    started = time.perf_counter()
+    try:
+        redis_client = get_redis_client()
+        config = current_app.config
+        if threshold_seconds is None:
+            threshold_seconds = config.get("PLAY_LOG_FLUSH_THRESHOLD", 30)
+        lease_ttl = config.get("PLAY_LOG_FLUSH_LEASE_TTL", 120)
+        shards = _flush_shards()
+        cutoff = time.time() - threshold_seconds
+        flushed = 0
+        batches = 0
+        owned = []
 
-            last_update_str = decoded.get("last_update", "0")
+        start = random.randrange(shards)
+        for shard in [(start + i) % shards for i in range(shards)]:
+            lease = RedisLease(redis_client, FLUSH_LOCK_KEY.format(shard=shard), lease_ttl)
+            with FLUSH_STAGE_SECONDS.time("lease"):
+                acquired = lease.acquire()
+            if not acquired:
+                # 其它进程正在写回该分片
+                continue
             try:
-                last_update = float(last_update_str)
-            except ValueError:
-                last_update = 0
-
-            # 判断是否超过写回阈值
-            if (now_ts - last_update) >= threshold_seconds:
-                try:
-                    user_id = decoded["user_id"]
-                    song_id = decoded["song_id"]
-                    song_name = decoded.get("song_name", "")
-                    current_time_ = decoded.get("current_time", "0")
-                    duration = decoded.get("duration", "0")
-
-                    # 中文日志
-                    current_app.logger.debug(
-                        f"【写回操作】即将写回 key={key} 到数据库: user_id={user_id}, song_id={song_id}, "
-                        f"current_time={current_time_}, duration={duration}"
-                    )
-
-                    # 写回数据库
-                    sql = text("""
-                        INSERT INTO play_logs 
-                            (user_id, song_id, song_name, current_position, song_duration, played_at, update_time)
-                        VALUES 
-                            (:user_id, :song_id, :song_name, :current_position, :song_duration, NOW(), NOW())
-                        ON DUPLICATE KEY UPDATE 
-                            song_name        = VALUES(song_name),
-                            current_position = VALUES(current_position),
-                            song_duration    = VALUES(song_duration),
-                            played_at        = VALUES(played_at),
-                            update_time      = VALUES(update_time)
-                    """)
-                    db.session.execute(sql, {
-                        'user_id': user_id,
-                        'song_id': song_id,
-                        'song_name': song_name,
-                        'current_position': current_time_,
-                        'song_duration': duration
-                    })
-                    db.session.commit()
-
-                    # 写库成功后，删除Redis中的key
-                    redis_client.delete(key)
-                    current_app.logger.info(f"【成功】key={key} 已写回数据库，并从Redis删除。")
-                    print("【成功】写回并删除 Redis 中的 key=", key)
-                except Exception as e:
-                    # 写库失败，就记录日志
-                    current_app.logger.error(f"【错误】写回MySQL失败，key={key}，异常信息={str(e)}")
-                    # 若不删除 key，下次定时任务还会再尝试写回
-
-        current_app.logger.info("【信息】flush_redis_play_logs 执行完毕！")
-        return jsonify({"code": 200, "msg": "flush_redis_play_logs 执行完毕"})
+                shard_flushed, shard_batches = _flush_shard(redis_client, shard, cutoff, batch_size, lease)
+            finally:
+                lease.release()
+            flushed += shard_flushed
+            batches += shard_batches
+            owned.append(shard)
+
+        current_app.logger.info(
+            f"【信息】flush_redis_play_logs 执行完毕，处理分片 {owned}，共 {batches} 批，写回 {flushed} 条。"
+        )
+        return jsonify({"code": 200, "msg": "flush_redis_play_logs 执行完毕", "flushed": flushed, "shards": owned})
 
     except Exception as e:
         current_app.logger.error(f"【错误】在 flush_redis_play_logs 中出现异常: {str(e)}")
         return jsonify({"code": 500, "msg": str(e)})
+    finally:
+        FLUSH_STAGE_SECONDS.observe(time.perf_counter() - started, "total")
+
+
+def _insert_play_events(event_rows):
+    """
+    批量追加到 play_events；event_id 为流中的 ID，重复投递的事件被 INSERT IGNORE 跳过
+    """
+    db.session.execute(text("""
+        INSERT IGNORE INTO play_events
+            (event_id, user_id, song_id, event_type, position, duration, seek_from, occurred_at)
+        VALUES
+            (:event_id, :user_id, :song_id, :event_type, :position, :duration, :seek_from, :occurred_at)
+    """), event_rows)
+
+
+def _write_event_batch(redis_client, messages):
+    """
+    一批流消息：同一事务内追加 play_events、更新收听统计与 play_logs 最新进度，提交后 XACK + XDEL，
+    并删除 last_update 未变化的 play_log hash（最新进度已写库）。返回写入的事件数。
+    """
+    event_rows = []
+    latest = {}  # (user_id, song_id) -> 该批中最新的一条，用于更新 play_logs
+    started = set()  # 该批中有 start 事件的 (user_id, song_id)，收听统计计为新的一次播放
+    for event_id, fields in messages:
+        try:
+            ts = float(fields["ts"])
+            row = {
+                "event_id": event_id,
+                "user_id": int(fields["user_id"]),
+                "song_id": int(fields["song_id"]),
+                "event_type": fields["type"],
+                "position": float(fields["position"]),
+                "duration": float(fields["duration"]),
+                "seek_from": float(fields["seek_from"]) if fields.get("seek_from") else None,
+                "occurred_at": datetime.fromtimestamp(ts)
+            }
+        except (KeyError, TypeError, ValueError):
+            # 已被删除（字段为空）或格式错误的消息直接确认掉
+            continue
+        event_rows.append(row)
+        key = (row["user_id"], row["song_id"])
+        if row["event_type"] == "start":
+            started.add(key)
+        if key not in latest or ts >= float(latest[key]["last_update"]):
+            latest[key] = {
+                "user_id": row["user_id"],
+                "song_id": row["song_id"],
+                "song_name": fields.get("song_name", ""),
+                "current_time": row["position"],
+                "duration": row["duration"],
+                "last_update": fields["ts"]
+            }
+
+    for key in started:
+        latest[key]["started"] = True
+
+    if event_rows:
+        try:
+            _insert_play_events(event_rows)
+            rows = list(latest.values())
+            update_listening_stats(rows)
+            _upsert_play_logs(rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    ids = [event_id for event_id, _ in messages]
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.xack(PLAY_EVENT_STREAM_KEY, PLAY_EVENT_GROUP, *ids)
+    # 写库后删除，流长度即为积压量
+    pipe.xdel(PLAY_EVENT_STREAM_KEY, *ids)
+    pipe.execute()
+
+    shards = _flush_shards()
+    by_shard = {}
+    for row in latest.values():
+        shard = _shard_of(row["user_id"], shards)
+        key = PLAY_LOG_KEY.format(shard=shard, user_id=row["user_id"], song_id=row["song_id"])
+        by_shard.setdefault(shard, []).append((key, row["last_update"]))
+    for shard, items in by_shard.items():
+        _unlink_unchanged(redis_client, shard, items)
+    _count_event("written", len(event_rows))
+    return len(event_rows)
+
+
+def consume_play_events(consumer=None, block_ms=None, max_seconds=None):
+    """
+    以消费组方式把播放事件写入 MySQL，可以有多个消费者并行。
+    先接管其它消费者超过 PLAY_EVENT_CLAIM_IDLE 秒未确认的事件（消费者崩溃或写库失败），再读取新事件。
+    block_ms 为 None 时读空即返回（定时任务），否则阻塞等待新事件直到 max_seconds 秒。返回写入的事件数。
+    """
+    config = current_app.config
+    redis_client = get_redis_client()
+    ensure_group(redis_client)
+    consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+    batch_size = config.get("PLAY_EVENT_BATCH_SIZE", 500)
+    claim_idle = int(config.get("PLAY_EVENT_CLAIM_IDLE", 60) * 1000)
+    deadline = None if max_seconds is None else time.monotonic() + max_seconds
+    written = 0
+
+    try:
+        next_id = "0-0"
+        while True:
+            next_id, claimed = redis_client.xautoclaim(
+                PLAY_EVENT_STREAM_KEY, PLAY_EVENT_GROUP, consumer, claim_idle, next_id, count=batch_size
+            )[:2]
+            if claimed:
+                written += _write_event_batch(redis_client, claimed)
+            if next_id == "0-0":
+                break
+
+        while deadline is None or time.monotonic() < deadline:
+            resp = redis_client.xreadgroup(
+                PLAY_EVENT_GROUP, consumer, {PLAY_EVENT_STREAM_KEY: ">"}, count=batch_size,
+                block=max_block_ms(block_ms)
+            )
+            if not resp or not resp[0][1]:
+                if block_ms is None:
+                    break
+                continue
+            written += _write_event_batch(redis_client, resp[0][1])
+    except Exception as e:
+        # 未确认的事件留在 pending 列表中，超时后会被重新接管
+        current_app.logger.error(f"【错误】写入播放事件失败，consumer={consumer}，异常信息={str(e)}")
+
+    if written:
+        current_app.logger.info(f"【信息】consume_play_events 写入 {written} 条播放事件。")
+    return written
+
+
+def replay_play_event_spool():
+    """
+    把 Redis 不可用期间写入本地日志的事件重新写入事件流（每个 web 进程定时执行）
+    """
+    config = current_app.config
+    try:
+        replayed = replay_spool(
+            get_redis_client(),
+            config.get("PLAY_EVENT_SPOOL_DIR", "spool/play_events"),
+            config.get("PLAY_EVENT_STREAM_MAXLEN", 1000000)
+        )
+    except (redis.RedisError, OSError) as e:
+        current_app.logger.warning(f"【警告】重放本地播放事件失败，稍后重试: {e}")
+        return 0
+    if replayed:
+        _count_event("replayed", replayed)
+        current_app.logger.info(f"【信息】已把 {replayed} 条本地播放事件重新写入事件流。")
+    return replayed
+
+
+def play_log_flush_lag():
+    """
+    写回延迟指标：每个分片待写回的 key 数、最早一次未写回心跳距今的秒数、上次完成写回距今的秒数、死信 key 数
+    """
+    redis_client = get_redis_client()
+    shards = _flush_shards()
+    pipe = redis_client.pipeline(transaction=False)
+    for shard in range(shards):
+        dirty_key = _dirty_key(shard)
+        pipe.zcard(dirty_key)
+        pipe.zrange(dirty_key, 0, 0, withscores=True)
+        pipe.get(FLUSH_LAST_KEY.format(shard=shard))
+        pipe.exists(FLUSH_LOCK_KEY.format(shard=shard))
+        pipe.zcard(PLAY_LOG_DEAD_KEY.format(shard=shard))
+    results = pipe.execute()
+
+    now = time.time()
+    result = []
+    for shard in range(shards):
+        pending, oldest, last_flush, locked, dead = results[shard * 5:shard * 5 + 5]
+        result.append({
+            "shard": shard,
+            "pending": pending,
+            "oldest_age": now - oldest[0][1] if oldest else 0.0,
+            "since_last_flush": now - float(last_flush) if last_flush else None,
+            "flushing": bool(locked),
+            "dead": dead
+        })
+    lag = {
+        "shards": result,
+        "pending": sum(s["pending"] for s in result),
+        "dead": sum(s["dead"] for s in result),
+        "max_oldest_age": max(s["oldest_age"] for s in result)
+    }
+    if _events_enabled():
+        oldest = redis_client.xrange(PLAY_EVENT_STREAM_KEY, count=1)
+        with _event_stats_lock:
+            counters = dict(EVENT_STATS)
+        lag["events"] = dict(
+            counters,
+            backlog=redis_client.xlen(PLAY_EVENT_STREAM_KEY),
+            # 流 ID 的前半部分为写入时的毫秒时间戳
+            oldest_age=now - int(oldest[0][0].split("-")[0]) / 1000 if oldest else 0.0
+        )
+    return lag
+
+
+def rebuild_play_log_index():
+    """
+    重建播放记录的 key 与索引，升级、修改 PLAY_LOG_FLUSH_SHARDS 或迁移到 Redis 集群后执行一次：
+    1. 删除原有的待写回索引与用户索引，避免分片数变化后旧分片中的 key 无人写回
+    2. 把不符合当前分片布局的 play_log key（旧版不带分片号的 key、其它分片数下的 key）改写到新 key，
+       新 key 已有更新的心跳时保留新 key
+    3. 用 SCAN 把全部 play_log key 补登到待写回索引与用户索引
+    返回登记的 key 数
+    """
+    redis_client = get_redis_client()
+    shards = _flush_shards()
+    stale = []
+    for pattern in ("play_log_dirty*", "play_log_user:*", "play_log_dead:*"):
+        stale.extend(redis_client.scan_iter(match=pattern, count=1000))
+    _unlink_keys(redis_client, stale)
+
+    moved = []
+    for key in list(redis_client.scan_iter(match="play_log:*", count=1000)):
+        user_id, song_id = _split_play_log_key(key)
+        new_key = _play_log_key(user_id, song_id, shards)
+        if key != new_key:
+            _move_play_log_key(redis_client, key, new_key)
+        moved.append(new_key)
+
+    added = 0
+    for i in range(0, len(moved), 1000):
+        added += _index_play_log_keys(redis_client, moved[i:i + 1000], shards)
+    return added
+
+
+def _unlink_keys(redis_client, keys):
+    # 逐个 UNLINK：集群模式下一条命令中的 key 必须位于同一个 slot
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.unlink(key)
+    pipe.execute()
+
+
+def _move_play_log_key(redis_client, old_key, new_key):
+    # 新旧 key 可能位于不同 slot，不能用 RENAME
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(old_key)
+    pipe.hget(new_key, "last_update")
+    data, current = pipe.execute()
+    pipe = redis_client.pipeline(transaction=False)
+    if data and float(current or 0) < float(data.get("last_update") or 0):
+        pipe.hset(new_key, mapping=data)
+        pipe.expire(new_key, PLAY_LOG_TTL)
+    pipe.unlink(old_key)
+    pipe.execute()
+
+
+def _index_play_log_keys(redis_client, keys, shards=1):
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hget(key, "last_update")
+    last_updates = pipe.execute()
+
+    pipe = redis_client.pipeline(transaction=False)
+    added = 0
+    for key, last_update in zip(keys, last_updates):
+        if last_update is None:
+            continue
+        try:
+            score = float(last_update)
+        except ValueError:
+            score = 0
+        user_id, song_id = _split_play_log_key(key)
+        shard = _shard_of(user_id, shards)
+        user_key = PLAY_LOG_USER_KEY.format(shard=shard, user_id=user_id)
+        pipe.zadd(_dirty_key(shard), {key: score})
+        pipe.zadd(user_key, {song_id: score})
+        pipe.expire(user_key, PLAY_LOG_TTL)
+        added += 1
+    pipe.execute()
+    return added
@@ -0,0 +1,204 @@
+from datetime import datetime
+
+from sqlalchemy import text
+from utils.db import db
+
+COMPLETION_RATIO = 0.9  # 与 get_play_logs 一致：播放到 90% 视为播完
+RESUME_TOLERANCE = 10  # 新一段心跳的起始进度不早于上次进度这么多秒时，视为暂停后继续播放
+BACKFILL_USER_BATCH = 500
+
+
+def _load_previous_positions(rows):
+    """
+    读取本批 (user_id, song_id) 在 MySQL 中的上一次进度，返回 {(user_id, song_id): (current_position, played_at 时间戳)}
+    """
+    pairs = []
+    params = {}
+    for i, row in enumerate(rows):
+        pairs.append(f"(:user_id_{i}, :song_id_{i})")
+        params[f"user_id_{i}"] = int(row["user_id"])
+        params[f"song_id_{i}"] = int(row["song_id"])
+    sql = text(f"""
+        SELECT user_id, song_id, current_position, UNIX_TIMESTAMP(played_at) AS played_ts
+        FROM play_logs
+        WHERE (user_id, song_id) IN ({", ".join(pairs)})
+    """)
+    return {
+        (r.user_id, r.song_id): (r.current_position, r.played_ts)
+        for r in db.session.execute(sql, params)
+    }
+
+
+def _start_of_new_play(row, position, prev):
+    """
+    本条记录是新的一次播放时返回起始进度，否则返回 None：
+    - 没有旧记录，或进度比旧进度小
+    - 收到了 start 事件（事件流）
+    - 这段心跳（Redis hash 在上次写回后重新创建）的起始进度比旧进度早 RESUME_TOLERANCE 秒以上，
+      例如播完后从头重听：最终进度可能与上次相同，只比较进度会漏掉这次播放
+    """
+    start = row.get("start_position")
+    start = float(start) if start not in (None, "") else None
+    if prev is None or position < prev or row.get("started"):
+        return start if start is not None and start <= position else 0.0
+    if start is not None and start < prev - RESUME_TOLERANCE:
+        return min(start, position)
+    return None
+
+
+def compute_deltas(rows, previous):
+    """
+    根据写回前后的进度计算增量：
+    - 新的一次播放（见 _start_of_new_play）：收听时长为新进度减去起始进度
+    - 否则为同一次播放的继续，收听时长为进度差
+    - 进度首次越过 90% 时长时计一次播完
+    最后心跳时间不晚于 MySQL 中 played_at 的记录已经计入过（重复写回、重放的旧事件），增量为 0。
+    返回 (用户增量 {user_id: [秒数, 播放次数, 播完次数]}, 歌曲增量 {(user_id, song_id): [播放次数, 秒数, 播完次数]})
+    """
+    user_deltas = {}
+    song_deltas = {}
+    for row in rows:
+        user_id, song_id = int(row["user_id"]), int(row["song_id"])
+        position = float(row.get("current_time") or 0)
+        duration = float(row.get("duration") or 0)
+        threshold = duration * COMPLETION_RATIO
+        prev, played_ts = previous.get((user_id, song_id), (None, None))
+        last_update = row.get("last_update")
+        if played_ts is not None and last_update not in (None, "") and int(float(last_update)) <= played_ts:
+            continue
+
+        start = _start_of_new_play(row, position, prev)
+        if start is not None:
+            plays, seconds = 1, position - start
+            completed = duration > 0 and position >= threshold
+        else:
+            plays, seconds = 0, position - prev
+            completed = duration > 0 and prev < threshold <= position
+        if duration > 0:
+            seconds = min(seconds, duration)
+        if not plays and not seconds:
+            continue
+
+        user_delta = user_deltas.setdefault(user_id, [0.0, 0, 0])
+        user_delta[0] += seconds
+        user_delta[1] += plays
+        user_delta[2] += int(completed)
+        song_delta = song_deltas.setdefault((user_id, song_id), [0, 0.0, 0])
+        song_delta[0] += plays
+        song_delta[1] += seconds
+        song_delta[2] += int(completed)
+    return user_deltas, song_deltas
+
+
+def _apply_deltas(user_deltas, song_deltas):
+    now = datetime.now()
+    if user_deltas:
+        values = []
+        params = {"now": now}
+        for i, (user_id, (seconds, plays, completed)) in enumerate(user_deltas.items()):
+            values.append(f"(:user_id_{i}, :seconds_{i}, :plays_{i}, :completed_{i}, :now)")
+            params.update({f"user_id_{i}": user_id, f"seconds_{i}": seconds, f"plays_{i}": plays,
+                           f"completed_{i}": completed})
+        db.session.execute(text(f"""
+            INSERT INTO user_listening_stats (user_id, total_seconds, play_count, completed_count, updated_at)
+            VALUES {", ".join(values)}
+            ON DUPLICATE KEY UPDATE
+                total_seconds   = total_seconds + VALUES(total_seconds),
+                play_count      = play_count + VALUES(play_count),
+                completed_count = completed_count + VALUES(completed_count),
+                updated_at      = VALUES(updated_at)
+        """), params)
+
+    if song_deltas:
+        values = []
+        params = {"now": now}
+        for i, ((user_id, song_id), (plays, seconds, completed)) in enumerate(song_deltas.items()):
+            values.append(f"(:user_id_{i}, :song_id_{i}, :plays_{i}, :seconds_{i}, :completed_{i}, :now)")
+            params.update({f"user_id_{i}": user_id, f"song_id_{i}": song_id, f"plays_{i}": plays,
+                           f"seconds_{i}": seconds, f"completed_{i}": completed})
+        db.session.execute(text(f"""
+            INSERT INTO user_song_stats
+                (user_id, song_id, play_count, listened_seconds, completed_count, last_played_at)
+            VALUES {", ".join(values)}
+            ON DUPLICATE KEY UPDATE
+                play_count       = play_count + VALUES(play_count),
+                listened_seconds = listened_seconds + VALUES(listened_seconds),
+                completed_count  = completed_count + VALUES(completed_count),
+                last_played_at   = VALUES(last_played_at)
+        """), params)
+
+
+def update_listening_stats(rows):
+    """
+    在写回播放记录的同一事务中（upsert play_logs 之前调用）增量更新收听统计
+    """
+    if not rows:
+        return
+    user_deltas, song_deltas = compute_deltas(rows, _load_previous_positions(rows))
+    _apply_deltas(user_deltas, song_deltas)
+
+
+def query_listening_stats(user_id, top):
+    """
+    一次主键查询取汇总，一次 (user_id, play_count) 索引范围查询取前 top 首歌
+    """
+    summary = db.session.execute(text("""
+        SELECT total_seconds, play_count, completed_count, updated_at
+        FROM user_listening_stats
+        WHERE user_id = :user_id
+    """), {"user_id": user_id}).first()
+    if summary is None:
+        return None
+
+    top_songs = db.session.execute(text("""
+        SELECT s.song_id, p.song_name, s.play_count, s.listened_seconds, s.completed_count, s.last_played_at
+        FROM user_song_stats s
+        LEFT JOIN play_logs p ON p.user_id = s.user_id AND p.song_id = s.song_id
+        WHERE s.user_id = :user_id
+        ORDER BY s.play_count DESC, s.listened_seconds DESC
+        LIMIT :top
+    """), {"user_id": user_id, "top": top})
+
+    return {
+        "user_id": user_id,
+        "total_seconds": summary.total_seconds,
+        "play_count": summary.play_count,
+        "completed_count": summary.completed_count,
+        "completion_rate": summary.completed_count / summary.play_count if summary.play_count else 0.0,
+        "updated_at": summary.updated_at,
+        "top_songs": [dict(row._mapping) for row in top_songs]
+    }
+
+
+def backfill_listening_stats():
+    """
+    按已有的 play_logs 重建统计（每首歌计一次播放，收听时长取当前进度），按用户分批执行，返回处理的用户数
+    """
+    user_ids = [row.user_id for row in db.session.execute(text("SELECT DISTINCT user_id FROM play_logs"))]
+    for i in range(0, len(user_ids), BACKFILL_USER_BATCH):
+        batch = user_ids[i:i + BACKFILL_USER_BATCH]
+        params = {f"user_id_{j}": user_id for j, user_id in enumerate(batch)}
+        params["ratio"] = COMPLETION_RATIO
+        placeholders = ", ".join(f":user_id_{j}" for j in range(len(batch)))
+
+        db.session.execute(text(f"DELETE FROM user_song_stats WHERE user_id IN ({placeholders})"), params)
+        db.session.execute(text(f"DELETE FROM user_listening_stats WHERE user_id IN ({placeholders})"), params)
+        db.session.execute(text(f"""
+            INSERT INTO user_song_stats
+                (user_id, song_id, play_count, listened_seconds, completed_count, last_played_at)
+            SELECT user_id, song_id, 1,
+                   CASE WHEN song_duration > 0 THEN LEAST(current_position, song_duration) ELSE current_position END,
+                   CASE WHEN song_duration > 0 AND current_position >= song_duration * :ratio THEN 1 ELSE 0 END,
+                   played_at
+            FROM play_logs
+            WHERE user_id IN ({placeholders})
+        """), params)
+        db.session.execute(text(f"""
+            INSERT INTO user_listening_stats (user_id, total_seconds, play_count, completed_count, updated_at)
+            SELECT user_id, SUM(listened_seconds), SUM(play_count), SUM(completed_count), NOW()
+            FROM user_song_stats
+            WHERE user_id IN ({placeholders})
+            GROUP BY user_id
+        """), params)
+        db.session.commit()
+    return len(user_ids)
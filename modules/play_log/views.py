@@ -1,5 +1,5 @@
 from flask import Blueprint, jsonify, request
-from .services import set_play_log, get_play_logs
+from .services import set_play_log, set_play_logs_batch, set_play_events, get_play_logs, get_listening_stats, get_positions
 
 play_log_bp = Blueprint('play_log', __name__, url_prefix='/api/play_log')
 
@@ -7,6 +7,22 @@ play_log_bp = Blueprint('play_log', __name__, url_prefix='/api/play_log')
 def save_log():
     return set_play_log()
 
+@play_log_bp.route('/set_batch', methods=['POST'])
+def save_logs_batch():
+    return set_play_logs_batch()
+
+@play_log_bp.route('/event', methods=['POST'])
+def save_events():
+    return set_play_events()
+
 @play_log_bp.route('/get', methods=['GET'])
 def get_logs():
     return get_play_logs()
+
+@play_log_bp.route('/stats', methods=['GET'])
+def listening_stats():
+    return get_listening_stats()
+
+@play_log_bp.route('/positions', methods=['GET', 'POST'])
+def resume_positions():
+    return get_positions()
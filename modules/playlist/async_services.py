@@ -0,0 +1,223 @@
+"""
+歌单接口的 asyncio 版本（ASGI 模式）：上游请求通过 AsyncUpstreamClient 发出，等待上游时不占用线程；
+响应处理、缓存与合并逻辑与同步版本共用，数据库读写放到线程池中执行。
+"""
+import asyncio
+
+from flask import current_app
+from starlette.responses import Response, StreamingResponse
+
+from utils.async_support import endpoint, json_response, run_sync
+from utils.async_upstream import get_async_upstream_client
+from utils.auth import get_base_url, get_headers
+from utils.batch_loader import AsyncBatchLoader
+from utils.log import get_logger
+from utils.upstream_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from modules.play_log.services import get_resume_positions
+from .services import (_apply_playlist_response, _attach_progress, _build_body, _check_song_ids,
+                       _detail_cache_keys, _normalize_song_ids, _page_detail, _parse_detail_args,
+                       _process_playlist_detail, _process_song_details, _song_details_result, _song_details_url,
+                       _stream_playlist_detail, _sync_detail_tracks, get_detail_cache, get_playlist_cache,
+                       get_song_cache)
+
+logger = get_logger("playlist")
+
+_song_loader = None
+
+
+async def _sync_playlist_async(uid, priority):
+    """
+    _sync_playlist 的 asyncio 版本：上游请求在协程中等待，与数据库的比对 / 写入在线程池中执行
+    """
+    logger.debug("准备查询歌单", uid=uid)
+    url = f"{get_base_url()}/api/user/playlist/?offset=0&limit=100&uid={uid}"
+
+    try:
+        resp = await get_async_upstream_client().get(url, headers=get_headers(), priority=priority)
+        logger.debug("已请求外部 API", url=url)
+    except Exception as e:
+        current_app.logger.error(
+            f"请求外部接口出现异常: {e}", exc_info=True
+        )
+        return await run_sync(_apply_playlist_response, uid, None, None, error=e)
+    return await run_sync(_apply_playlist_response, uid, resp.status_code, resp.content)
+
+
+@endpoint
+async def show_playlist(request):
+    current_app.logger.info("进入 show_playlist 函数")
+
+    uid = request.query_params.get('uid')
+    if not uid:
+        current_app.logger.warning("请求中缺少 uid 参数")
+        return json_response({"code": 400, "msg": "缺少 uid 参数"})
+
+    app = current_app._get_current_object()
+    request_task = asyncio.current_task()
+
+    async def load():
+        # 缓存过期后的后台刷新在独立的 task 中执行，使用后台优先级
+        priority = PRIORITY_INTERACTIVE if asyncio.current_task() is request_task else PRIORITY_BACKGROUND
+        with app.app_context():
+            code, msg, raw = await _sync_playlist_async(uid, priority)
+            return code, _build_body(code, msg, raw)
+
+    try:
+        (_, body), status = await get_playlist_cache().get_async(uid, load, should_cache=lambda v: v[0] == 200)
+    except Exception as e:
+        current_app.logger.error(f"获取歌单出现异常: {e}", exc_info=True)
+        return json_response({"code": 500, "msg": f"获取歌单失败；异常信息: {e}"})
+
+    logger.debug("歌单缓存状态", uid=uid, status=status)
+    return Response(body, media_type="application/json", headers={"X-Cache": status})
+
+
+async def _fetch_playlist_detail_async(playlist_id, cookies, cached):
+    url = f"{get_base_url()}/api/playlist/detail?id={playlist_id}"
+    resp = await get_async_upstream_client().get(url, headers=get_headers(), cookies=cookies,
+                                                 priority=PRIORITY_INTERACTIVE)
+    logger.debug("请求歌单详情", url=url)
+    return _process_playlist_detail(playlist_id, resp.status_code, resp.content, cached)
+
+
+@endpoint
+async def get_playlist_detail(request):
+    current_app.logger.info("进入 get_playlist_detail 函数")
+
+    params, error = _parse_detail_args(request.query_params, request.cookies)
+    if error is not None:
+        return json_response(error)
+    playlist_id = params["playlist_id"]
+
+    try:
+        cache = get_detail_cache()
+        public_key, user_key = _detail_cache_keys(playlist_id, params["cookies"]['MUSIC_U'])
+
+        processed = cache.get(public_key) or cache.get(user_key)
+        if processed is None:
+            cached = cache.peek(public_key) or cache.peek(user_key)
+            processed = await _fetch_playlist_detail_async(playlist_id, params["cookies"], cached)
+            cache.set(user_key if processed["private"] else public_key, processed)
+            await run_sync(_sync_detail_tracks, processed, cached)
+
+        meta, tracks = _page_detail(processed, params["offset"], params["limit"])
+
+        if params["progress_user"] is not None:
+            positions = await run_sync(get_resume_positions, params["progress_user"],
+                                       [t["song_id"] for t in tracks if t["song_id"]])
+            tracks = _attach_progress(tracks, positions)
+
+        current_app.logger.info(
+            f"成功获取并处理歌单详情，playlist_id={playlist_id}"
+        )
+
+        if params["stream"]:
+            media_type = "application/x-ndjson" if params["ndjson"] else "application/json"
+            return StreamingResponse(_stream_playlist_detail(meta, tracks, params["ndjson"]), media_type=media_type)
+
+        return json_response({"code": 200, "data": dict(meta, tracks=tracks)})
+
+    except Exception as e:
+        current_app.logger.error(
+            f"获取歌单详情出现异常: {e}", exc_info=True
+        )
+        return json_response({"code": 500, "msg": "服务器处理异常", "error_detail": str(e)})
+
+
+def get_async_song_loader():
+    """
+    并发请求在短时间窗口内合并为一次批量上游请求（事件循环内的 AsyncBatchLoader）
+    """
+    global _song_loader
+    if _song_loader is None:
+        app = current_app._get_current_object()
+        config = app.config
+
+        async def batch_fn(song_ids):
+            # 批次在独立的 task 中发出，需要自己推入应用上下文
+            with app.app_context():
+                logger.debug("批量请求单曲详情", count=len(song_ids))
+                resp = await get_async_upstream_client().get(_song_details_url(song_ids),
+                                                             priority=PRIORITY_INTERACTIVE)
+                return _process_song_details(resp.status_code, resp.content)
+
+        _song_loader = AsyncBatchLoader(
+            batch_fn,
+            window=config.get("SONG_DETAIL_BATCH_WINDOW", 0.01),
+            max_batch=config.get("SONG_DETAIL_BATCH_SIZE", 200)
+        )
+    return _song_loader
+
+
+async def get_song_details_async(song_ids):
+    """
+    get_song_details 的 asyncio 版本，与同步版本共用单曲缓存
+    """
+    cache = get_song_cache()
+    found = cache.get_many(song_ids)
+    missing = [song_id for song_id in song_ids if song_id not in found]
+    if missing:
+        timeout = current_app.config.get("SONG_DETAIL_TIMEOUT", 15)
+        for song_id, song in (await get_async_song_loader().load_many(missing, timeout=timeout)).items():
+            if song is not None:
+                cache.set(song_id, song)
+                found[song_id] = song
+    return found
+
+
+@endpoint
+async def get_song_details_batch(request):
+    current_app.logger.info("进入 get_song_details_batch 函数")
+
+    try:
+        if request.method == 'POST':
+            try:
+                body = await request.json()
+            except ValueError:
+                body = None
+            song_ids = _normalize_song_ids((body if isinstance(body, dict) else {}).get('ids'))
+        else:
+            song_ids = _normalize_song_ids(request.query_params.get('ids', ''))
+    except (ValueError, TypeError):
+        current_app.logger.warning("ids 参数格式错误")
+        return json_response({"code": 400, "msg": "ids 参数格式错误"})
+    error = _check_song_ids(song_ids)
+    if error is not None:
+        return json_response(error)
+
+    try:
+        found = await get_song_details_async(song_ids)
+        return json_response(_song_details_result(song_ids, found))
+    except Exception as e:
+        current_app.logger.error(
+            f"批量获取单曲详情出现异常: {e}", exc_info=True
+        )
+        return json_response({"code": 500, "msg": "获取单曲详情出现异常", "error": str(e)})
+
+
+@endpoint
+async def get_single_song_detail(request):
+    current_app.logger.info("进入 get_single_song_detail 函数")
+
+    song_id = request.query_params.get('song_id')
+    if not song_id:
+        current_app.logger.warning("缺少 song_id 参数")
+        return json_response({"code": 400, "msg": "缺少 song_id"})
+    try:
+        song_id = int(song_id)
+    except ValueError:
+        return json_response({"code": 400, "msg": "song_id 参数格式错误"})
+
+    try:
+        song_info = (await get_song_details_async([song_id])).get(song_id)
+        if not song_info:
+            current_app.logger.warning("返回数据中未找到歌曲信息")
+            return json_response({"code": 404, "msg": "歌曲信息为空"})
+
+        current_app.logger.info(f"成功获取单曲详情 song_id={song_id}")
+        return json_response({"code": 200, "data": song_info})
+    except Exception as e:
+        current_app.logger.error(
+            f"获取单曲详情出现异常: {e}", exc_info=True
+        )
+        return json_response({"code": 500, "msg": "获取单曲详情出现异常", "error": str(e)})
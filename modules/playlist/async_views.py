@@ -0,0 +1,10 @@
+from utils.async_support import route
+from .async_services import show_playlist, get_playlist_detail, get_single_song_detail, get_song_details_batch
+
+# 与 playlist_bp 相同的路径与返回结构
+routes = [
+    route('/api/playlist/show', show_playlist, methods=['GET']),
+    route('/api/playlist/detail', get_playlist_detail, methods=['GET']),
+    route('/api/playlist/single_detail', get_single_song_detail, methods=['GET']),
+    route('/api/playlist/song_details', get_song_details_batch, methods=['GET', 'POST']),
+]
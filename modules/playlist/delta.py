@@ -0,0 +1,240 @@
+"""
+歌单的规范化存储与增量同步：
+- 用户歌单列表：每次刷新把上游列表与 user_playlist_items 逐个歌单比较（只读取内容哈希与顺序），
+  只写入新增、修改、移动或删除的行，并把这些行标记为该用户的新版本（playlists.version + 1）
+- 歌单曲目：请求公开歌单详情且 trackUpdateTime 变化时，与 playlist_tracks 比较，版本在 playlist_track_state 中
+- 顺序用浮点 sort_key 表示：保持原有相对顺序的最长子序列不动，只给新增 / 被移动的行分配相邻 key 之间的值，
+  在列表头部插入歌曲不会改写其余所有行
+"""
+import bisect
+import hashlib
+import json
+
+from utils.db import db
+from .models import Playlist, PlaylistItem, PlaylistTrack, PlaylistTrackState
+
+SORT_KEY_STEP = 1024.0  # 重新编号与在两端追加时相邻 key 的间隔
+MIN_SORT_KEY_GAP = 1e-6  # 相邻 key 过近时整体重新编号
+
+
+def _stable_run(keys):
+    """
+    keys 中 sort_key 严格递增的最长子序列（None 不参与），返回其下标集合；O(n log n)
+    """
+    tails, tail_idx, prev = [], [], {}
+    for i, key in enumerate(keys):
+        if key is None:
+            continue
+        pos = bisect.bisect_left(tails, key)
+        if pos == len(tails):
+            tails.append(key)
+            tail_idx.append(i)
+        else:
+            tails[pos] = key
+            tail_idx[pos] = i
+        prev[i] = tail_idx[pos - 1] if pos else None
+    kept = set()
+    i = tail_idx[-1] if tail_idx else None
+    while i is not None:
+        kept.add(i)
+        i = prev[i]
+    return kept
+
+
+def assign_sort_keys(old_keys, new_ids):
+    """
+    根据旧顺序 {id: sort_key} 为新顺序 new_ids 分配 sort_key，返回 {id: sort_key}；
+    未移动的 id 沿用旧 key，只有新增与被移动的 id 得到新 key（间隔不够时全部重新编号）
+    """
+    keys = [old_keys.get(i) for i in new_ids]
+    kept = _stable_run(keys)
+    result = {}
+    i = 0
+    lower = None
+    while i < len(new_ids):
+        if i in kept:
+            lower = keys[i]
+            result[new_ids[i]] = lower
+            i += 1
+            continue
+        # 连续一段需要新 key 的位置：[i, j)，夹在 lower 与下一个保留的 key 之间
+        j = i
+        while j < len(new_ids) and j not in kept:
+            j += 1
+        upper = keys[j] if j < len(new_ids) else None
+        count = j - i
+        if lower is None and upper is None:
+            new_keys = [SORT_KEY_STEP * (n + 1) for n in range(count)]
+        elif upper is None:
+            new_keys = [lower + SORT_KEY_STEP * (n + 1) for n in range(count)]
+        elif lower is None:
+            new_keys = [upper - SORT_KEY_STEP * (count - n) for n in range(count)]
+        else:
+            gap = (upper - lower) / (count + 1)
+            if gap < MIN_SORT_KEY_GAP:
+                return {item: SORT_KEY_STEP * (n + 1) for n, item in enumerate(new_ids)}
+            new_keys = [lower + gap * (n + 1) for n in range(count)]
+        for n, key in enumerate(new_keys):
+            result[new_ids[i + n]] = key
+        lower = new_keys[-1]
+        i = j
+    return result
+
+
+def _canonical(obj):
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def sync_user_playlists(playlist, raw):
+    """
+    把上游歌单列表（JSON 字节）的变化写入 user_playlist_items，返回变化的歌单数；
+    有变化时 playlist.version + 1，调用方负责提交。同一用户的并发同步通过锁住 playlists 行串行化
+    """
+    if playlist.id is not None:
+        db.session.refresh(playlist, with_for_update=True)
+    items = [p for p in json.loads(raw).get("playlist", []) if p.get("id") is not None]
+    existing = {item.playlist_id: item for item in PlaylistItem.query.filter_by(user_id=playlist.user_id)}
+
+    # 重复的歌单 ID 只保留第一次出现的位置
+    order, seen = [], set()
+    for p in items:
+        if p["id"] not in seen:
+            seen.add(p["id"])
+            order.append(p)
+    old_keys = {pid: item.sort_key for pid, item in existing.items() if not item.deleted}
+    sort_keys = assign_sort_keys(old_keys, [p["id"] for p in order])
+
+    version = (playlist.version or 0) + 1
+    changed = 0
+    for p in order:
+        data = _canonical(p)
+        digest = hashlib.sha256(data.encode("utf-8")).hexdigest()
+        item = existing.get(p["id"])
+        if item is None:
+            item = PlaylistItem(user_id=playlist.user_id, playlist_id=p["id"], created_version=version)
+            db.session.add(item)
+        elif not item.deleted and item.content_hash == digest and item.sort_key == sort_keys[p["id"]]:
+            continue
+        elif item.deleted:
+            # 删除后重新加入，视为新增
+            item.created_version = version
+        if item.content_hash != digest:
+            item.content_hash = digest
+            item.data = data
+            item.update_time = p.get("updateTime")
+            item.track_update_time = p.get("trackUpdateTime")
+        item.sort_key = sort_keys[p["id"]]
+        item.deleted = False
+        item.version = version
+        changed += 1
+
+    for pid, item in existing.items():
+        if pid not in seen and not item.deleted:
+            item.deleted = True
+            item.version = version
+            changed += 1
+
+    if changed:
+        playlist.version = version
+    return changed
+
+
+def sync_playlist_tracks(playlist_id, track_update_time, song_ids):
+    """
+    把歌单曲目的变化写入 playlist_tracks 并提交，返回变化的曲目数；trackUpdateTime 与上次同步一致时直接返回 0
+    """
+    state = db.session.get(PlaylistTrackState, playlist_id, with_for_update=True)
+    if state is not None and track_update_time is not None and state.track_update_time == track_update_time:
+        db.session.rollback()
+        return 0
+    if state is None:
+        state = PlaylistTrackState(playlist_id=playlist_id, version=0)
+        db.session.add(state)
+
+    order = list(dict.fromkeys(s for s in song_ids if s is not None))
+    existing = {t.song_id: t for t in PlaylistTrack.query.filter_by(playlist_id=playlist_id)}
+    old_keys = {song_id: t.sort_key for song_id, t in existing.items() if not t.deleted}
+    sort_keys = assign_sort_keys(old_keys, order)
+
+    version = (state.version or 0) + 1
+    changed = 0
+    for song_id in order:
+        track = existing.get(song_id)
+        if track is None:
+            db.session.add(PlaylistTrack(playlist_id=playlist_id, song_id=song_id, sort_key=sort_keys[song_id],
+                                         created_version=version, version=version, deleted=False))
+        elif track.deleted:
+            track.sort_key = sort_keys[song_id]
+            track.created_version = version
+            track.version = version
+            track.deleted = False
+        elif track.sort_key != sort_keys[song_id]:
+            track.sort_key = sort_keys[song_id]
+            track.version = version
+        else:
+            continue
+        changed += 1
+
+    listed = set(order)
+    for song_id, track in existing.items():
+        if song_id not in listed and not track.deleted:
+            track.deleted = True
+            track.version = version
+            changed += 1
+
+    if changed:
+        state.version = version
+    state.track_update_time = track_update_time
+    db.session.commit()
+    return changed
+
+
+def _split_changes(rows, since, full, to_entry):
+    added, modified, removed = [], [], []
+    for row, key in rows:
+        if row.deleted:
+            if not full:
+                removed.append(key)
+        elif full or row.created_version > since:
+            added.append(to_entry(row))
+        else:
+            modified.append(to_entry(row))
+    return {"added": added, "modified": modified, "removed": removed}
+
+
+def query_playlist_changes(uid, since):
+    """
+    返回用户歌单列表自 since 版本之后的变化；since 为 0 或比当前版本还新（数据被重建）时返回全量。
+    没有该用户的歌单数据时返回 None
+    """
+    playlist = Playlist.query.filter_by(user_id=uid).first()
+    if playlist is None:
+        return None
+    version = playlist.version or 0
+    full = since <= 0 or since > version
+    query = PlaylistItem.query.filter_by(user_id=uid).options(db.undefer(PlaylistItem.data))
+    query = query.filter(PlaylistItem.deleted.is_(False)) if full else query.filter(PlaylistItem.version > since)
+    changes = _split_changes(
+        [(item, item.playlist_id) for item in query.order_by(PlaylistItem.sort_key)], since, full,
+        lambda item: {"sort_key": item.sort_key, "playlist": json.loads(item.data)}
+    )
+    return dict(changes, version=version, full=full)
+
+
+def query_track_changes(playlist_id, since):
+    """
+    返回歌单曲目自 since 版本之后的变化（只包含 song_id 与 sort_key，歌曲信息通过 /song_details 获取）；
+    该歌单的曲目从未同步过时返回 None
+    """
+    state = db.session.get(PlaylistTrackState, playlist_id)
+    if state is None:
+        return None
+    version = state.version or 0
+    full = since <= 0 or since > version
+    query = PlaylistTrack.query.filter_by(playlist_id=playlist_id)
+    query = query.filter(PlaylistTrack.deleted.is_(False)) if full else query.filter(PlaylistTrack.version > since)
+    changes = _split_changes(
+        [(track, track.song_id) for track in query.order_by(PlaylistTrack.sort_key)], since, full,
+        lambda track: {"song_id": track.song_id, "sort_key": track.sort_key}
+    )
+    return dict(changes, version=version, full=full)
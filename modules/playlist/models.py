@@ -1,10 +1,50 @@
 from utils.db import db
-from sqlalchemy.dialects.mysql import LONGTEXT
+from sqlalchemy.dialects.mysql import LONGTEXT, LONGBLOB
 from datetime import datetime
 
 class Playlist(db.Model):
     __tablename__ = 'playlists'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.BigInteger, db.ForeignKey('users.user_id'), unique=True)
-    playlist_data = db.Column(LONGTEXT)
+    playlist_data = db.Column(LONGTEXT)  # 旧格式，迁移后为空
+    content_hash = db.Column(db.CHAR(64))  # 上游原始 JSON 字节的 sha256（不做规范化，内容未变时无需解析）
+    payload = db.Column(LONGBLOB)  # zlib 压缩的上游原始 JSON 字节
     update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.BigInteger, default=0)  # 歌单列表的变更版本，同步出变化时 +1
+
+
+class PlaylistItem(db.Model):
+    """
+    用户歌单列表中的一个歌单（按歌单 ID），每次同步只写入有变化的行；删除的歌单保留为墓碑，供增量接口返回
+    """
+    __tablename__ = 'user_playlist_items'
+    user_id = db.Column(db.BigInteger, primary_key=True)
+    playlist_id = db.Column(db.BigInteger, primary_key=True)
+    sort_key = db.Column(db.Float)  # 在列表中的顺序，调整顺序时只改动被移动的行
+    update_time = db.Column(db.BigInteger)  # 上游 updateTime（毫秒）
+    track_update_time = db.Column(db.BigInteger)  # 上游 trackUpdateTime（毫秒）
+    content_hash = db.Column(db.CHAR(64))  # 歌单对象 canonical JSON 的 sha256
+    data = db.deferred(db.Column(db.Text))  # 上游返回的歌单对象（紧凑 JSON），比较时不读取
+    created_version = db.Column(db.BigInteger)  # 加入列表时的版本
+    version = db.Column(db.BigInteger)  # 最近一次变化的版本
+    deleted = db.Column(db.Boolean, default=False)
+
+
+class PlaylistTrackState(db.Model):
+    """歌单曲目的同步状态：曲目变更版本与最近一次同步的 trackUpdateTime"""
+    __tablename__ = 'playlist_track_state'
+    playlist_id = db.Column(db.BigInteger, primary_key=True)
+    version = db.Column(db.BigInteger, default=0)
+    track_update_time = db.Column(db.BigInteger)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class PlaylistTrack(db.Model):
+    """歌单与歌曲的从属关系（公开歌单，在请求歌单详情时同步），删除的曲目保留为墓碑"""
+    __tablename__ = 'playlist_tracks'
+    playlist_id = db.Column(db.BigInteger, primary_key=True)
+    song_id = db.Column(db.BigInteger, primary_key=True)
+    sort_key = db.Column(db.Float)
+    created_version = db.Column(db.BigInteger)
+    version = db.Column(db.BigInteger)
+    deleted = db.Column(db.Boolean, default=False)
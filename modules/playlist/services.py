@@ -1,10 +1,42 @@
-from flask import jsonify, request, current_app
-from utils.auth import get_headers, get_retry_session
+from flask import jsonify, request, current_app, stream_with_context, has_request_context
+from utils.auth import get_base_url, get_headers
+from utils.batch_loader import BatchLoader
+from utils.cache import SWRCache, TTLCache
+from utils.log import get_logger
+from utils.upstream import get_upstream_client
+from utils.upstream_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from modules.play_log.services import get_resume_positions
+from .delta import query_playlist_changes, query_track_changes, sync_playlist_tracks, sync_user_playlists
 from .models import Playlist
+from .storage import content_hash, load_playlist_raw, store_playlist
+import hashlib
 import json
-import requests
 from utils.db import db
 
+logger = get_logger("playlist")
+
+MAX_DETAIL_PAGE_SIZE = 1000
+MAX_SONG_IDS = 1000
+
+_playlist_cache = None
+_detail_cache = None
+_song_cache = None
+_song_loader = None
+
+
+def get_playlist_cache():
+    global _playlist_cache
+    if _playlist_cache is None:
+        config = current_app.config
+        _playlist_cache = SWRCache(
+            "playlist_show",
+            ttl=config.get("PLAYLIST_CACHE_TTL", 60),
+            stale_ttl=config.get("PLAYLIST_CACHE_STALE_TTL", 3600),
+            max_entries=config.get("PLAYLIST_CACHE_MAX_ENTRIES", 10000)
+        )
+    return _playlist_cache
+
+
 def show_playlist():
     # 进入函数就可以记录一个最简单的 INFO 级别日志
     current_app.logger.info("进入 show_playlist 函数")
@@ -15,151 +47,419 @@ def show_playlist():
         current_app.logger.warning("请求中缺少 uid 参数")
         return jsonify({"code": 400, "msg": "缺少 uid 参数"})
 
-    # 可以记录一下要查询的 UID
-    current_app.logger.debug(f"准备查询 UID 为 {uid} 的歌单")
+    try:
+        (_, body), status = get_playlist_cache().get(uid, _playlist_loader(uid), should_cache=lambda v: v[0] == 200)
+    except Exception as e:
+        current_app.logger.error(f"获取歌单出现异常: {e}", exc_info=True)
+        return jsonify({"code": 500, "msg": f"获取歌单失败；异常信息: {e}"})
+
+    logger.debug("歌单缓存状态", uid=uid, status=status)
+    response = current_app.response_class(body, mimetype="application/json")
+    response.headers["X-Cache"] = status
+    return response
 
-    # 先查询数据库中是否已有此 UID 的歌单数据
-    playlist = Playlist.query.filter_by(user_id=uid).first()
-    if playlist:
-        current_app.logger.debug("数据库中已存在对应歌单记录")
-    else:
-        current_app.logger.debug("数据库中尚无此 UID 的歌单记录")
+
+def _playlist_loader(uid):
+    app = current_app._get_current_object()
+
+    def load():
+        # 后台刷新时不在请求上下文中，需要自己推入应用上下文
+        with app.app_context():
+            code, msg, raw = _sync_playlist(uid)
+            # 缓存序列化后的响应体；歌单 JSON 字节直接拼接，无需解析再编码
+            return code, _build_body(code, msg, raw)
+    return load
+
+
+def _parse_version(value):
+    try:
+        version = int(value or 0)
+    except (TypeError, ValueError):
+        return None
+    return version if version >= 0 else None
+
+
+def get_playlist_changes():
+    """
+    增量同步：?uid=<uid>&since=<版本> 返回用户歌单列表的变化，?id=<歌单 ID>&since=<版本> 返回歌单曲目的变化；
+    since 缺省或为 0 时返回全量，客户端保存响应中的 version 作为下一次的 since
+    """
+    uid = request.args.get('uid')
+    playlist_id = request.args.get('id')
+    since = _parse_version(request.args.get('since'))
+    if not uid and not playlist_id:
+        return jsonify({"code": 400, "msg": "缺少 uid 或 id 参数"})
+    if since is None:
+        return jsonify({"code": 400, "msg": "since 必须是非负整数"})
+
+    try:
+        if uid:
+            # 与 /show 共用缓存：缓存新鲜时不请求上游，过期时先刷新再读取变化
+            try:
+                get_playlist_cache().get(uid, _playlist_loader(uid), should_cache=lambda v: v[0] == 200)
+            except Exception as e:
+                current_app.logger.error(f"刷新歌单失败，返回数据库中的变化: {e}", exc_info=True)
+            changes = query_playlist_changes(uid, since)
+            if changes is None:
+                return jsonify({"code": 404, "msg": "数据库中没有该用户的歌单数据"})
+        else:
+            if not playlist_id.isdigit():
+                return jsonify({"code": 400, "msg": "id 必须是数字"})
+            changes = query_track_changes(int(playlist_id), since)
+            if changes is None:
+                return jsonify({"code": 404, "msg": "该歌单的曲目尚未同步，请先请求 /api/playlist/detail"})
+    except Exception as e:
+        current_app.logger.error(f"查询歌单变化出现异常: {e}", exc_info=True)
+        return jsonify({"code": 500, "msg": f"查询歌单变化失败；异常信息: {e}"})
+
+    logger.debug("歌单变化", uid=uid, playlist_id=playlist_id, since=since, version=changes["version"])
+    return jsonify({"code": 200, "data": changes})
+
+
+def _build_body(code, msg, raw):
+    head = json.dumps({"code": code, "msg": msg}, ensure_ascii=False).encode("utf-8")
+    if raw is None:
+        return head
+    return head[:-1] + b', "data": ' + raw + b"}"
+
+
+def _sync_playlist(uid):
+    """
+    请求上游歌单并与数据库中的记录同步，返回 (code, msg, 歌单 JSON 字节)；上游失败时降级为数据库数据。
+    是否需要更新只比较内容哈希，不再解析旧数据做深比较。
+    """
+    # 可以记录一下要查询的 UID
+    logger.debug("准备查询歌单", uid=uid)
 
     # 准备调用外部接口
-    url = f"http://music.163.com/api/user/playlist/?offset=0&limit=100&uid={uid}"
+    url = f"{get_base_url()}/api/user/playlist/?offset=0&limit=100&uid={uid}"
 
     try:
-        resp = requests.get(url, headers=get_headers())
-        current_app.logger.debug(f"已请求外部 API: {url}")
+        # 缓存过期后的后台刷新不在请求上下文中，使用后台优先级
+        priority = PRIORITY_INTERACTIVE if has_request_context() else PRIORITY_BACKGROUND
+        resp = get_upstream_client().get(url, headers=get_headers(), priority=priority)
+        logger.debug("已请求外部 API", url=url)
     except Exception as e:
         # 如果在请求阶段就抛出了异常
         current_app.logger.error(
             f"请求外部接口出现异常: {e}", exc_info=True
         )
+        return _apply_playlist_response(uid, None, None, error=e)
+    return _apply_playlist_response(uid, resp.status_code, resp.content)
+
+
+def _apply_playlist_response(uid, status_code, raw, error=None):
+    """
+    根据上游结果（状态码与响应字节，请求异常时为 error）同步数据库中的歌单，返回 (code, msg, 歌单 JSON 字节)；
+    同步与 ASGI 模式共用
+    """
+    # 先查询数据库中是否已有此 UID 的歌单数据
+    playlist = Playlist.query.filter_by(user_id=uid).first()
+    if playlist:
+        logger.debug("数据库中已存在对应歌单记录")
+    else:
+        logger.debug("数据库中尚无此 UID 的歌单记录")
+
+    if error is not None:
         if playlist:
             current_app.logger.info("使用数据库中的歌单数据作为返回")
-            return jsonify({
-                "code": 200,
-                "msg": "接口请求异常，使用数据库中的歌单数据",
-                "data": json.loads(playlist.playlist_data)
-            })
+            return 200, "接口请求异常，使用数据库中的歌单数据", load_playlist_raw(playlist)
         else:
             current_app.logger.error("数据库中也无此 UID 的记录，无法提供数据")
-            return jsonify({"code": 500, "msg": f"获取歌单失败，且数据库中无数据；异常信息: {e}"})
+            return 500, f"获取歌单失败，且数据库中无数据；异常信息: {error}", None
 
     # 如果外部接口返回的状态码不是200，视为获取失败
-    if resp.status_code != 200:
+    if status_code != 200:
         current_app.logger.warning(
-            f"外部接口返回非 200 状态码: {resp.status_code}"
+            f"外部接口返回非 200 状态码: {status_code}"
         )
         if playlist:
             current_app.logger.info("使用数据库中的歌单数据作为返回")
-            return jsonify({
-                "code": 200,
-                "msg": "接口获取失败，使用数据库中的歌单数据",
-                "data": json.loads(playlist.playlist_data)
-            })
+            return 200, "接口获取失败，使用数据库中的歌单数据", load_playlist_raw(playlist)
         else:
             current_app.logger.error("数据库中也无此 UID 的记录，无法提供数据")
-            return jsonify({"code": 500, "msg": "获取歌单失败，且数据库中无数据"})
+            return 500, "获取歌单失败，且数据库中无数据", None
 
     # 走到这里，说明接口请求成功，并且 status_code == 200
-    playlist_data = resp.json()
-    current_app.logger.debug("外部接口返回数据成功")
+    # 直接对上游原始字节做哈希；内容未变时无需解析 JSON
+    digest = content_hash(raw)
+    logger.debug("外部接口返回数据成功")
+
+    if playlist and playlist.content_hash == digest:
+        if not playlist.version:
+            # 升级前存入的歌单还没有写入规范化存储，第一次刷新时补写（增量接口需要）
+            sync_user_playlists(playlist, raw)
+            db.session.commit()
+        # 数据完全一致，无需更新
+        current_app.logger.info(f"数据库中 UID={uid} 的歌单与外部数据一致，无需更新")
+        return 200, "数据库中的歌单数据与接口相同，未做更新", raw
+
+    try:
+        # 写库前确认是合法 JSON
+        json.loads(raw)
+    except ValueError as e:
+        current_app.logger.warning(f"外部接口返回的歌单数据不是合法 JSON: {e}")
+        if playlist:
+            return 200, "接口数据异常，使用数据库中的歌单数据", load_playlist_raw(playlist)
+        return 500, "获取歌单失败，且数据库中无数据", None
 
     if not playlist:
         # 数据库中不存在，直接插入
-        new_playlist = Playlist(
-            user_id=uid,
-            playlist_data=json.dumps(playlist_data)
-        )
+        new_playlist = Playlist(user_id=uid)
+        store_playlist(new_playlist, raw, digest)
         db.session.add(new_playlist)
+        sync_user_playlists(new_playlist, raw)
         db.session.commit()
         current_app.logger.info(f"数据库中无记录，为 UID={uid} 新增歌单数据")
-        return jsonify({"code": 200, "msg": "歌单数据已存储", "data": playlist_data})
+        return 200, "歌单数据已存储", raw
     else:
-        # 如果数据库里已经存在，先比较
-        existing_data = json.loads(playlist.playlist_data)
-        if existing_data == playlist_data:
-            # 数据完全一致，无需更新
-            current_app.logger.info(f"数据库中 UID={uid} 的歌单与外部数据一致，无需更新")
-            return jsonify({
-                "code": 200,
-                "msg": "数据库中的歌单数据与接口相同，未做更新",
-                "data": existing_data
-            })
-        else:
-            # 数据不一致，更新数据库
-            playlist.playlist_data = json.dumps(playlist_data)
-            db.session.commit()
-            current_app.logger.info(f"数据库中 UID={uid} 的歌单已更新")
-            return jsonify({
-                "code": 200,
-                "msg": "歌单数据已更新",
-                "data": playlist_data
-            })
+        # 数据不一致（或仍是旧格式），更新数据库；只有变化的歌单写入规范化存储
+        changed = sync_user_playlists(playlist, raw)
+        store_playlist(playlist, raw, digest)
+        db.session.commit()
+        current_app.logger.info(f"数据库中 UID={uid} 的歌单已更新，{changed} 个歌单有变化")
+        return 200, "歌单数据已更新", raw
 
 
-def get_playlist_detail():
-    current_app.logger.info("进入 get_playlist_detail 函数")
+def migrate_playlist_storage(batch_size=100):
+    """
+    把旧的 LONGTEXT 歌单记录转换为 内容哈希 + 压缩 payload 格式，返回转换条数
+    """
+    migrated = 0
+    while True:
+        rows = (Playlist.query
+                .filter(Playlist.content_hash.is_(None), Playlist.playlist_data.isnot(None))
+                .limit(batch_size).all())
+        if not rows:
+            break
+        for playlist in rows:
+            raw = playlist.playlist_data.encode("utf-8")
+            store_playlist(playlist, raw, content_hash(raw))
+        db.session.commit()
+        migrated += len(rows)
+    return migrated
 
-    playlist_id = request.args.get('id')
+
+def get_detail_cache():
+    global _detail_cache
+    if _detail_cache is None:
+        config = current_app.config
+        _detail_cache = TTLCache(
+            "playlist_detail",
+            ttl=config.get("PLAYLIST_DETAIL_CACHE_TTL", 30),
+            max_entries=config.get("PLAYLIST_DETAIL_CACHE_MAX_ENTRIES", 1000)
+        )
+    return _detail_cache
+
+
+def _process_track(idx, t):
+    album = t.get('album') or {}
+    duration = t.get('duration', 0) // 1000
+    return {
+        "sort_id": idx + 1,
+        "picurl": album.get('picUrl') or album.get('blurPicUrl', ''),
+        "song_id": t.get('id'),
+        "title": t.get('name', '未知曲目'),
+        "duration": f"{duration // 60:02d}:{duration % 60:02d}",
+        "artists": ", ".join(
+            a['name'] for a in t.get('artists', []) if a.get('name')
+        ),
+        "album": album.get('name', '')
+    }
+
+
+def _fetch_playlist_detail(playlist_id, cookies, cached):
+    """
+    请求上游歌单详情；trackUpdateTime 与缓存一致时沿用已处理好的曲目列表
+    """
+    url = f"{get_base_url()}/api/playlist/detail?id={playlist_id}"
+    resp = get_upstream_client().get(url, headers=get_headers(), cookies=cookies, priority=PRIORITY_INTERACTIVE)
+    logger.debug("请求歌单详情", url=url)
+    return _process_playlist_detail(playlist_id, resp.status_code, resp.content, cached)
+
+
+def _process_playlist_detail(playlist_id, status_code, content, cached):
+    """
+    处理上游歌单详情响应（同步与 ASGI 模式共用）
+    """
+    if status_code != 200:
+        current_app.logger.warning(
+            f"外部接口返回非 200 状态码: {status_code}"
+        )
+        raise Exception(f"接口返回错误状态码: {status_code}")
+
+    data = json.loads(content)
+    if 'result' not in data:
+        current_app.logger.error("外部接口返回结果中缺少 'result' 字段")
+        raise Exception("返回数据缺少 'result' 字段")
+
+    playlist = data['result']
+    track_update_time = playlist.get('trackUpdateTime')
+    if cached and track_update_time is not None and cached["track_update_time"] == track_update_time:
+        logger.debug("trackUpdateTime 未变化，沿用已处理的曲目", playlist_id=playlist_id)
+        tracks = cached["tracks"]
+    else:
+        tracks = [_process_track(idx, t) for idx, t in enumerate(playlist.get('tracks', []))]
+
+    return {
+        "playlist_id": playlist.get('id'),
+        "name": playlist.get('name', '未知歌单'),
+        "track_update_time": track_update_time,
+        # 非公开歌单只缓存给当前登录用户
+        "private": bool(playlist.get('privacy')),
+        "tracks": tracks
+    }
+
+
+def _sync_detail_tracks(processed, cached):
+    """
+    曲目列表重新处理过（缓存未命中且 trackUpdateTime 变化）时，把公开歌单的曲目写入 playlist_tracks；
+    失败只记录日志，不影响详情接口
+    """
+    if processed["private"] or processed["playlist_id"] is None:
+        return
+    if cached is not None and processed["tracks"] is cached["tracks"]:
+        return
+    try:
+        sync_playlist_tracks(int(processed["playlist_id"]), processed["track_update_time"],
+                             [t["song_id"] for t in processed["tracks"]])
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"同步歌单曲目失败，playlist_id={processed['playlist_id']}: {e}", exc_info=True)
+
+
+def _parse_page_args(args):
+    """
+    解析 offset / limit，未传 limit 时返回全部曲目
+    """
+    offset = max(int(args.get('offset', 0)), 0)
+    limit = args.get('limit')
+    if limit is not None:
+        limit = min(max(int(limit), 1), MAX_DETAIL_PAGE_SIZE)
+    return offset, limit
+
+
+def _stream_playlist_detail(meta, tracks, ndjson):
+    """
+    逐条序列化曲目：ndjson 模式首行为歌单信息，其余每行一首；否则输出与非流式相同结构的 JSON
+    """
+    if ndjson:
+        yield json.dumps(meta, ensure_ascii=False) + "\n"
+        for track in tracks:
+            yield json.dumps(track, ensure_ascii=False) + "\n"
+        return
+
+    head = json.dumps({"code": 200, "data": meta}, ensure_ascii=False)
+    yield head[:-2] + ', "tracks": ['
+    for i, track in enumerate(tracks):
+        yield ("," if i else "") + json.dumps(track, ensure_ascii=False)
+    yield "]}}"
+
+
+def _parse_detail_args(args, cookies):
+    """
+    解析歌单详情的请求参数，返回 (参数, 错误结果)；同步与 ASGI 模式共用
+    """
+    playlist_id = args.get('id')
     if not playlist_id:
         current_app.logger.warning("缺少 playlist_id 参数")
-        return jsonify({"code": 400, "msg": "缺少歌单ID"})
+        return None, {"code": 400, "msg": "缺少歌单ID"}
 
     # 检查认证
     required_cookies = {
-        'MUSIC_U': request.cookies.get('MUSIC_U'),
-        '__csrf': request.cookies.get('__csrf')
+        'MUSIC_U': cookies.get('MUSIC_U'),
+        '__csrf': cookies.get('__csrf')
     }
     if not all(required_cookies.values()):
         current_app.logger.warning("用户缺少必要的认证 Cookie")
-        return jsonify({"code": 401, "msg": "认证失败，请确保已登录"})
+        return None, {"code": 401, "msg": "认证失败，请确保已登录"}
 
     try:
-        url = f"https://music.163.com/api/playlist/detail?id={playlist_id}"
-        session = get_retry_session()
-        resp = session.get(url, headers=get_headers(), cookies=required_cookies)
-        current_app.logger.debug(f"请求歌单详情 URL: {url}")
-
-        if resp.status_code != 200:
-            current_app.logger.warning(
-                f"外部接口返回非 200 状态码: {resp.status_code}"
-            )
-            raise Exception(f"接口返回错误状态码: {resp.status_code}")
-
-        data = resp.json()
-        if 'result' not in data:
-            current_app.logger.error("外部接口返回结果中缺少 'result' 字段")
-            raise Exception("返回数据缺少 'result' 字段")
-
-        playlist = data['result']
-        processed = {
-            "playlist_id": playlist.get('id'),
-            "name": playlist.get('name', '未知歌单'),
-            "tracks": [
-                {
-                    "sort_id": idx + 1,
-                    "picurl": t.get('album', {}).get('picUrl')
-                              or t.get('album', {}).get('blurPicUrl', ''),
-                    "song_id": t.get('id'),
-                    "title": t.get('name', '未知曲目'),
-                    "duration": f"{t.get('duration', 0) // 1000 // 60:02d}:"
-                                f"{t.get('duration', 0) // 1000 % 60:02d}",
-                    "artists": ", ".join(
-                        a['name'] for a in t.get('artists', []) if a.get('name')
-                    ),
-                    "album": t.get('album', {}).get('name', '')
-                }
-                for idx, t in enumerate(playlist.get('tracks', []))
-            ]
-        }
+        offset, limit = _parse_page_args(args)
+    except ValueError:
+        return None, {"code": 400, "msg": "offset / limit 参数格式错误"}
+    response_format = args.get('format', 'json')
+
+    progress_user = None
+    if args.get('with_progress') == '1':
+        try:
+            progress_user = int(args.get('user_id', ''))
+        except ValueError:
+            return None, {"code": 400, "msg": "with_progress=1 时需要提供 user_id"}
+
+    return {
+        "playlist_id": playlist_id,
+        "cookies": required_cookies,
+        "offset": offset,
+        "limit": limit,
+        "ndjson": response_format == 'ndjson',
+        "stream": response_format == 'ndjson' or args.get('stream') == '1',
+        "progress_user": progress_user
+    }, None
+
+
+def _detail_cache_keys(playlist_id, music_u):
+    """公开歌单按歌单 ID 缓存，非公开歌单按 歌单 ID + 登录用户 缓存"""
+    return str(playlist_id), f"{playlist_id}:{hashlib.sha1(music_u.encode()).hexdigest()[:16]}"
+
+
+def _page_detail(processed, offset, limit):
+    """返回 (歌单信息, 当前页曲目)"""
+    tracks = processed["tracks"]
+    meta = {
+        "playlist_id": processed["playlist_id"],
+        "name": processed["name"],
+        "total": len(tracks)
+    }
+    if limit is not None or offset:
+        end = len(tracks) if limit is None else offset + limit
+        meta.update({"offset": offset, "next_offset": end if end < len(tracks) else None})
+        tracks = tracks[offset:end]
+    return meta, tracks
+
+
+def _attach_progress(tracks, positions):
+    # 缓存中的曲目列表是共享的，附带进度时复制一份
+    return [dict(t, progress=positions.get(t["song_id"])) for t in tracks]
+
+
+def get_playlist_detail():
+    current_app.logger.info("进入 get_playlist_detail 函数")
+
+    params, error = _parse_detail_args(request.args, request.cookies)
+    if error is not None:
+        return jsonify(error)
+    playlist_id = params["playlist_id"]
+
+    try:
+        cache = get_detail_cache()
+        public_key, user_key = _detail_cache_keys(playlist_id, params["cookies"]['MUSIC_U'])
+
+        processed = cache.get(public_key) or cache.get(user_key)
+        if processed is None:
+            cached = cache.peek(public_key) or cache.peek(user_key)
+            processed = _fetch_playlist_detail(playlist_id, params["cookies"], cached)
+            cache.set(user_key if processed["private"] else public_key, processed)
+            _sync_detail_tracks(processed, cached)
+
+        meta, tracks = _page_detail(processed, params["offset"], params["limit"])
+
+        if params["progress_user"] is not None:
+            positions = get_resume_positions(params["progress_user"], [t["song_id"] for t in tracks if t["song_id"]])
+            tracks = _attach_progress(tracks, positions)
 
         current_app.logger.info(
             f"成功获取并处理歌单详情，playlist_id={playlist_id}"
         )
-        return jsonify({"code": 200, "data": processed})
+
+        if params["stream"]:
+            mimetype = "application/x-ndjson" if params["ndjson"] else "application/json"
+            return current_app.response_class(
+                stream_with_context(_stream_playlist_detail(meta, tracks, params["ndjson"])),
+                mimetype=mimetype
+            )
+
+        return jsonify({"code": 200, "data": dict(meta, tracks=tracks)})
 
     except Exception as e:
         current_app.logger.error(
@@ -168,6 +468,138 @@ def get_playlist_detail():
         return jsonify({"code": 500, "msg": "服务器处理异常", "error_detail": str(e)})
 
 
+def _fetch_song_details(song_ids):
+    """
+    一次上游请求获取多首歌曲详情（/api/song/detail 支持多个 id），返回 {song_id: 歌曲信息}
+    """
+    url = _song_details_url(song_ids)
+    logger.debug("批量请求单曲详情", count=len(song_ids))
+
+    resp = get_upstream_client().get(url, priority=PRIORITY_INTERACTIVE)  # 也可添加 headers, cookies 等
+    return _process_song_details(resp.status_code, resp.content)
+
+
+def _song_details_url(song_ids):
+    return f"{get_base_url()}/api/song/detail?ids=[{','.join(str(i) for i in song_ids)}]"
+
+
+def _process_song_details(status_code, content):
+    if status_code != 200:
+        current_app.logger.warning(
+            f"获取单曲详情失败，状态码: {status_code}"
+        )
+        raise Exception(f"获取单曲详情失败，状态码: {status_code}")
+
+    return {song['id']: song for song in json.loads(content).get('songs', []) if 'id' in song}
+
+
+def get_song_loader():
+    """
+    并发请求在短时间窗口内合并为一次批量上游请求
+    """
+    global _song_loader
+    if _song_loader is None:
+        app = current_app._get_current_object()
+        config = app.config
+
+        def batch_fn(song_ids):
+            # 合并后的批次可能在定时器线程中发出，需要自己推入应用上下文
+            with app.app_context():
+                return _fetch_song_details(song_ids)
+
+        _song_loader = BatchLoader(
+            batch_fn,
+            window=config.get("SONG_DETAIL_BATCH_WINDOW", 0.01),
+            max_batch=config.get("SONG_DETAIL_BATCH_SIZE", 200)
+        )
+    return _song_loader
+
+
+def get_song_cache():
+    global _song_cache
+    if _song_cache is None:
+        config = current_app.config
+        _song_cache = TTLCache(
+            "song_detail",
+            ttl=config.get("SONG_DETAIL_CACHE_TTL", 3600),
+            max_entries=config.get("SONG_DETAIL_CACHE_MAX_ENTRIES", 50000)
+        )
+    return _song_cache
+
+
+def get_song_details(song_ids):
+    """
+    先查单曲缓存，未命中的交给合并加载器批量请求上游，返回 {song_id: 歌曲信息}（查不到的不包含）
+    """
+    cache = get_song_cache()
+    found = cache.get_many(song_ids)
+    missing = [song_id for song_id in song_ids if song_id not in found]
+    if missing:
+        timeout = current_app.config.get("SONG_DETAIL_TIMEOUT", 15)
+        for song_id, song in get_song_loader().load_many(missing, timeout=timeout).items():
+            if song is not None:
+                cache.set(song_id, song)
+                found[song_id] = song
+    return found
+
+
+def _parse_song_ids():
+    """
+    GET ?ids=1,2,3 或 POST {"ids": [1, 2, 3]}，去重并保持顺序
+    """
+    if request.method == 'POST':
+        return _normalize_song_ids((request.get_json(silent=True) or {}).get('ids'))
+    return _normalize_song_ids(request.args.get('ids', ''))
+
+
+def _normalize_song_ids(raw_ids):
+    """
+    逗号分隔的字符串或 id 数组，去重并保持顺序（同步与 ASGI 模式共用）
+    """
+    if isinstance(raw_ids, str):
+        raw_ids = [i for i in raw_ids.split(',') if i.strip()]
+    return list(dict.fromkeys(int(i) for i in raw_ids or []))
+
+
+def _check_song_ids(song_ids):
+    if not song_ids:
+        current_app.logger.warning("缺少 ids 参数")
+        return {"code": 400, "msg": "缺少 ids"}
+    if len(song_ids) > MAX_SONG_IDS:
+        return {"code": 400, "msg": f"一次最多查询 {MAX_SONG_IDS} 首歌曲"}
+    return None
+
+
+def _song_details_result(song_ids, found):
+    current_app.logger.info(f"批量获取单曲详情，请求 {len(song_ids)} 首，找到 {len(found)} 首")
+    return {"code": 200, "data": {
+        "songs": [found[song_id] for song_id in song_ids if song_id in found],
+        "missing": [song_id for song_id in song_ids if song_id not in found]
+    }}
+
+
+def get_song_details_batch():
+    current_app.logger.info("进入 get_song_details_batch 函数")
+
+    try:
+        song_ids = _parse_song_ids()
+    except (ValueError, TypeError):
+        current_app.logger.warning("ids 参数格式错误")
+        return jsonify({"code": 400, "msg": "ids 参数格式错误"})
+    error = _check_song_ids(song_ids)
+    if error is not None:
+        return jsonify(error)
+
+    try:
+        found = get_song_details(song_ids)
+        return jsonify(_song_details_result(song_ids, found))
+    except Exception as e:
+        current_app.logger.error(
+            f"批量获取单曲详情出现异常: {e}", exc_info=True
+        )
+        return jsonify({"code": 500, "msg": "获取单曲详情出现异常", "error": str(e)})
+
+
 def get_single_song_detail():
     current_app.logger.info("进入 get_single_song_detail 函数")
 
@@ -175,25 +607,17 @@ def get_single_song_detail():
     if not song_id:
         current_app.logger.warning("缺少 song_id 参数")
         return jsonify({"code": 400, "msg": "缺少 song_id"})
-
-    url = f"https://music.163.com/api/song/detail?ids=[{song_id}]"
-    current_app.logger.debug(f"请求单曲详情 URL: {url}")
-
     try:
-        resp = requests.get(url)  # 也可添加 headers, cookies 等
-        if resp.status_code != 200:
-            current_app.logger.warning(
-                f"获取单曲详情失败，状态码: {resp.status_code}"
-            )
-            return jsonify({"code": 500, "msg": "获取单曲详情失败，状态码不为 200"})
+        song_id = int(song_id)
+    except ValueError:
+        return jsonify({"code": 400, "msg": "song_id 参数格式错误"})
 
-        data = resp.json()
-        songs = data.get('songs', [])
-        if not songs:
+    try:
+        song_info = get_song_details([song_id]).get(song_id)
+        if not song_info:
             current_app.logger.warning("返回数据中未找到歌曲信息")
             return jsonify({"code": 404, "msg": "歌曲信息为空"})
 
-        song_info = songs[0]
         current_app.logger.info(f"成功获取单曲详情 song_id={song_id}")
         return jsonify({"code": 200, "data": song_info})
     except Exception as e:
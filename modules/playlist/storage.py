@@ -0,0 +1,31 @@
+import hashlib
+import zlib
+
+COMPRESS_LEVEL = 6
+
+
+def content_hash(raw):
+    """
+    歌单 JSON 字节的 sha256，用于判断上游数据是否变化
+    """
+    return hashlib.sha256(raw).hexdigest()
+
+
+def load_playlist_raw(playlist):
+    """
+    取出数据库记录中的歌单 JSON 字节（不做 JSON 解析），兼容尚未迁移的 LONGTEXT 记录
+    """
+    if playlist.payload is not None:
+        return zlib.decompress(playlist.payload)
+    if playlist.playlist_data is not None:
+        return playlist.playlist_data.encode("utf-8")
+    return None
+
+
+def store_playlist(playlist, raw, digest):
+    """
+    以 内容哈希 + zlib 压缩 payload 的格式写入记录，并清空旧的 LONGTEXT 字段
+    """
+    playlist.content_hash = digest
+    playlist.payload = zlib.compress(raw, COMPRESS_LEVEL)
+    playlist.playlist_data = None
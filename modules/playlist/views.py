@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request
-from .services import show_playlist, get_playlist_detail,get_single_song_detail
+from .services import (show_playlist, get_playlist_changes, get_playlist_detail, get_single_song_detail,
+                       get_song_details_batch)
 
 playlist_bp = Blueprint('playlist', __name__, url_prefix='/api/playlist')
 
@@ -10,6 +11,12 @@ def save():
     return show_playlist()
 
 
+@playlist_bp.route('/changes', methods=['GET'])
+# 增量同步：自某个版本之后歌单列表 / 歌单曲目的变化
+def changes():
+    return get_playlist_changes()
+
+
 @playlist_bp.route('/detail', methods=['GET'])
 # 获取歌单详情
 def detail():
@@ -17,4 +24,9 @@ def detail():
 
 @playlist_bp.route('/single_detail', methods=['GET'])
 def single_detail():
-    return get_single_song_detail()
\ No newline at end of file
+    return get_single_song_detail()
+
+@playlist_bp.route('/song_details', methods=['GET', 'POST'])
+# 批量获取歌曲详情
+def song_details():
+    return get_song_details_batch()
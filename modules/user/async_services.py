@@ -0,0 +1,179 @@
+"""
+扫码登录接口的 asyncio 版本（ASGI 模式）：长轮询与 SSE 在协程中等待状态变化，不再各占一个线程；
+上游登录状态仍由本进程的 LoginWatcher 轮询线程查询（集群内每个 unikey 只有一个轮询者）。
+"""
+
+from flask import current_app
+from starlette.responses import Response, StreamingResponse
+
+from utils.async_support import endpoint, json_response, run_sync
+from utils.async_upstream import get_async_upstream_client
+from utils.auth import encrypted_request, get_base_url, get_headers, parse_unikey_response, render_qrcode
+from utils.redis_client import get_async_redis_client
+from utils.upstream_scheduler import PRIORITY_LOGIN
+from .login_watcher import is_terminal
+from .qrcode_pool import QRCodeEntry
+from .services import (ISSUED_KEY, QRCODE_IMAGE_CACHE_CONTROL, SSE_HEADERS, _claims_result, _issued_ttl,
+                       _logout_result, _parse_wait_args, _qrcode_image, _sse_event, _state_response,
+                       get_issued_qrcodes, get_login_watcher, get_qrcode_pool)
+
+
+async def get_qrcode_unikey_async():
+    current_app.logger.info("准备向服务端请求二维码 unikey")
+    url = f"{get_base_url()}/weapi/login/qrcode/unikey"
+    try:
+        resp = await get_async_upstream_client().post(url, data=encrypted_request({"type": 1}),
+                                                      headers=get_headers(), priority=PRIORITY_LOGIN)
+        return parse_unikey_response(resp)
+    except Exception as e:
+        current_app.logger.exception(f"获取 unikey 过程中出现异常: {str(e)}")
+        raise
+
+
+def _qrcode_image_response(request, entry, fmt, cache_control, conditional=False):
+    body, mimetype, etag = _qrcode_image(entry, fmt)
+    headers = {"Cache-Control": cache_control, "X-Unikey": entry.unikey, "ETag": f'"{etag}"'}
+    if conditional and request.headers.get("if-none-match") in (headers["ETag"], etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=mimetype, headers=headers)
+
+
+async def _login_response_async(redis_client, watcher, unikey, state):
+    """_login_response 的 asyncio 版本"""
+    result = await watcher.claim_result_async(redis_client, unikey) if _claims_result(state) else None
+    return _state_response(state, result)
+
+
+@endpoint
+async def get_qrcode(request):
+    fmt = request.query_params.get("format", "json")
+    if fmt not in ("json", "png", "svg"):
+        return json_response({"code": 400, "msg": "format 只支持 json / png / svg"})
+
+    try:
+        entry = None
+        if current_app.config.get("QRCODE_POOL_ENABLED", True):
+            entry = get_qrcode_pool().take()
+        if entry is None:
+            current_app.logger.info("[get_qrcode] 二维码池为空，同步生成二维码")
+            unikey = await get_qrcode_unikey_async()
+            entry = QRCodeEntry(unikey, *await run_sync(render_qrcode, unikey))
+        get_issued_qrcodes().set(entry.unikey, entry)
+        await get_async_redis_client().set(ISSUED_KEY.format(entry.unikey), 1, ex=_issued_ttl())
+
+        current_app.logger.debug("[get_qrcode] 生成的 unikey: %s", entry.unikey)
+
+        if fmt != "json":
+            # 每次请求都会发放新的 unikey，不能被缓存
+            return _qrcode_image_response(request, entry, fmt, "no-store")
+        return json_response({"code": 200, "data": {"unikey": entry.unikey, "qrCodeBase64": entry.png_base64}})
+    except Exception as e:
+        current_app.logger.error("[get_qrcode] 发生异常: %s", str(e))
+        return json_response({"code": 500, "msg": str(e)})
+
+
+def _get_qrcode_image(fmt):
+    @endpoint
+    async def view(request):
+        unikey = request.path_params["unikey"]
+        entry = get_issued_qrcodes().get(unikey)
+        if entry is None and await get_async_redis_client().exists(ISSUED_KEY.format(unikey)):
+            entry = QRCodeEntry(unikey, *await run_sync(render_qrcode, unikey))
+            get_issued_qrcodes().set(unikey, entry)
+        if entry is None:
+            return json_response({"code": 404, "msg": "二维码不存在或已过期"}, status_code=404)
+        return _qrcode_image_response(request, entry, fmt, QRCODE_IMAGE_CACHE_CONTROL, conditional=True)
+    return view
+
+
+get_qrcode_png = _get_qrcode_image("png")
+get_qrcode_svg = _get_qrcode_image("svg")
+
+
+@endpoint
+async def check_login(request):
+    unikey = request.query_params.get('unikey')
+
+    if not unikey:
+        current_app.logger.warning("[check_login] 缺少 unikey 参数")
+        return json_response({"code": 400, "msg": "缺少 unikey 参数"})
+
+    current_app.logger.info("[check_login] 开始检查登录状态, unikey=%s", unikey)
+
+    try:
+        redis_client = get_async_redis_client()
+        watcher = get_login_watcher()
+        await watcher.watch_async(redis_client, unikey)
+        state = await watcher.get_state_async(redis_client, unikey)
+        if state is None:
+            # 首次查询时等待第一次轮询结果
+            state = await watcher.wait_for_change_async(
+                redis_client, unikey, 0, current_app.config.get("LOGIN_FIRST_POLL_TIMEOUT", 3)
+            )
+        return json_response(await _login_response_async(redis_client, watcher, unikey, state))
+
+    except Exception as e:
+        current_app.logger.error("[check_login] 发生异常: %s", str(e))
+        return json_response({"code": 500, "msg": str(e)})
+
+
+@endpoint
+async def wait_login(request):
+    unikey, version, timeout, error = _parse_wait_args(request.query_params)
+    if error is not None:
+        return json_response(error)
+
+    try:
+        redis_client = get_async_redis_client()
+        watcher = get_login_watcher()
+        await watcher.watch_async(redis_client, unikey)
+        state = await watcher.wait_for_change_async(redis_client, unikey, version, timeout)
+        return json_response(await _login_response_async(redis_client, watcher, unikey, state))
+    except Exception as e:
+        current_app.logger.error("[wait_login] 发生异常: %s", str(e))
+        return json_response({"code": 500, "msg": str(e)})
+
+
+@endpoint
+async def login_events(request):
+    unikey = request.query_params.get('unikey')
+    if not unikey:
+        current_app.logger.warning("[login_events] 缺少 unikey 参数")
+        return json_response({"code": 400, "msg": "缺少 unikey 参数"})
+
+    app = current_app._get_current_object()
+    redis_client = get_async_redis_client()
+    watcher = get_login_watcher()
+    keepalive = current_app.config.get("LOGIN_SSE_KEEPALIVE", 15)
+
+    async def generate():
+        # 响应体在视图返回后才开始迭代，需要自己推入应用上下文
+        with app.app_context():
+            version = 0
+            while True:
+                await watcher.watch_async(redis_client, unikey)
+                state = await watcher.wait_for_change_async(redis_client, unikey, version, keepalive)
+                if state is None or state["version"] <= version:
+                    # 没有变化，发送注释行保持连接
+                    yield ": keepalive\n\n"
+                    continue
+                version = state["version"]
+                yield _sse_event(await _login_response_async(redis_client, watcher, unikey, state))
+                if is_terminal(state["code"]):
+                    return
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@endpoint
+async def logout(request):
+    current_app.logger.info("[logout] 开始执行注销")
+    url = f"{get_base_url()}/api/logout"
+
+    try:
+        resp = await get_async_upstream_client().get(url, headers=get_headers(), cookies=request.cookies)
+    except Exception as e:
+        current_app.logger.error("[logout] 请求注销接口异常: %s", str(e))
+        return json_response({"code": 500, "msg": "注销失败"})
+
+    return json_response(_logout_result(resp))
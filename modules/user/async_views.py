@@ -0,0 +1,14 @@
+from utils.async_support import route
+from .async_services import (get_qrcode, get_qrcode_png, get_qrcode_svg, check_login, wait_login, login_events,
+                             logout)
+
+# 与 user_bp 相同的路径与返回结构
+routes = [
+    route('/api/user/qrcode', get_qrcode, methods=['GET']),
+    route('/api/user/qrcode/{unikey}.png', get_qrcode_png, methods=['GET']),
+    route('/api/user/qrcode/{unikey}.svg', get_qrcode_svg, methods=['GET']),
+    route('/api/user/check_login', check_login, methods=['GET']),
+    route('/api/user/login_wait', wait_login, methods=['GET']),
+    route('/api/user/login_events', login_events, methods=['GET']),
+    route('/api/user/logout', logout, methods=['GET']),
+]
@@ -0,0 +1,288 @@
+import asyncio
+import heapq
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+STATE_KEY = "login_watch:{}"  # 最新登录状态（JSON，只含状态码与提示），所有进程共享
+RESULT_KEY = "login_watch_result:{}"  # 登录成功的完整结果（含 cookies），GETDEL 取走，只发给一个请求
+LOCK_KEY = "login_watch_lock:{}"  # 负责轮询该 unikey 的进程持有的租约
+SEEN_KEY = "login_watch_seen:{}"  # 最近还有客户端在等待
+EVENTS_CHANNEL = "login_watch_events"  # 状态变化时发布 unikey
+
+CODE_EXPIRED = 800
+CODE_WAITING_SCAN = 801
+CODE_WAITING_CONFIRM = 802
+CODE_CONFIRMED = 803
+PENDING_CODES = {CODE_WAITING_SCAN, CODE_WAITING_CONFIRM}  # 其它状态码（过期、已确认、异常）均为终态
+PUBLIC_FIELDS = ("code", "message", "msg")  # 写入共享状态、任何持有 unikey 的请求都能读到的字段
+
+
+def is_terminal(code):
+    return code not in PENDING_CODES
+
+
+class LoginWatcher:
+    """
+    服务端扫码登录轮询：
+    每个 unikey 在整个集群中只有一个轮询者（Redis 租约），按状态自适应调整轮询间隔，
+    状态写入 Redis 并通过 pub/sub 通知各进程中等待的长轮询 / SSE 请求。
+    上游轮询次数只与待登录的 unikey 数有关，与客户端的轮询频率无关。
+    """
+
+    def __init__(self, app, redis_client, poll_fn, on_confirmed, min_interval=1.0, max_interval=5.0,
+                 max_lifetime=300, idle_timeout=60, result_ttl=60, workers=8):
+        self.app = app
+        self.redis = redis_client
+        self.poll_fn = poll_fn
+        self.on_confirmed = on_confirmed
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.state_ttl = max_lifetime + 300
+        self.result_ttl = result_ttl
+
+        self._lock = threading.Lock()
+        self._heap = []  # (下次轮询时间, unikey)
+        self._watching = {}  # unikey -> {"started": ..., "interval": ...}
+        self._wakeup = threading.Event()
+        self._waiters = {}  # unikey -> set(通知函数)，线程中等待时为 Event.set，协程中等待时唤醒对应的 asyncio.Event
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="login-watch")
+
+        threading.Thread(target=self._schedule_loop, name="login-watch-scheduler", daemon=True).start()
+        threading.Thread(target=self._listen_loop, name="login-watch-listener", daemon=True).start()
+
+    # ---------- 对外接口 ----------
+
+    def watch(self, unikey):
+        """
+        标记有客户端在等待，并确保集群中有进程在轮询该 unikey
+        """
+        self.redis.set(SEEN_KEY.format(unikey), 1, ex=self.idle_timeout)
+        if self._is_watching(unikey):
+            return
+        state = self.get_state(unikey)
+        if state and is_terminal(state["code"]):
+            return
+        if self.redis.set(LOCK_KEY.format(unikey), 1, nx=True, ex=self._lock_ttl()):
+            self._start(unikey)
+
+    def get_state(self, unikey):
+        raw = self.redis.get(STATE_KEY.format(unikey))
+        return json.loads(raw) if raw else None
+
+    def claim_result(self, unikey):
+        """
+        取走登录成功的完整结果（含 cookies）；已被取走或已过期时返回 None
+        """
+        raw = self.redis.getdel(RESULT_KEY.format(unikey))
+        return json.loads(raw) if raw else None
+
+    def wait_for_change(self, unikey, version, timeout):
+        """
+        等到状态版本大于 version（或出现终态）后返回最新状态；超时返回当前状态（可能为 None）
+        """
+        deadline = time.monotonic() + timeout
+        event = threading.Event()
+        self._add_waiter(unikey, event.set)
+        try:
+            while True:
+                state = self.get_state(unikey)
+                if state and (state["version"] > version or is_terminal(state["code"])):
+                    return state
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return state
+                # pub/sub 通知为主，同时最多 1 秒兜底检查一次，避免漏掉消息
+                event.wait(min(remaining, 1.0))
+                event.clear()
+        finally:
+            self._remove_waiter(unikey, event.set)
+
+    # ---------- asyncio 接口（ASGI 模式）----------
+    # 只把 Redis 读写与等待换成协程；轮询上游仍在本进程的轮询线程中进行，集群内的租约与通知机制不变
+
+    async def watch_async(self, redis_client, unikey):
+        """watch 的 asyncio 版本，redis_client 为 redis.asyncio 客户端"""
+        await redis_client.set(SEEN_KEY.format(unikey), 1, ex=self.idle_timeout)
+        if self._is_watching(unikey):
+            return
+        state = await self.get_state_async(redis_client, unikey)
+        if state and is_terminal(state["code"]):
+            return
+        if await redis_client.set(LOCK_KEY.format(unikey), 1, nx=True, ex=self._lock_ttl()):
+            self._start(unikey)
+
+    async def get_state_async(self, redis_client, unikey):
+        raw = await redis_client.get(STATE_KEY.format(unikey))
+        return json.loads(raw) if raw else None
+
+    async def claim_result_async(self, redis_client, unikey):
+        raw = await redis_client.getdel(RESULT_KEY.format(unikey))
+        return json.loads(raw) if raw else None
+
+    async def wait_for_change_async(self, redis_client, unikey, version, timeout):
+        """wait_for_change 的 asyncio 版本：等待期间不占用线程"""
+        deadline = time.monotonic() + timeout
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        def notify():
+            # 由订阅线程调用，切回事件循环唤醒协程
+            loop.call_soon_threadsafe(event.set)
+
+        self._add_waiter(unikey, notify)
+        try:
+            while True:
+                state = await self.get_state_async(redis_client, unikey)
+                if state and (state["version"] > version or is_terminal(state["code"])):
+                    return state
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return state
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+        finally:
+            self._remove_waiter(unikey, notify)
+
+    def _is_watching(self, unikey):
+        with self._lock:
+            return unikey in self._watching
+
+    def _lock_ttl(self):
+        # 租约时间要比最长轮询间隔长，轮询者每次轮询时续约
+        return int(self.max_interval * 3) + 5
+
+    def _start(self, unikey):
+        with self._lock:
+            self._watching[unikey] = {"started": time.monotonic(), "interval": self.min_interval}
+            heapq.heappush(self._heap, (time.monotonic(), unikey))
+        self._wakeup.set()
+
+    def _add_waiter(self, unikey, notify):
+        with self._lock:
+            self._waiters.setdefault(unikey, set()).add(notify)
+
+    def _remove_waiter(self, unikey, notify):
+        with self._lock:
+            waiters = self._waiters.get(unikey)
+            if waiters is not None:
+                waiters.discard(notify)
+                if not waiters:
+                    self._waiters.pop(unikey, None)
+
+    # ---------- 轮询 ----------
+
+    def _schedule_loop(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[1])
+                next_at = self._heap[0][0] if self._heap else None
+            for unikey in due:
+                self._executor.submit(self._poll, unikey)
+            timeout = None if next_at is None else max(0.0, next_at - time.monotonic())
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def _stop(self, unikey):
+        with self._lock:
+            self._watching.pop(unikey, None)
+        self.redis.delete(LOCK_KEY.format(unikey))
+
+    def _poll(self, unikey):
+        with self._lock:
+            info = self._watching.get(unikey)
+        if info is None:
+            return
+
+        try:
+            code = self._poll_once(unikey, info)
+        except Exception as e:
+            # Redis 或上游出错时按未取得状态处理、稍后重试；不能丢掉这个 unikey，否则它留在 _watching 中再也不会被轮询
+            self.app.logger.error(f"[login_watcher] 轮询 unikey={unikey} 出现异常: {e}")
+            code = None
+
+        # 自适应间隔：已扫码等待确认时加快，长时间未扫码或出错时逐步放慢
+        if code == CODE_WAITING_CONFIRM:
+            interval = self.min_interval
+        else:
+            interval = min(self.max_interval, info["interval"] * 1.5)
+        with self._lock:
+            if unikey not in self._watching:
+                # 已停止（超时、无人等待或出现终态）
+                return
+            info["interval"] = interval
+            heapq.heappush(self._heap, (time.monotonic() + interval, unikey))
+        self._wakeup.set()
+
+    def _poll_once(self, unikey, info):
+        """
+        轮询一次上游并写入状态，返回状态码；需要停止轮询时调用 _stop
+        """
+        if time.monotonic() - info["started"] > self.max_lifetime or not self.redis.exists(SEEN_KEY.format(unikey)):
+            # 超过二维码有效期，或已经没有客户端在等待
+            self._stop(unikey)
+            return None
+
+        self.redis.expire(LOCK_KEY.format(unikey), self._lock_ttl())
+        with self.app.app_context():
+            result = self.poll_fn(unikey)
+            if result.get("code") == CODE_CONFIRMED:
+                # 登录成功后的写库等处理，可能把结果改写为错误信息
+                result = self.on_confirmed(result)
+            code = result.get("code")
+
+        if code is not None:
+            self._update_state(unikey, code, result)
+            if is_terminal(code):
+                self._stop(unikey)
+        return code
+
+    def _update_state(self, unikey, code, result):
+        """
+        状态码变化（或出现终态）时写入新版本并发布通知；
+        共享状态只保存状态码与提示，登录成功的完整结果（含 cookies）单独存放，只能被取走一次
+        """
+        state = self.get_state(unikey)
+        if state and state["code"] == code and not is_terminal(code):
+            return
+        if code == CODE_CONFIRMED:
+            self.redis.set(RESULT_KEY.format(unikey), json.dumps(result), ex=self.result_ttl)
+        new_state = {
+            "version": (state["version"] if state else 0) + 1,
+            "code": code,
+            "result": {key: result[key] for key in PUBLIC_FIELDS if key in result},
+            "updated_at": time.time()
+        }
+        self.redis.set(STATE_KEY.format(unikey), json.dumps(new_state), ex=self.state_ttl)
+        self.redis.publish(EVENTS_CHANNEL, unikey)
+
+    # ---------- 通知 ----------
+
+    def _listen_loop(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(EVENTS_CHANNEL)
+                # 不用 listen()：连接设置了 socket 读超时，频道空闲时 listen() 会因超时报错
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._notify(message["data"])
+            except Exception as e:
+                self.app.logger.error(f"[login_watcher] 订阅登录状态通知出现异常: {e}")
+                time.sleep(1)
+
+    def _notify(self, unikey):
+        with self._lock:
+            waiters = list(self._waiters.get(unikey, ()))
+        for notify in waiters:
+            notify()
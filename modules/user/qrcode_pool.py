@@ -0,0 +1,122 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QRCodeEntry:
+    """池中的一个二维码：unikey 与预先渲染好的图片"""
+
+    __slots__ = ("unikey", "png", "svg", "png_base64", "created_at")
+
+    def __init__(self, unikey, png, svg, png_base64):
+        self.unikey = unikey
+        self.png = png
+        self.svg = svg
+        self.png_base64 = png_base64
+        self.created_at = time.time()
+
+
+class QRCodePool:
+    """
+    预热的登录二维码池：
+    - 后台定时调用 refill()，提前向上游申请 unikey 并渲染好 PNG / SVG，take() 只需 O(1) 取出
+    - 入池超过 max_age 秒的条目在过期前丢弃，保证发出的二维码还有足够的有效时间
+    - 池大小按发放速率（EWMA）自适应：target = 发放速率 × lead_time（四舍五入），限制在 [min_size, max_size]；
+      每次 refill 最多补充 max_refill 个，避免突发时对上游造成冲击
+    - min_size 默认为 0：没有流量时速率衰减到 0，池也不再补充，空闲的 worker 不会定期向上游申请 unikey
+    """
+
+    def __init__(self, app, fetch_fn, render_fn, min_size=0, max_size=50, max_age=60, lead_time=10,
+                 max_refill=10, workers=4, alpha=0.3):
+        self.app = app
+        self.fetch_fn = fetch_fn
+        self.render_fn = render_fn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_age = max_age
+        self.lead_time = lead_time
+        self.max_refill = max_refill
+        self.alpha = alpha
+
+        self._entries = deque()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qrcode-pool")
+        self._issued_since = 0  # 上次 refill 以来发放的数量
+        self._last_refill = time.monotonic()
+        self._rate = 0.0  # 每秒发放数量的 EWMA
+        self._stats = {"hits": 0, "misses": 0, "refilled": 0, "expired": 0, "refill_errors": 0}
+
+    def take(self):
+        """
+        取出最早入池、仍未过期的条目；池为空时返回 None，由调用方同步生成
+        """
+        now = time.time()
+        with self._lock:
+            self._issued_since += 1
+            while self._entries:
+                entry = self._entries.popleft()
+                if now - entry.created_at < self.max_age:
+                    self._stats["hits"] += 1
+                    return entry
+                self._stats["expired"] += 1
+            self._stats["misses"] += 1
+            return None
+
+    def create(self):
+        """
+        同步申请一个 unikey 并渲染图片
+        """
+        with self.app.app_context():
+            unikey = self.fetch_fn()
+            return QRCodeEntry(unikey, *self.render_fn(unikey))
+
+    def target_size(self):
+        with self._lock:
+            rate = self._rate
+        # 四舍五入而不是向上取整：EWMA 只会无限趋近 0，向上取整会让空闲时也一直保留一个
+        return max(self.min_size, min(self.max_size, math.floor(rate * self.lead_time + 0.5)))
+
+    def refill(self):
+        """
+        更新发放速率、丢弃即将过期的条目，并把池补充到目标大小，返回本次补充的数量
+        """
+        now = time.time()
+        with self._lock:
+            elapsed = max(time.monotonic() - self._last_refill, 1e-3)
+            self._last_refill = time.monotonic()
+            self._rate = self.alpha * (self._issued_since / elapsed) + (1 - self.alpha) * self._rate
+            self._issued_since = 0
+            while self._entries and now - self._entries[0].created_at >= self.max_age:
+                self._entries.popleft()
+                self._stats["expired"] += 1
+            size = len(self._entries)
+
+        missing = min(self.target_size() - size, self.max_refill)
+        if missing <= 0:
+            return 0
+
+        futures = [self._executor.submit(self.create) for _ in range(missing)]
+        added = 0
+        for future in futures:
+            try:
+                entry = future.result()
+            except Exception as e:
+                self.app.logger.error(f"[qrcode_pool] 补充二维码失败: {e}")
+                with self._lock:
+                    self._stats["refill_errors"] += 1
+                continue
+            with self._lock:
+                self._entries.append(entry)
+                self._stats["refilled"] += 1
+            added += 1
+        return added
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["issue_rate"] = round(self._rate, 3)
+        stats["target_size"] = self.target_size()
+        return stats
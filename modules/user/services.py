@@ -1,27 +1,214 @@
-from flask import jsonify, request, current_app
-from utils.auth import get_qrcode_unikey, generate_qrcode_image, check_login_status_once, get_user_profile, get_headers
+from flask import jsonify, request, current_app, stream_with_context
+from utils.auth import get_base_url, get_qrcode_unikey, render_qrcode, check_login_status_once, get_user_profile, get_headers
+from utils.cache import TTLCache
+from utils.redis_client import get_redis_client
+from utils.upstream import get_upstream_client
+from utils.upstream_scheduler import PRIORITY_BACKGROUND
+from .login_watcher import CODE_CONFIRMED, CODE_WAITING_SCAN, LoginWatcher, is_terminal
 from .models import User
+from .qrcode_pool import QRCodeEntry, QRCodePool
 import json
-import requests
+import math
 from utils.db import db
 
+MAX_LONG_POLL_TIMEOUT = 55
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+QRCODE_IMAGE_CACHE_CONTROL = "private, no-store"
+ISSUED_KEY = "qrcode_issued:{}"  # 已发放的 unikey（所有进程共享），只为这些 unikey 渲染图片
+
+_login_watcher = None
+_qrcode_pool = None
+_issued_qrcodes = None
+
+
+def get_qrcode_pool():
+    global _qrcode_pool
+    if _qrcode_pool is None:
+        config = current_app.config
+        _qrcode_pool = QRCodePool(
+            current_app._get_current_object(),
+            lambda: get_qrcode_unikey(PRIORITY_BACKGROUND),
+            render_qrcode,
+            min_size=config.get("QRCODE_POOL_MIN_SIZE", 0),
+            max_size=config.get("QRCODE_POOL_MAX_SIZE", 50),
+            max_age=config.get("QRCODE_POOL_MAX_AGE", 60),
+            lead_time=config.get("QRCODE_POOL_LEAD_TIME", 10),
+            max_refill=config.get("QRCODE_POOL_MAX_REFILL", 10)
+        )
+    return _qrcode_pool
+
+
+def get_issued_qrcodes():
+    """
+    已发放的二维码（unikey -> QRCodeEntry），供按 unikey 取图片时直接返回预渲染结果
+    """
+    global _issued_qrcodes
+    if _issued_qrcodes is None:
+        _issued_qrcodes = TTLCache(
+            "issued_qrcodes",
+            ttl=current_app.config.get("QRCODE_IMAGE_TTL", 300),
+            max_entries=current_app.config.get("QRCODE_POOL_MAX_SIZE", 50) * 100
+        )
+    return _issued_qrcodes
+
+
+def _issued_ttl():
+    return current_app.config.get("QRCODE_IMAGE_TTL", 300)
+
+
+def _issue_qrcode(entry):
+    """记录发放的二维码：本进程缓存图片，Redis 中登记 unikey 供其它进程确认"""
+    get_issued_qrcodes().set(entry.unikey, entry)
+    get_redis_client().set(ISSUED_KEY.format(entry.unikey), 1, ex=_issued_ttl())
+
+
+def refill_qrcode_pool():
+    """
+    定时任务：按发放速率补充二维码池
+    """
+    return get_qrcode_pool().refill()
+
+
+def _qrcode_image(entry, fmt):
+    """返回 (图片字节, mimetype, ETag)"""
+    if fmt == "svg":
+        return entry.svg, "image/svg+xml", f"{entry.unikey}.{fmt}"
+    return entry.png, "image/png", f"{entry.unikey}.{fmt}"
+
+
+def _qrcode_image_response(entry, fmt, cache_control):
+    body, mimetype, etag = _qrcode_image(entry, fmt)
+    response = current_app.response_class(body, mimetype=mimetype)
+    response.headers["Cache-Control"] = cache_control
+    response.headers["X-Unikey"] = entry.unikey
+    response.set_etag(etag)
+    return response
+
+
 def get_qrcode():
+    """
+    从预热池中取出一个二维码（池为空时同步生成）。
+    format=png / svg 时直接返回图片字节，unikey 在响应头 X-Unikey 中；默认返回 base64 JSON
+    """
+    fmt = request.args.get("format", "json")
+    if fmt not in ("json", "png", "svg"):
+        return jsonify({"code": 400, "msg": "format 只支持 json / png / svg"})
+
     try:
-        current_app.logger.info("[get_qrcode] 开始生成二维码")
-        unikey = get_qrcode_unikey()
-        qr_code_base64 = generate_qrcode_image(unikey)
+        entry = None
+        if current_app.config.get("QRCODE_POOL_ENABLED", True):
+            entry = get_qrcode_pool().take()
+        if entry is None:
+            current_app.logger.info("[get_qrcode] 二维码池为空，同步生成二维码")
+            unikey = get_qrcode_unikey()
+            entry = QRCodeEntry(unikey, *render_qrcode(unikey))
+        _issue_qrcode(entry)
 
-        current_app.logger.debug("[get_qrcode] 生成的 unikey: %s", unikey)
+        current_app.logger.debug("[get_qrcode] 生成的 unikey: %s", entry.unikey)
 
-        return jsonify({"code": 200, "data": {"unikey": unikey, "qrCodeBase64": qr_code_base64}})
+        if fmt != "json":
+            # 每次请求都会发放新的 unikey，不能被缓存
+            return _qrcode_image_response(entry, fmt, "no-store")
+        return jsonify({"code": 200, "data": {"unikey": entry.unikey, "qrCodeBase64": entry.png_base64}})
     except Exception as e:
         current_app.logger.error("[get_qrcode] 发生异常: %s", str(e))
         return jsonify({"code": 500, "msg": str(e)})
 
 
+def get_qrcode_image(unikey, fmt):
+    """
+    按 unikey 返回二维码图片；unikey 相当于登录会话的凭据，图片不能被共享缓存（CDN / 代理）保存，
+    只允许发起请求的客户端用 ETag 重新验证。只返回发放过的 unikey，其它字符串一律 404，不做渲染
+    """
+    entry = get_issued_qrcodes().get(unikey)
+    if entry is None and get_redis_client().exists(ISSUED_KEY.format(unikey)):
+        # 由其它进程发放：渲染一次后缓存在本进程
+        entry = QRCodeEntry(unikey, *render_qrcode(unikey))
+        get_issued_qrcodes().set(unikey, entry)
+    if entry is None:
+        return jsonify({"code": 404, "msg": "二维码不存在或已过期"}), 404
+    response = _qrcode_image_response(entry, fmt, QRCODE_IMAGE_CACHE_CONTROL)
+    return response.make_conditional(request)
+
+
+def _save_login_user(result):
+    """
+    扫码登录成功（code == 803）后写入 / 更新用户信息，返回给客户端的结果
+    """
+    cookies = result.get("cookies")
+    profile = result.get("profile", {}).get("profile", {})
+    user_id = profile.get("userId")
+
+    current_app.logger.debug(
+        "[check_login] 登录成功, user_id=%s, nickname=%s",
+        user_id, profile.get("nickname")
+    )
+
+    if not user_id:
+        current_app.logger.error("[check_login] 未能获取用户ID")
+        return {"code": 500, "msg": "未能获取用户ID"}
+
+    user = User.query.get(user_id)
+    if not user:
+        user = User(
+            user_id=user_id,
+            nickname=profile.get("nickname"),
+            avatar_url=profile.get("avatarUrl"),
+            cookies=json.dumps(cookies)
+        )
+        db.session.add(user)
+    else:
+        user.nickname = profile.get("nickname")
+        user.avatar_url = profile.get("avatarUrl")
+        user.cookies = json.dumps(cookies)
+    db.session.commit()
+    return result
+
+
+def get_login_watcher():
+    global _login_watcher
+    if _login_watcher is None:
+        config = current_app.config
+        _login_watcher = LoginWatcher(
+            current_app._get_current_object(),
+            get_redis_client(),
+            check_login_status_once,
+            _save_login_user,
+            min_interval=config.get("LOGIN_WATCH_MIN_INTERVAL", 1.0),
+            max_interval=config.get("LOGIN_WATCH_MAX_INTERVAL", 5.0),
+            max_lifetime=config.get("LOGIN_WATCH_MAX_LIFETIME", 300),
+            idle_timeout=config.get("LOGIN_WATCH_IDLE_TIMEOUT", 60),
+            result_ttl=config.get("LOGIN_RESULT_TTL", 60),
+            workers=config.get("LOGIN_WATCH_WORKERS", 8)
+        )
+    return _login_watcher
+
+
+def _state_response(state, result=None):
+    """
+    把登录状态转换为与上游一致的返回结构，并附带状态版本号；result 为取走的登录成功完整结果
+    """
+    if state is None:
+        return {"code": CODE_WAITING_SCAN, "message": "等待扫码", "version": 0}
+    return dict(result or state["result"], version=state["version"])
+
+
+def _claims_result(state):
+    return state is not None and state["code"] == CODE_CONFIRMED
+
+
+def _login_response(watcher, unikey, state):
+    """
+    登录成功时取走完整结果（cookies 与用户信息），只有第一个拿到 803 的请求能收到，之后只返回状态码
+    """
+    result = watcher.claim_result(unikey) if _claims_result(state) else None
+    return _state_response(state, result)
+
+
 def check_login():
-    # 在函数内部也可以使用 db，但是注意确保 import 没有循环依赖
-    from app import db
+    """
+    兼容旧的客户端轮询：不再每次请求上游，而是返回服务端轮询到的最新状态
+    """
     unikey = request.args.get('unikey')
 
     if not unikey:
@@ -32,61 +219,112 @@ def check_login():
     current_app.logger.info("[check_login] 开始检查登录状态, unikey=%s", unikey)
 
     try:
-        result = check_login_status_once(unikey)
-
-        # 当 result.get("code") == 803 时，代表需要写入数据库
-        if result.get("code") == 803:
-            cookies = result.get("cookies")
-            profile = result.get("profile", {}).get("profile", {})
-            user_id = profile.get("userId")
-
-            current_app.logger.debug(
-                "[check_login] 登录成功, user_id=%s, nickname=%s",
-                user_id, profile.get("nickname")
-            )
-
-            if not user_id:
-                current_app.logger.error("[check_login] 未能获取用户ID")
-                return jsonify({"code": 500, "msg": "未能获取用户ID"})
-
-            user = User.query.get(user_id)
-            if not user:
-                user = User(
-                    user_id=user_id,
-                    nickname=profile.get("nickname"),
-                    avatar_url=profile.get("avatarUrl"),
-                    cookies=json.dumps(cookies)
-                )
-                db.session.add(user)
-            else:
-                user.nickname = profile.get("nickname")
-                user.avatar_url = profile.get("avatarUrl")
-                user.cookies = json.dumps(cookies)
-            db.session.commit()
-        else:
-            current_app.logger.debug("[check_login] code != 803, result=%s", result)
-
-        return jsonify(result)
+        watcher = get_login_watcher()
+        watcher.watch(unikey)
+        state = watcher.get_state(unikey)
+        if state is None:
+            # 首次查询时等待第一次轮询结果
+            state = watcher.wait_for_change(unikey, 0, current_app.config.get("LOGIN_FIRST_POLL_TIMEOUT", 3))
+        return jsonify(_login_response(watcher, unikey, state))
 
     except Exception as e:
         current_app.logger.error("[check_login] 发生异常: %s", str(e))
         return jsonify({"code": 500, "msg": str(e)})
 
 
+def _parse_wait_args(args):
+    """返回 (unikey, version, timeout, 错误结果)"""
+    unikey = args.get('unikey')
+    if not unikey:
+        current_app.logger.warning("[wait_login] 缺少 unikey 参数")
+        return None, None, None, {"code": 400, "msg": "缺少 unikey 参数"}
+    try:
+        version = int(args.get('version', 0))
+        timeout = float(args.get('timeout', 25))
+        if not math.isfinite(timeout):
+            raise ValueError(timeout)
+        timeout = max(0, min(timeout, MAX_LONG_POLL_TIMEOUT))
+    except ValueError:
+        return None, None, None, {"code": 400, "msg": "version / timeout 参数格式错误"}
+    return unikey, version, timeout, None
+
+
+def wait_login():
+    """
+    长轮询：状态版本大于 version 时立即返回，否则最多等待 timeout 秒
+    """
+    unikey, version, timeout, error = _parse_wait_args(request.args)
+    if error is not None:
+        return jsonify(error)
+
+    try:
+        watcher = get_login_watcher()
+        watcher.watch(unikey)
+        state = watcher.wait_for_change(unikey, version, timeout)
+        return jsonify(_login_response(watcher, unikey, state))
+    except Exception as e:
+        current_app.logger.error("[wait_login] 发生异常: %s", str(e))
+        return jsonify({"code": 500, "msg": str(e)})
+
+
+def login_events():
+    """
+    Server-Sent Events：每次状态变化推送一条 event，出现终态（已确认、过期等）后结束
+    """
+    unikey = request.args.get('unikey')
+    if not unikey:
+        current_app.logger.warning("[login_events] 缺少 unikey 参数")
+        return jsonify({"code": 400, "msg": "缺少 unikey 参数"})
+
+    watcher = get_login_watcher()
+    keepalive = current_app.config.get("LOGIN_SSE_KEEPALIVE", 15)
+
+    def generate():
+        version = 0
+        while True:
+            watcher.watch(unikey)
+            state = watcher.wait_for_change(unikey, version, keepalive)
+            if state is None or state["version"] <= version:
+                # 没有变化，发送注释行保持连接
+                yield ": keepalive\n\n"
+                continue
+            version = state["version"]
+            yield _sse_event(_login_response(watcher, unikey, state))
+            if is_terminal(state["code"]):
+                return
+
+    response = current_app.response_class(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers.update(SSE_HEADERS)
+    return response
+
+
+def _sse_event(response):
+    return f"data: {json.dumps(response, ensure_ascii=False)}\n\n"
+
+
 def logout():
     current_app.logger.info("[logout] 开始执行注销")
     cookies = request.cookies
-    url = "https://music.163.com/api/logout"
+    url = f"{get_base_url()}/api/logout"
 
     # 根据实际需求，可选择性地在日志里输出部分 Cookie 内容(注意隐私/敏感信息)
     # current_app.logger.debug("[logout] cookies: %s", cookies)
 
-    resp = requests.get(url, headers=get_headers(), cookies=cookies)
+    try:
+        resp = get_upstream_client().get(url, headers=get_headers(), cookies=cookies)
+    except Exception as e:
+        current_app.logger.error("[logout] 请求注销接口异常: %s", str(e))
+        return jsonify({"code": 500, "msg": "注销失败"})
+
+    return jsonify(_logout_result(resp))
+
+
+def _logout_result(resp):
     if resp.status_code == 200:
         current_app.logger.info("[logout] 注销成功")
-        return jsonify({"code": 200, "msg": "注销成功"})
+        return {"code": 200, "msg": "注销成功"}
     else:
         current_app.logger.error("[logout] 注销失败, status_code=%s, resp=%s",
                                 resp.status_code, resp.text)
-        return jsonify({"code": 500, "msg": "注销失败"})
+        return {"code": 500, "msg": "注销失败"}
 
@@ -1,5 +1,5 @@
 from flask import Blueprint, jsonify, request
-from .services import get_qrcode, check_login, logout
+from .services import get_qrcode, get_qrcode_image, check_login, wait_login, login_events, logout
 
 user_bp = Blueprint('user', __name__, url_prefix='/api/user')
 
@@ -7,10 +7,26 @@ user_bp = Blueprint('user', __name__, url_prefix='/api/user')
 def qrcode():
     return get_qrcode()
 
+@user_bp.route('/qrcode/<unikey>.png', methods=['GET'])
+def qrcode_png(unikey):
+    return get_qrcode_image(unikey, "png")
+
+@user_bp.route('/qrcode/<unikey>.svg', methods=['GET'])
+def qrcode_svg(unikey):
+    return get_qrcode_image(unikey, "svg")
+
 @user_bp.route('/check_login', methods=['GET'])
 def check_login_status():
     return check_login()
 
+@user_bp.route('/login_wait', methods=['GET'])
+def login_wait():
+    return wait_login()
+
+@user_bp.route('/login_events', methods=['GET'])
+def login_event_stream():
+    return login_events()
+
 @user_bp.route('/logout', methods=['GET'])
 def logout_user():
     return logout()
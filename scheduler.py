@@ -0,0 +1,9 @@
+"""
+独立的定时任务进程：python scheduler.py
+运行集群级任务（写回播放日志、消费播放事件、维护 app_logs），与 gunicorn 启动的 web worker 分开部署，
+web worker 只运行进程内任务。等价于 flask --app app run-scheduler，但不启动本进程的 APScheduler 与二维码池。
+"""
+from app import create_app, run_scheduler
+
+if __name__ == '__main__':
+    run_scheduler(create_app(start_background=False))
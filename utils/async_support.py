@@ -0,0 +1,63 @@
+# utils/async_support.py
+"""
+ASGI 模式的公共工具：在协程中复用 Flask 应用的配置、日志与各模块的进程内单例
+"""
+import functools
+import time
+
+import anyio.to_thread
+from flask import current_app
+from starlette.responses import Response
+from starlette.routing import Route
+
+from utils.metrics import HTTP_REQUEST_SECONDS
+
+
+def endpoint(fn):
+    """
+    包装异步视图：执行期间推入 Flask 应用上下文（current_app.config / logger / 各模块的单例照常可用）。
+    上下文基于 contextvars，每个请求的 task 互不影响。
+    """
+    @functools.wraps(fn)
+    async def wrapper(request):
+        with request.app.state.flask_app.app_context():
+            return await fn(request)
+    return wrapper
+
+
+def route(path, fn, methods):
+    """
+    与 starlette Route 相同，另按路径模板记录接口耗时（与同步模式共用 http_request_duration_seconds）
+    """
+    @functools.wraps(fn)
+    async def timed(request):
+        start = time.perf_counter()
+        status = "500"
+        try:
+            response = await fn(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, request.method, path, status)
+    return Route(path, timed, methods=methods)
+
+
+def json_response(data, status_code=200):
+    """
+    与 flask.jsonify 输出相同的 JSON（同一个 JSON provider 序列化）
+    """
+    flask_response = current_app.json.response(data)
+    return Response(flask_response.get_data(), status_code=status_code, media_type=flask_response.mimetype)
+
+
+async def run_sync(fn, *args, **kwargs):
+    """
+    在线程池中执行同步函数（数据库访问、图片渲染等），线程内推入新的应用上下文，结束时释放数据库 session
+    """
+    app = current_app._get_current_object()
+
+    def call():
+        with app.app_context():
+            return fn(*args, **kwargs)
+
+    return await anyio.to_thread.run_sync(call)
@@ -0,0 +1,156 @@
+# utils/async_upstream.py
+import asyncio
+import math
+import time
+from urllib.parse import urlsplit
+
+import httpx
+from flask import current_app
+
+from utils.metrics import UPSTREAM_REQUEST_SECONDS
+from utils.redis_client import get_async_redis_client, get_redis_client
+from utils.upstream import CircuitBreaker, CircuitOpenError
+from utils.upstream_scheduler import PRIORITY_INTERACTIVE, AsyncUpstreamScheduler
+
+RETRY_STATUSES = {500, 502, 503, 504}
+BACKOFF_MAX = 2
+
+_async_upstream_client = None
+
+
+class AsyncUpstreamClient:
+    """
+    ASGI 模式下的上游客户端（httpx.AsyncClient）：行为与 UpstreamClient 一致（连接池 + keep-alive、默认超时、
+    有上限的重试、熔断、全局调用预算），但等待上游时只占用一个协程，单进程可以同时挂起上千个上游请求。
+    httpcore 的异步连接池每次分配连接都要遍历全部连接与排队请求，连接数上千时 CPU 开销按平方增长，
+    因此拆成多个每个最多 connections_per_pool 个连接的小连接池，请求发往进行中请求最少的那个。
+    """
+
+    def __init__(self, max_connections=1000, max_keepalive=100, connect_timeout=3, read_timeout=10,
+                 retries=2, backoff_factor=0.2, failure_threshold=5, recovery_timeout=30, scheduler=None,
+                 connections_per_pool=32):
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.breaker = CircuitBreaker(failure_threshold, recovery_timeout)
+        self.scheduler = scheduler
+        pools = max(1, math.ceil(max_connections / connections_per_pool))
+        self.clients = [
+            httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=math.ceil(max_connections / pools),
+                                    max_keepalive_connections=math.ceil(max_keepalive / pools)),
+                # pool：连接数达到上限时排队等待空闲连接的时间
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=read_timeout)
+            )
+            for _ in range(pools)
+        ]
+        self._inflight = [0] * pools
+
+    async def _send(self, method, url, **kwargs):
+        # 只在事件循环线程中调用，计数无需加锁
+        index = min(range(len(self.clients)), key=self._inflight.__getitem__)
+        self._inflight[index] += 1
+        try:
+            return await self.clients[index].request(method, url, **kwargs)
+        finally:
+            self._inflight[index] -= 1
+
+    async def request(self, method, url, timeout=None, priority=PRIORITY_INTERACTIVE, deadline=None,
+                      cookies=None, headers=None, **kwargs):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"上游熔断中，跳过请求: {url}")
+
+        if self.scheduler is not None:
+            try:
+                await self.scheduler.acquire_async(priority, deadline)
+            except Exception:
+                self.breaker.release_probe()
+                raise
+
+        if cookies:
+            # httpx 不推荐按请求传 cookies，直接拼成请求头，避免写入客户端共享的 cookie jar
+            headers = dict(headers or {}, Cookie="; ".join(f"{k}={v}" for k, v in cookies.items()))
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+
+        attempt = 0
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    resp = await self._send(method, url, headers=headers, **kwargs)
+                except httpx.TransportError:
+                    if attempt >= self.retries:
+                        UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - start, urlsplit(url).path, "error")
+                        self.breaker.record_failure()
+                        raise
+                else:
+                    if resp.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                        break
+                await asyncio.sleep(min(BACKOFF_MAX, self.backoff_factor * 2 ** attempt))
+                attempt += 1
+        except BaseException:
+            # 其它异常与协程被取消时不计入失败，但半开状态下必须释放探测名额，否则熔断器再也不会放行请求
+            self.breaker.release_probe()
+            raise
+
+        UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - start, urlsplit(url).path, str(resp.status_code))
+        if resp.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return resp
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        for client in self.clients:
+            await client.aclose()
+
+
+def get_async_upstream_client():
+    """
+    返回进程内唯一的 AsyncUpstreamClient；超时、重试、熔断与全局预算沿用 UPSTREAM_* 配置，
+    并发连接数由 ASGI_UPSTREAM_MAX_CONNECTIONS 控制，按 ASGI_UPSTREAM_CONNECTIONS_PER_POOL 拆成多个连接池
+    """
+    global _async_upstream_client
+    if _async_upstream_client is None:
+        config = current_app.config
+        scheduler = None
+        if config.get("UPSTREAM_RATE_LIMIT_ENABLED", True):
+            scheduler = AsyncUpstreamScheduler(
+                get_redis_client(),
+                get_async_redis_client(),
+                rate=config.get("UPSTREAM_RATE", 20),
+                burst=config.get("UPSTREAM_BURST", 40),
+                reserves=config.get("UPSTREAM_PRIORITY_RESERVES"),
+                deadlines=config.get("UPSTREAM_PRIORITY_DEADLINES")
+            )
+        _async_upstream_client = AsyncUpstreamClient(
+            max_connections=config.get("ASGI_UPSTREAM_MAX_CONNECTIONS", 1000),
+            max_keepalive=config.get("ASGI_UPSTREAM_MAX_KEEPALIVE", 100),
+            connections_per_pool=config.get("ASGI_UPSTREAM_CONNECTIONS_PER_POOL", 32),
+            connect_timeout=config.get("UPSTREAM_CONNECT_TIMEOUT", 3),
+            read_timeout=config.get("UPSTREAM_READ_TIMEOUT", 10),
+            retries=config.get("UPSTREAM_RETRIES", 2),
+            backoff_factor=config.get("UPSTREAM_BACKOFF_FACTOR", 0.2),
+            failure_threshold=config.get("UPSTREAM_BREAKER_THRESHOLD", 5),
+            recovery_timeout=config.get("UPSTREAM_BREAKER_RECOVERY", 30),
+            scheduler=scheduler
+        )
+    return _async_upstream_client
+
+
+def peek_async_upstream_client():
+    """已创建的 AsyncUpstreamClient（未在 ASGI 模式下使用时为 None），供统计接口使用"""
+    return _async_upstream_client
+
+
+async def close_async_upstream_client():
+    global _async_upstream_client
+    if _async_upstream_client is not None:
+        await _async_upstream_client.aclose()
+        _async_upstream_client = None
@@ -1,15 +1,19 @@
-import requests
-import qrcode
 import io
 import base64
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import hmac
 import random
-import execjs
-import json
 
-# 从 Flask 中导入 current_app，用于记录日志
-from flask import current_app
+from utils.log import get_logger
+from utils.metrics import WEAPI_ENCRYPT_SECONDS
+from utils.upstream import get_upstream_client
+from utils.upstream_scheduler import PRIORITY_LOGIN
+from utils.weapi import weapi_encrypt
+
+# 从 Flask 中导入 current_app，用于读取配置
+from flask import current_app, request
+
+# 每次上游请求都会经过这里：日志用惰性求值的 logger，未开启的级别不拼接字符串
+logger = get_logger("auth")
 
 BASE_URL = "https://music.163.com"
 USER_AGENTS = [
@@ -17,10 +21,25 @@ USER_AGENTS = [
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.4 Safari/605.1.15"
 ]
 
+def check_admin_token():
+    """
+    管理接口（/api/admin/*、/metrics）与按需采样的口令校验：请求头 X-Admin-Token 必须与 ADMIN_TOKEN 一致。
+    未配置 ADMIN_TOKEN 时一律拒绝，除非显式开启 ADMIN_ALLOW_UNAUTHENTICATED（仅用于本地开发）
+    """
+    token = current_app.config.get("ADMIN_TOKEN")
+    if not token:
+        return bool(current_app.config.get("ADMIN_ALLOW_UNAUTHENTICATED", False))
+    return hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), token.encode())
+
+def get_base_url():
+    """
+    上游地址，默认 https://music.163.com；压测时可通过 NETEASE_BASE_URL 指向本地的模拟服务
+    """
+    return current_app.config.get("NETEASE_BASE_URL", BASE_URL)
+
 def get_headers():
-    # 如果仅想在调试时查看 UA 切换，可以加个 debug 日志
     ua = random.choice(USER_AGENTS)
-    current_app.logger.debug(f"使用的 User-Agent: {ua}")
+    logger.debug("使用的 User-Agent", ua=ua)
     return {
         "Host": "music.163.com",
         "Referer": BASE_URL,
@@ -30,105 +49,121 @@ def get_headers():
 
 def encrypted_request(data):
     """
-    加密请求参数
+    加密请求参数（进程内实现，密钥对按 WEAPI_KEY_TTL 秒复用）
     """
-    current_app.logger.debug("开始加载本地加密 JS 文件 main.js")
-    try:
-        with open("static/main.js", "r", encoding="utf-8") as f:
-            js_code = f.read()
-    except FileNotFoundError:
-        current_app.logger.error("main.js 文件未找到，请确保文件路径正确")
-        raise
-
-    ctx = execjs.compile(js_code)
-    result = ctx.call("get_param", json.dumps(data, separators=(",", ":")))
-    current_app.logger.debug("加密完成，返回加密后的 params 和 encSecKey")
-    return {"params": result["encText"], "encSecKey": result["encSecKey"]}
+    ttl = current_app.config.get("WEAPI_KEY_TTL", 300)
+    with WEAPI_ENCRYPT_SECONDS.time():
+        result = weapi_encrypt(data, ttl=ttl)
+    logger.debug("加密完成，返回加密后的 params 和 encSecKey")
+    return result
 
-def get_qrcode_unikey():
+def get_qrcode_unikey(priority=PRIORITY_LOGIN):
     """
-    获取用于登录二维码的 unikey
+    获取用于登录二维码的 unikey（二维码池后台补充时使用较低优先级）
     """
-    current_app.logger.info("准备向服务端请求二维码 unikey")
-    url = f"{BASE_URL}/weapi/login/qrcode/unikey"
+    logger.info("准备向服务端请求二维码 unikey")
+    url = f"{get_base_url()}/weapi/login/qrcode/unikey"
     data = {"type": 1}
 
     try:
-        resp = requests.post(url, data=encrypted_request(data), headers=get_headers())
-        if resp.status_code == 200 and resp.json().get("code") == 200:
-            unikey = resp.json()["unikey"]
-            current_app.logger.info(f"成功获取 unikey: {unikey}")
-            return unikey
-        else:
-            current_app.logger.error(
-                f"获取 unikey 失败，状态码: {resp.status_code}, 响应: {resp.text}"
-            )
-            raise Exception("获取 unikey 失败")
+        resp = get_upstream_client().post(url, data=encrypted_request(data), headers=get_headers(),
+                                         priority=priority)
+        return parse_unikey_response(resp)
     except Exception as e:
-        current_app.logger.exception(f"获取 unikey 过程中出现异常: {str(e)}")
+        logger.exception("获取 unikey 过程中出现异常", error=e)
         raise
 
+def parse_unikey_response(resp):
+    """
+    从上游响应中取出 unikey（requests 与 httpx 的响应对象均可）
+    """
+    if resp.status_code == 200 and resp.json().get("code") == 200:
+        unikey = resp.json()["unikey"]
+        logger.info("成功获取 unikey", unikey=unikey)
+        return unikey
+    else:
+        logger.error("获取 unikey 失败", status=resp.status_code, body=resp.text)
+        raise Exception("获取 unikey 失败")
+
+def _make_qrcode(unikey):
+    # qrcode（及渲染时的 Pillow）只有登录二维码接口需要，首次使用时再导入，缩短 worker 启动时间
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4
+    )
+    qr.add_data(f"{BASE_URL}/login?codekey={unikey}")
+    qr.make(fit=True)
+    return qr
+
+def render_qrcode(unikey):
+    """
+    渲染登录二维码，返回 (PNG 字节, SVG 字节, PNG 的 base64)
+    """
+    import qrcode.image.svg
+
+    qr = _make_qrcode(unikey)
+    buffered = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffered, format="PNG")
+    png = buffered.getvalue()
+    buffered = io.BytesIO()
+    qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffered)
+    return png, buffered.getvalue(), base64.b64encode(png).decode('utf-8')
+
 def generate_qrcode_image(unikey):
     """
     生成登录二维码并返回 base64
     """
-    current_app.logger.info(f"开始生成二维码，unikey={unikey}")
+    logger.info("开始生成二维码", unikey=unikey)
     try:
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4
-        )
-        qr.add_data(f"{BASE_URL}/login?codekey={unikey}")
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffered = io.BytesIO()
-        img.save(buffered, format="PNG")
-        qr_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-        current_app.logger.debug("二维码已转换为 base64 编码")
+        qr_base64 = render_qrcode(unikey)[2]
+        logger.debug("二维码已转换为 base64 编码")
         return qr_base64
     except Exception as e:
-        current_app.logger.exception(f"生成二维码时出现异常: {str(e)}")
+        logger.exception("生成二维码时出现异常", error=e)
         raise
 
 def get_user_profile(cookies):
     """
     通过已登录的 cookies 获取用户信息
     """
-    current_app.logger.info("获取用户信息...")
-    url = f"{BASE_URL}/weapi/w/nuser/account/get"
+    logger.info("获取用户信息...")
+    url = f"{get_base_url()}/weapi/w/nuser/account/get"
 
     try:
-        resp = requests.post(url, data=encrypted_request({}), headers=get_headers(), cookies=cookies)
+        resp = get_upstream_client().post(url, data=encrypted_request({}), headers=get_headers(), cookies=cookies,
+                                         priority=PRIORITY_LOGIN)
         if resp.status_code == 200:
-            current_app.logger.debug(f"用户信息响应数据: {resp.json()}")
+            # resp.json 作为延迟求值的字段，只有开启 DEBUG 时才会解析、拼接
+            logger.debug("用户信息响应数据", data=resp.json)
             return resp.json()
         else:
-            current_app.logger.error(
-                f"请求用户信息失败，状态码: {resp.status_code}, 响应: {resp.text}"
-            )
+            logger.error("请求用户信息失败", status=resp.status_code, body=resp.text)
             return {}
     except Exception as e:
-        current_app.logger.exception(f"获取用户信息过程中出现异常: {str(e)}")
+        logger.exception("获取用户信息过程中出现异常", error=e)
         return {}
 
 def check_login_status_once(unikey):
     """
     检测二维码登录状态
     """
-    current_app.logger.info("开始检测二维码登录状态")
-    url = f"{BASE_URL}/weapi/login/qrcode/client/login"
+    logger.debug("开始检测二维码登录状态", unikey=unikey)
+    url = f"{get_base_url()}/weapi/login/qrcode/client/login"
     data = {"key": unikey, "type": 1, "csrf_token": ""}
 
     try:
-        resp = requests.post(url, data=encrypted_request(data), headers=get_headers())
+        resp = get_upstream_client().post(url, data=encrypted_request(data), headers=get_headers(),
+                                         priority=PRIORITY_LOGIN)
         result = resp.json()
-        current_app.logger.debug(f"登录状态返回: {result}")
+        logger.debug("登录状态返回", result=result)
 
         if result.get("code") == 803:
             # 表示登录成功
-            current_app.logger.info("二维码登录成功")
+            logger.info("二维码登录成功")
             cookies = resp.cookies.get_dict()
             result["cookies"] = cookies
 
@@ -137,26 +172,9 @@ def check_login_status_once(unikey):
             result["profile"] = profile
         else:
             # 未登录成功或者其他情况
-            current_app.logger.info(f"二维码登录状态码: {result.get('code')}")
+            logger.debug("二维码登录状态码", code=result.get("code"))
         return result
 
     except Exception as e:
-        current_app.logger.exception(f"检测二维码登录状态时出现异常: {str(e)}")
+        logger.exception("检测二维码登录状态时出现异常", error=e)
         raise
-
-def get_retry_session():
-    """
-    返回一个带重试机制的 session
-    """
-    current_app.logger.debug("创建带重试机制的 Session 对象")
-    session = requests.Session()
-    retry = Retry(
-        total=10,
-        backoff_factor=1,
-        status_forcelist=[500, 502, 503, 504],
-        allowed_methods=["GET", "POST"]
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session
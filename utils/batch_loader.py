@@ -0,0 +1,142 @@
+# utils/batch_loader.py
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class BatchLoader:
+    """
+    类似 dataloader 的请求合并器：
+    window 秒内各线程请求的 key 去重后合并为一批，交给 batch_fn(keys) -> {key: value} 一次性加载；
+    攒够 max_batch 个 key 时立即发出。batch_fn 中没有返回的 key 结果为 None。
+    """
+
+    def __init__(self, batch_fn, window=0.01, max_batch=200):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending = {}  # key -> Future，尚未发出的这一批
+        self._inflight = {}  # key -> Future，已发出、等待结果的 key
+        self._timer = None
+
+    def load_many(self, keys, timeout=None):
+        futures = {}
+        ready = None
+        with self._lock:
+            for key in keys:
+                future = self._inflight.get(key) or self._pending.get(key)
+                if future is None:
+                    future = self._pending[key] = Future()
+                futures[key] = future
+            if len(self._pending) >= self.max_batch:
+                ready = self._take_pending()
+            elif self._pending and self._timer is None:
+                self._timer = threading.Timer(self.window, self._dispatch_pending)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if ready:
+            self._dispatch(ready)
+        return {key: future.result(timeout) for key, future in futures.items()}
+
+    def _take_pending(self):
+        batch, self._pending = self._pending, {}
+        self._inflight.update(batch)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _dispatch_pending(self):
+        with self._lock:
+            self._timer = None
+            batch = self._take_pending()
+        if batch:
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        keys = list(batch)
+        try:
+            for i in range(0, len(keys), self.max_batch):
+                chunk = keys[i:i + self.max_batch]
+                results = self.batch_fn(chunk)
+                for key in chunk:
+                    batch[key].set_result(results.get(key))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                for key in keys:
+                    self._inflight.pop(key, None)
+
+
+class AsyncBatchLoader:
+    """
+    BatchLoader 的 asyncio 版本（ASGI 模式）：batch_fn 为协程函数，攒批窗口用 loop.call_later 实现。
+    只在同一个事件循环中使用，无需加锁。
+    """
+
+    def __init__(self, batch_fn, window=0.01, max_batch=200):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}  # key -> asyncio.Future
+        self._inflight = {}
+        self._timer = None
+        self._tasks = set()
+
+    async def load_many(self, keys, timeout=None):
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for key in keys:
+            future = self._inflight.get(key) or self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = loop.create_future()
+            futures[key] = future
+        if len(self._pending) >= self.max_batch:
+            self._dispatch(loop, self._take_pending())
+        elif self._pending and self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch_pending, loop)
+
+        # shield：某个请求超时 / 取消时不影响同一批中等待相同 key 的其它请求
+        results = await asyncio.wait_for(asyncio.gather(*(asyncio.shield(f) for f in futures.values())), timeout)
+        return dict(zip(futures, results))
+
+    def _take_pending(self):
+        batch, self._pending = self._pending, {}
+        self._inflight.update(batch)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _dispatch_pending(self, loop):
+        self._timer = None
+        batch = self._take_pending()
+        if batch:
+            self._dispatch(loop, batch)
+
+    def _dispatch(self, loop, batch):
+        task = loop.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        keys = list(batch)
+        try:
+            for i in range(0, len(keys), self.max_batch):
+                chunk = keys[i:i + self.max_batch]
+                results = await self.batch_fn(chunk)
+                for key in chunk:
+                    batch[key].set_result(results.get(key))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()
+        finally:
+            for key in keys:
+                self._inflight.pop(key, None)
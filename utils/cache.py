@@ -0,0 +1,257 @@
+# utils/cache.py
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+_caches = {}  # name -> 缓存实例，用于汇总统计
+
+
+class _Flight:
+    """同一个 key 正在进行中的加载，其它并发请求等待它的结果"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SWRCache:
+    """
+    进程内 stale-while-revalidate 缓存：
+    - 距上次加载不超过 ttl 秒：直接返回（HIT）
+    - 超过 ttl 但不超过 ttl + stale_ttl：先返回旧值（STALE），后台线程刷新
+    - 否则同步加载（MISS）；同一 key 的并发加载合并为一次
+    按 LRU 淘汰，最多保留 max_entries 个 key。
+    """
+    HIT = "HIT"
+    STALE = "STALE"
+    MISS = "MISS"
+
+    def __init__(self, name, ttl=60, stale_ttl=3600, max_entries=10000, refresh_workers=4):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, loaded_at)
+        self._flights = {}
+        self._async_flights = {}  # key -> asyncio.Future（ASGI 模式）
+        self._tasks = set()  # 进行中的后台刷新 task，保持引用
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix=f"{name}-refresh")
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "load_errors": 0, "evictions": 0}
+        _caches[name] = self
+
+    def _lookup(self, key, flights, new_flight):
+        """
+        查找缓存并计数，返回 (条目, 需要后台刷新时新建的 flight, 状态)；flights 为同步或 asyncio 的进行中加载表
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[1]
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry, None, self.HIT
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["stale_hits"] += 1
+                    flight = None
+                    if key not in flights:
+                        self._stats["refreshes"] += 1
+                        flight = flights[key] = new_flight()
+                    return entry, flight, self.STALE
+            self._stats["misses"] += 1
+            return None, None, self.MISS
+
+    def get(self, key, loader, should_cache=None):
+        """
+        返回 (value, 状态)。loader 为无参函数；should_cache(value) 返回 False 时结果不入缓存。
+        """
+        entry, flight, status = self._lookup(key, self._flights, _Flight)
+        if status == self.HIT:
+            return entry[0], status
+        if status == self.STALE:
+            if flight is not None:
+                self._executor.submit(self._run_flight, key, flight, loader, should_cache)
+            return entry[0], status
+        return self._load(key, loader, should_cache), status
+
+    async def get_async(self, key, loader, should_cache=None):
+        """
+        asyncio 版本的 get：loader 为无参协程函数，后台刷新在独立的 task 中执行，并发加载合并为一次
+        """
+        loop = asyncio.get_running_loop()
+        entry, flight, status = self._lookup(key, self._async_flights, loop.create_future)
+        if status == self.HIT:
+            return entry[0], status
+        if status == self.STALE:
+            if flight is not None:
+                task = loop.create_task(self._run_flight_async(key, flight, loader, should_cache))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return entry[0], status
+
+        with self._lock:
+            flight = self._async_flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._async_flights[key] = loop.create_future()
+        if leader:
+            await self._run_flight_async(key, flight, loader, should_cache)
+        return await asyncio.shield(flight), status
+
+    async def _run_flight_async(self, key, flight, loader, should_cache):
+        try:
+            value = await loader()
+            if should_cache is None or should_cache(value):
+                self.set(key, value)
+            flight.set_result(value)
+        except asyncio.CancelledError:
+            # 发起加载的请求被取消（客户端断开），让等待同一 key 的其它请求得到错误而不是一直挂起
+            flight.set_exception(RuntimeError(f"加载 {key} 被取消"))
+            flight.exception()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            # 后台刷新失败时可能没有人等待结果，标记为已读取
+            flight.exception()
+            with self._lock:
+                self._stats["load_errors"] += 1
+        finally:
+            with self._lock:
+                self._async_flights.pop(key, None)
+
+    def _load(self, key, loader, should_cache):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            self._run_flight(key, flight, loader, should_cache)
+        else:
+            flight.event.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _run_flight(self, key, flight, loader, should_cache):
+        try:
+            flight.value = loader()
+            if should_cache is None or should_cache(flight.value):
+                self.set(key, flight.value)
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._stats["load_errors"] += 1
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["inflight"] = len(self._flights) + len(self._async_flights)
+        return stats
+
+
+class TTLCache:
+    """
+    进程内 LRU + TTL 缓存：超过 ttl 的条目 get() 视为未命中，但仍可用 peek() 取出（直到被淘汰或覆盖），
+    便于调用方用版本号判断旧值能否继续使用。最多保留 max_entries 个 key。
+    """
+
+    def __init__(self, name, ttl=60, max_entries=10000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        _caches[name] = self
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if now - entry[1] >= self.ttl:
+                self._stats["expired"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def get_many(self, keys):
+        """
+        批量查询，返回 {key: value}，只包含未过期的命中项
+        """
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    self._stats["misses"] += 1
+                elif now - entry[1] >= self.ttl:
+                    self._stats["expired"] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    found[key] = entry[0]
+        return found
+
+    def peek(self, key):
+        """
+        不论是否过期都返回缓存值（不计入统计）
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        return stats
+
+
+def get_cache_stats():
+    """
+    汇总所有缓存实例的命中/未命中/刷新计数
+    """
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,99 @@
+# utils/instrumentation.py
+"""
+在 create_app 中接入指标与按需采样：
+- 每个请求的耗时（按 方法 / 路由 / 状态码）
+- MySQL 语句耗时（SQLAlchemy 事件，按语句类型）
+- PROFILER_ENABLED 时，带 ?_profile=1 或请求头 X-Profile: 1 的请求会被采样，结果写入 PROFILE_DIR
+"""
+import time
+
+from flask import current_app, g, request
+from sqlalchemy import event
+
+from utils.metrics import DB_ERRORS, DB_QUERY_SECONDS, HTTP_REQUEST_SECONDS, REGISTRY
+from utils.profiler import SamplingProfiler
+
+
+def _statement_type(statement):
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return verb if verb in ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE") else "OTHER"
+
+
+def _instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        DB_QUERY_SECONDS.observe(time.perf_counter() - start, _statement_type(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        DB_ERRORS.inc(_statement_type(context.statement or ""))
+
+
+def _wants_profile():
+    if not current_app.config.get("PROFILER_ENABLED", False):
+        return False
+    if request.args.get("_profile") != "1" and request.headers.get("X-Profile") != "1":
+        return False
+    from utils.auth import check_admin_token
+
+    # 与管理接口相同，只允许带正确口令的请求触发采样
+    return check_admin_token()
+
+
+def _collect_cache_stats():
+    from utils.cache import get_cache_stats
+
+    samples = []
+    for name, stats in get_cache_stats().items():
+        for result in ("hits", "stale_hits", "misses"):
+            if result in stats:
+                samples.append(({"cache": name, "result": result}, stats[result]))
+    return [("cache_requests_total", "counter", "进程内缓存的查询次数，按结果", samples)]
+
+
+def _collect_upstream_state():
+    from utils.upstream import CircuitBreaker, _upstream_client
+
+    if _upstream_client is None:
+        return []
+    state = _upstream_client.breaker.state
+    samples = [({"state": s}, 1 if s == state else 0)
+               for s in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)]
+    return [("upstream_circuit_state", "gauge", "上游熔断器当前状态", samples)]
+
+
+def init_app(app, engine):
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        if _wants_profile():
+            g.profiler = SamplingProfiler(interval=app.config.get("PROFILER_INTERVAL", 0.005)).start()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            # 未匹配路由的请求（404 扫描等）归为一类，避免标签数量失控
+            endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, endpoint,
+                                         str(response.status_code))
+
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop()
+            path = profiler.save(app.config.get("PROFILE_DIR", "profiles"), request.endpoint or "request")
+            response.headers["X-Profile-File"] = path
+            app.logger.info(f"[profiler] {request.path} 采样 {profiler.samples} 次，已写入 {path}")
+        return response
+
+    _instrument_engine(engine)
+    REGISTRY.add_collector(_collect_cache_stats)
+    REGISTRY.add_collector(_collect_upstream_state)
@@ -0,0 +1,165 @@
+# utils/log.py
+"""
+结构化日志门面，热点路径上没有开启的级别不产生任何字符串拼接：
+- get_logger("auth").debug("登录状态返回", result=result)：级别未开启时直接返回；开启时消息按
+  "消息 key=value ..." 输出，并且只在 Handler 真正格式化时才拼接，字段值可以是无参函数（如 resp.json），输出时才调用
+- 按模块配置级别：LOG_LEVEL 为整体级别，LOG_LEVELS = {"auth": "DEBUG"} 单独调整某个模块
+- 确定性采样：logger.sample(0.01, user_id).debug(...) 按 key 的哈希决定是否输出，同一个 key 总是一起输出或跳过
+- 限频聚合：logger.aggregator(...) 在窗口内只计数（并保留少量示例），窗口结束后输出一条汇总
+各模块的 logger 是应用 logger（app.logger）的子 logger，沿用其 Handler（控制台、app_logs）。
+"""
+import logging
+import threading
+import time
+import zlib
+
+_root = None  # init_app 之后为 app.logger
+_loggers = {}
+
+
+class _Message:
+    """惰性消息：str() 时才拼接字段、调用延迟求值的字段"""
+    __slots__ = ("text", "fields")
+
+    def __init__(self, text, fields):
+        self.text = text
+        self.fields = fields
+
+    def __str__(self):
+        if not self.fields:
+            return self.text
+        parts = [self.text]
+        for key, value in self.fields.items():
+            if callable(value):
+                value = value()
+            parts.append(f"{key}={value}")
+        return " ".join(parts)
+
+
+class StructLogger:
+    def __init__(self, name):
+        self.name = name
+        self._bind(_root)
+
+    def _bind(self, root):
+        # 模块导入时应用还未创建，先用同名的标准 logger，init_app 时再挂到 app.logger 下
+        self.logger = root.getChild(self.name) if root is not None else logging.getLogger(self.name)
+
+    def enabled(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def _emit(self, level, msg, fields, exc_info=None):
+        # stacklevel=3：调用位置（模块 / 函数 / 行号）记为业务代码，而不是本文件
+        self.logger.log(level, _Message(msg, fields), exc_info=exc_info, stacklevel=3)
+
+    # 各级别先判断是否开启再构造消息：未开启时只有一次 isEnabledFor（有缓存）的开销
+    def log(self, level, msg, **fields):
+        if self.logger.isEnabledFor(level):
+            self._emit(level, msg, fields)
+
+    def debug(self, msg, **fields):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._emit(logging.DEBUG, msg, fields)
+
+    def info(self, msg, **fields):
+        if self.logger.isEnabledFor(logging.INFO):
+            self._emit(logging.INFO, msg, fields)
+
+    def warning(self, msg, **fields):
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._emit(logging.WARNING, msg, fields)
+
+    def error(self, msg, **fields):
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._emit(logging.ERROR, msg, fields)
+
+    def exception(self, msg, **fields):
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._emit(logging.ERROR, msg, fields, exc_info=True)
+
+    def sample(self, rate, key):
+        """
+        按 key 确定性采样：返回自身或不输出任何日志的 logger，rate 为输出比例（0 ~ 1）
+        """
+        return self if sampled(rate, key) else _NULL_LOGGER
+
+    def aggregator(self, msg, interval=60, samples=0, level=logging.INFO):
+        return Aggregator(self, msg, interval, samples, level)
+
+
+class _NullLogger(StructLogger):
+    def __init__(self):
+        super().__init__("null")
+
+    def _bind(self, root):
+        # 从不开启的 logger：各级别都在 isEnabledFor 处返回
+        self.logger = logging.getLogger("utils.log.null")
+        self.logger.disabled = True
+
+
+_NULL_LOGGER = _NullLogger()
+
+
+class Aggregator:
+    """
+    线程安全的限频汇总：add() 只累加计数并保留前 samples 个示例，距上次输出超过 interval 秒后
+    由当时调用 add() 的线程输出一条 "msg interval=.. count=.. samples=[..]"；级别未开启时 add() 直接返回
+    """
+
+    def __init__(self, log, msg, interval=60, samples=0, level=logging.INFO):
+        self.log = log
+        self.msg = msg
+        self.interval = interval
+        self.max_samples = samples
+        self.level = level
+        self._lock = threading.Lock()
+        self._count = 0
+        self._samples = []
+        self._last = time.monotonic()
+
+    def add(self, count=1, samples=()):
+        if not self.log.logger.isEnabledFor(self.level):
+            return
+        with self._lock:
+            self._count += count
+            if len(self._samples) < self.max_samples:
+                self._samples.extend(samples[:self.max_samples - len(self._samples)])
+            now = time.monotonic()
+            if now - self._last < self.interval:
+                return
+            total, kept = self._count, self._samples
+            self._count, self._samples, self._last = 0, [], now
+        fields = {"interval": self.interval, "count": total}
+        if self.max_samples:
+            fields["samples"] = kept
+        self.log._emit(self.level, self.msg, fields)
+
+
+def sampled(rate, key):
+    """同一个 key 的结果固定（crc32），不同进程之间也一致"""
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    return zlib.crc32(str(key).encode()) % 10000 < rate * 10000
+
+
+def get_logger(name):
+    """模块级的 StructLogger，name 即 LOG_LEVELS 中的模块名"""
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers.setdefault(name, StructLogger(name))
+    return logger
+
+
+def init_app(app):
+    """
+    把各模块的 logger 挂到 app.logger 下，并按 LOG_LEVEL / LOG_LEVELS 设置级别
+    """
+    global _root
+    _root = app.logger
+    for logger in _loggers.values():
+        logger._bind(_root)
+    app.logger.setLevel(app.config.get("LOG_LEVEL", "INFO"))
+    for name, level in app.config.get("LOG_LEVELS", {}).items():
+        app.logger.getChild(name).setLevel(level)
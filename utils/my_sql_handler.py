@@ -1,35 +1,166 @@
+import atexit
 import logging
+import os
+import queue
+import sys
+import threading
+import time
+import weakref
+from datetime import datetime
+
 from sqlalchemy import text
-from utils.db import db  # 你的 SQLAlchemy 实例
+
+INSERT_LOG_SQL = text("""
+    INSERT INTO app_logs(level, message, pathname, funcname, lineno, created_at)
+    VALUES (:level, :message, :pathname, :funcname, :lineno, :created_at)
+""")
+
+_STOP = object()
+# 存活的 Handler；fork / 退出钩子只在模块级注册一次，重复 create_app 不会累积钩子
+_handlers = weakref.WeakSet()
+
+
+def _restart_writers():
+    for handler in list(_handlers):
+        handler._start_writer()
+
+
+def _close_all():
+    for handler in list(_handlers):
+        handler.close()
+
+
+os.register_at_fork(after_in_child=_restart_writers)
+atexit.register(_close_all)
+
 
 class MySQLLogHandler(logging.Handler):
-    def __init__(self, level=logging.NOTSET):
+    """
+    异步批量写库的日志 Handler：
+    emit 只把 record 放进有界队列（O(1)），由后台线程按条数或时间批量 INSERT 到 app_logs，
+    使用独立的数据库连接，不会占用或提交请求自身的 session。
+    队列满时丢弃新日志并计数，关闭时把队列中剩余的日志写完。
+    fork 出的子进程（gunicorn 预加载）里没有写库线程，fork 后重新创建队列并启动线程。
+    """
+
+    def __init__(self, engine, level=logging.NOTSET, batch_size=200, flush_interval=1.0, max_queue_size=10000):
         super().__init__(level)
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self._start_writer()
+        _handlers.add(self)
+
+    def _start_writer(self):
+        # fork 时父进程队列中的日志由父进程写入，子进程从空队列开始
+        self.queue = queue.Queue(maxsize=self.max_queue_size)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="mysql-log-writer", daemon=True)
+        self._thread.start()
 
     def emit(self, record):
         try:
-            # 格式化日志信息
-            log_message = self.format(record)
-            level = record.levelname
-            pathname = record.pathname
-            funcname = record.funcName
-            lineno = record.lineno
-
-            # 使用 SQLAlchemy 的方式插入
-            sql = text("""
-                INSERT INTO app_logs(level, message, pathname, funcname, lineno)
-                VALUES (:level, :message, :pathname, :funcname, :lineno)
-            """)
-            params = {
-                "level": level,
-                "message": log_message,
-                "pathname": pathname,
-                "funcname": funcname,
-                "lineno": lineno
-            }
-
-            db.session.execute(sql, params)
-            db.session.commit()
-
+            # 在调用线程里求出消息：惰性字段可能依赖请求上下文，写库线程里已不可用
+            record.msg = record.getMessage()
+            record.args = None
         except Exception:
             self.handleError(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def _to_row(self, record):
+        return {
+            "level": record.levelname,
+            "message": self.format(record),
+            "pathname": record.pathname,
+            "funcname": record.funcName,
+            "lineno": record.lineno,
+            "created_at": datetime.fromtimestamp(record.created)
+        }
+
+    def _dropped_row(self):
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        if not dropped:
+            return None
+        return {
+            "level": "WARNING",
+            "message": f"日志队列已满，丢弃了 {dropped} 条日志",
+            "pathname": __file__,
+            "funcname": "emit",
+            "lineno": 0,
+            "created_at": datetime.now()
+        }
+
+    def _write(self, records):
+        rows = []
+        for record in records:
+            try:
+                rows.append(self._to_row(record))
+            except Exception:
+                self.handleError(record)
+        dropped_row = self._dropped_row()
+        if dropped_row:
+            rows.append(dropped_row)
+        if not rows:
+            return
+        try:
+            # executemany：pymysql 会改写成一条多行 INSERT
+            with self.engine.begin() as conn:
+                conn.execute(INSERT_LOG_SQL, rows)
+        except Exception as e:
+            # 不能再走 logging，否则会递归写回这个 Handler
+            print(f"写入 app_logs 失败，丢弃 {len(rows)} 条日志: {e}", file=sys.stderr)
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        stopping = False
+        while not stopping:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+
+        # 关闭时把剩余的日志写完
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        self._write(batch)
+
+    def close(self):
+        _handlers.discard(self)
+        if self._thread.is_alive():
+            # 队列满时也要保证停止信号能送达
+            while True:
+                try:
+                    self.queue.put(_STOP, timeout=0.1)
+                    break
+                except queue.Full:
+                    if not self._thread.is_alive():
+                        break
+            self._thread.join(timeout=10)
+        super().close()
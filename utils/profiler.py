@@ -0,0 +1,73 @@
+# utils/profiler.py
+"""
+按需开启的采样分析器：后台线程按固定间隔读取目标线程的调用栈，结束后输出 folded stacks
+（每行 `栈帧;栈帧;... 次数`，可直接交给 flamegraph.pl、speedscope 或 inferno 生成火焰图）。
+未开启时没有任何开销；开启时只影响被采样的那个请求 / 任务。
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter as _StackCounter
+
+
+class SamplingProfiler:
+
+    def __init__(self, thread_id=None, interval=0.005, max_depth=128):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks = _StackCounter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+        self.duration = 0.0
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._started_at
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            # 释放对栈帧的引用，避免延长局部变量的生命周期
+            del frame
+            self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def save(self, directory, name):
+        """写入 <directory>/<时间>-<name>.folded，返回文件路径"""
+        os.makedirs(directory, exist_ok=True)
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name).strip("_") or "profile"
+        now = time.time()
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}"
+        path = os.path.join(directory, f"{stamp}-{safe_name}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+        return path
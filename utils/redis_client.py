@@ -1,16 +1,265 @@
 # utils/redis_client.py
+"""
+进程内的 Redis 客户端，按 REDIS_MODE 连接单机（standalone）、哨兵（sentinel）或集群（cluster）：
+- 单机 / 哨兵使用有上限的阻塞连接池，连接用尽时最多等待 REDIS_POOL_TIMEOUT 秒，而不是无限制地新建连接
+- 读写超时、建连超时与空闲连接健康检查，Redis 卡住时请求快速失败而不是挂起 worker 线程
+- 集群模式下 pipeline 按节点分组发送；Lua 脚本涉及的 key 必须在同一个 slot（用 hash tag 放在一起）
+"""
+import time
+
 import redis
+import redis.asyncio
+import redis.asyncio.cluster
+import redis.asyncio.sentinel
+import redis.cluster
+import redis.sentinel
+from flask import current_app
+
+from utils.metrics import REDIS_COMMAND_SECONDS
 
 _redis_client = None
+_async_redis_client = None
+
+
+class _InstrumentedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        with REDIS_COMMAND_SECONDS.time("PIPELINE"):
+            return super().execute(raise_on_error)
+
+
+class InstrumentedRedis(redis.Redis):
+    """
+    记录每条命令耗时的客户端（按命令名），pipeline 整体计为一次 PIPELINE
+    """
+
+    def execute_command(self, *args, **options):
+        with REDIS_COMMAND_SECONDS.time(str(args[0]).upper()):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return _InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class _InstrumentedAsyncPipeline(redis.asyncio.client.Pipeline):
+    async def execute(self, raise_on_error=True):
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_COMMAND_SECONDS.observe(time.perf_counter() - start, "PIPELINE")
+
+
+class InstrumentedAsyncRedis(redis.asyncio.Redis):
+    """InstrumentedRedis 的 asyncio 版本"""
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_SECONDS.observe(time.perf_counter() - start, str(args[0]).upper())
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return _InstrumentedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class _InstrumentedClusterPipeline:
+    """
+    包装集群 pipeline，只给 execute 计时，其余方法（排队命令、reset 等）直接转发；
+    ClusterPipeline 的构造参数随 redis-py 版本变化，包装而不是继承
+    """
+
+    def __init__(self, pipe):
+        self._pipe = pipe
+
+    def __getattr__(self, name):
+        return getattr(self._pipe, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._pipe.reset()
+
+    def __len__(self):
+        return len(self._pipe)
+
+    def execute(self, raise_on_error=True):
+        with REDIS_COMMAND_SECONDS.time("PIPELINE"):
+            return self._pipe.execute(raise_on_error)
+
+
+class InstrumentedRedisCluster(redis.cluster.RedisCluster):
+    """集群模式的 InstrumentedRedis"""
+
+    def execute_command(self, *args, **kwargs):
+        with REDIS_COMMAND_SECONDS.time(str(args[0]).upper()):
+            return super().execute_command(*args, **kwargs)
+
+    def pipeline(self, transaction=None, shard_hint=None):
+        return _InstrumentedClusterPipeline(super().pipeline(transaction, shard_hint))
+
+
+class _InstrumentedAsyncClusterPipeline(redis.asyncio.cluster.ClusterPipeline):
+    async def execute(self, raise_on_error=True, allow_redirections=True):
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error, allow_redirections)
+        finally:
+            REDIS_COMMAND_SECONDS.observe(time.perf_counter() - start, "PIPELINE")
+
+
+class InstrumentedAsyncRedisCluster(redis.asyncio.cluster.RedisCluster):
+    """集群模式的 InstrumentedAsyncRedis"""
+
+    async def execute_command(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **kwargs)
+        finally:
+            REDIS_COMMAND_SECONDS.observe(time.perf_counter() - start, str(args[0]).upper())
+
+    def pipeline(self, transaction=None, shard_hint=None):
+        if shard_hint:
+            raise redis.exceptions.RedisClusterException("shard_hint is deprecated in cluster mode")
+        return _InstrumentedAsyncClusterPipeline(self, transaction)
+
+
+class _BlockingSentinelConnectionPool(redis.sentinel.SentinelConnectionPool, redis.BlockingConnectionPool):
+    """哨兵模式的阻塞连接池：连接指向哨兵选出的主节点，连接数达到上限时等待"""
+
+
+class _AsyncBlockingSentinelConnectionPool(redis.asyncio.sentinel.SentinelConnectionPool,
+                                           redis.asyncio.BlockingConnectionPool):
+    """_BlockingSentinelConnectionPool 的 asyncio 版本"""
+
+
+def _parse_nodes(value):
+    """"host:port,host:port" -> [(host, port)]"""
+    nodes = []
+    for item in value.split(","):
+        host, _, port = item.strip().rpartition(":")
+        nodes.append((host, int(port)))
+    return nodes
+
+
+def _connection_kwargs(config):
+    return {
+        "password": config.get("REDIS_PASSWORD") or None,
+        "socket_timeout": config.get("REDIS_SOCKET_TIMEOUT", 5),
+        "socket_connect_timeout": config.get("REDIS_SOCKET_CONNECT_TIMEOUT", 2),
+        "health_check_interval": config.get("REDIS_HEALTH_CHECK_INTERVAL", 30),
+        "decode_responses": True,
+    }
+
+
+def create_redis_client(config):
+    """
+    按配置创建客户端（不缓存）；get_redis_client 返回进程内共享的实例
+    """
+    mode = config.get("REDIS_MODE", "standalone")
+    kwargs = _connection_kwargs(config)
+    max_connections = config.get("REDIS_MAX_CONNECTIONS", 50)
+    pool_timeout = config.get("REDIS_POOL_TIMEOUT", 5)
+
+    if mode == "cluster":
+        # 每个节点各自一个连接池，max_connections 为每个节点的上限；redis-py 只在以 url 创建时
+        # 为各节点使用 connection_pool_class，集群模式也不支持 health_check_interval（被忽略）
+        (host, port), *others = _parse_nodes(config.get("REDIS_CLUSTER_NODES", ""))
+        return InstrumentedRedisCluster(
+            url=f"redis://{host}:{port}",
+            startup_nodes=[redis.cluster.ClusterNode(h, p) for h, p in others],
+            connection_pool_class=redis.BlockingConnectionPool,
+            max_connections=max_connections,
+            timeout=pool_timeout,
+            **kwargs
+        )
+    if mode == "sentinel":
+        sentinel = redis.sentinel.Sentinel(_parse_nodes(config.get("REDIS_SENTINELS", "")), **kwargs)
+        return sentinel.master_for(
+            config.get("REDIS_SENTINEL_SERVICE", "mymaster"),
+            redis_class=InstrumentedRedis,
+            connection_pool_class=_BlockingSentinelConnectionPool,
+            max_connections=max_connections,
+            timeout=pool_timeout
+        )
+    if mode != "standalone":
+        raise ValueError(f"未知的 REDIS_MODE: {mode}")
+    pool = redis.BlockingConnectionPool.from_url(
+        config.get("REDIS_URL", "redis://127.0.0.1:6379/0"),
+        max_connections=max_connections,
+        timeout=pool_timeout,
+        **kwargs
+    )
+    return InstrumentedRedis(connection_pool=pool)
+
+
+def create_async_redis_client(config):
+    """
+    create_redis_client 的 asyncio 版本；集群模式下连接数达到上限时直接报错（redis.asyncio 的集群客户端不支持等待）
+    """
+    mode = config.get("REDIS_MODE", "standalone")
+    kwargs = _connection_kwargs(config)
+    max_connections = config.get("REDIS_MAX_CONNECTIONS", 50)
+    pool_timeout = config.get("REDIS_POOL_TIMEOUT", 5)
+
+    if mode == "cluster":
+        return InstrumentedAsyncRedisCluster(
+            startup_nodes=[redis.asyncio.cluster.ClusterNode(host, port)
+                           for host, port in _parse_nodes(config.get("REDIS_CLUSTER_NODES", ""))],
+            max_connections=max_connections,
+            **kwargs
+        )
+    if mode == "sentinel":
+        sentinel = redis.asyncio.sentinel.Sentinel(_parse_nodes(config.get("REDIS_SENTINELS", "")), **kwargs)
+        return sentinel.master_for(
+            config.get("REDIS_SENTINEL_SERVICE", "mymaster"),
+            redis_class=InstrumentedAsyncRedis,
+            connection_pool_class=_AsyncBlockingSentinelConnectionPool,
+            max_connections=max_connections,
+            timeout=pool_timeout
+        )
+    if mode != "standalone":
+        raise ValueError(f"未知的 REDIS_MODE: {mode}")
+    pool = redis.asyncio.BlockingConnectionPool.from_url(
+        config.get("REDIS_URL", "redis://127.0.0.1:6379/0"),
+        max_connections=max_connections,
+        timeout=pool_timeout,
+        **kwargs
+    )
+    return InstrumentedAsyncRedis(connection_pool=pool)
+
+
+def max_block_ms(block_ms):
+    """
+    XREADGROUP 等阻塞命令的等待时间：必须短于 socket 读超时，否则空等也会被当作超时错误
+    """
+    socket_timeout = current_app.config.get("REDIS_SOCKET_TIMEOUT", 5)
+    if block_ms is None or not socket_timeout:
+        return block_ms
+    # BLOCK 0 表示无限等待，至少等待 1 毫秒
+    return max(1, min(block_ms, int(socket_timeout * 1000) - 1000))
+
 
 def get_redis_client():
     global _redis_client
     if _redis_client is None:
-        _redis_client = redis.Redis(
-            host='127.0.0.1',
-            port=6379,
-            password='000000',
-            db=0,
-            decode_responses=True
-        )
+        _redis_client = create_redis_client(current_app.config)
     return _redis_client
+
+
+def get_async_redis_client():
+    """
+    asyncio 版本的客户端（ASGI 模式使用），连接参数与 get_redis_client 一致；只能在同一个事件循环中使用
+    """
+    global _async_redis_client
+    if _async_redis_client is None:
+        _async_redis_client = create_async_redis_client(current_app.config)
+    return _async_redis_client
+
+
+async def close_async_redis_client():
+    global _async_redis_client
+    if _async_redis_client is not None:
+        await _async_redis_client.aclose()
+        _async_redis_client = None
@@ -0,0 +1,55 @@
+# utils/redis_lease.py
+import secrets
+
+# 只有持有者（token 一致）才能续约 / 释放，避免误删其它进程在租约过期后拿到的锁
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLease:
+    """
+    基于 SET NX EX 的租约：同一时间只有一个进程持有，持有者崩溃后 ttl 秒自动释放。
+    执行时间可能超过 ttl 的任务需要定期调用 renew()，返回 False 表示租约已丢失，应停止工作。
+    """
+
+    def __init__(self, redis_client, key, ttl=60):
+        self.redis = redis_client
+        self.key = key
+        self.ttl = ttl
+        self.token = None
+
+    def acquire(self):
+        token = secrets.token_hex(16)
+        if self.redis.set(self.key, token, nx=True, ex=self.ttl):
+            self.token = token
+            return True
+        return False
+
+    def renew(self):
+        if self.token is None:
+            return False
+        return bool(self.redis.eval(_RENEW, 1, self.key, self.token, int(self.ttl * 1000)))
+
+    def release(self):
+        if self.token is None:
+            return
+        try:
+            self.redis.eval(_RELEASE, 1, self.key, self.token)
+        finally:
+            self.token = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -0,0 +1,185 @@
+# utils/upstream.py
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.metrics import UPSTREAM_REQUEST_SECONDS
+from utils.redis_client import get_redis_client
+from utils.upstream_scheduler import PRIORITY_INTERACTIVE, UpstreamScheduler
+
+_upstream_client = None
+_client_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，直接快速失败"""
+
+
+class CircuitBreaker:
+    """
+    简单的三态熔断器：closed -> open -> half_open -> closed
+    连续失败 failure_threshold 次后打开，recovery_timeout 秒后放行一个探测请求。
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+            # half_open：同一时间只放行一个探测请求
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def release_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class UpstreamClient:
+    """
+    进程级共享的上游 HTTP 客户端：连接池 + keep-alive、默认超时、有上限的重试、熔断，
+    配置了 scheduler 时每次请求先按优先级从全局令牌桶取得额度
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=50, connect_timeout=3, read_timeout=10,
+                 retries=2, backoff_factor=0.2, failure_threshold=5, recovery_timeout=30, scheduler=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker(failure_threshold, recovery_timeout)
+        self.scheduler = scheduler
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            backoff_max=2,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=["GET", "POST"],
+            respect_retry_after_header=False,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, timeout=None, priority=PRIORITY_INTERACTIVE, deadline=None, **kwargs):
+        """
+        发起请求；熔断打开时抛出 CircuitOpenError，5xx 与网络异常都会计入失败次数。
+        priority / deadline 用于全局调用预算，截止时间内拿不到额度时抛出 UpstreamBudgetExceeded
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"上游熔断中，跳过请求: {url}")
+
+        if self.scheduler is not None:
+            try:
+                self.scheduler.acquire(priority, deadline)
+            except Exception:
+                # 半开状态下放行的探测请求没有发出，需要释放探测名额
+                self.breaker.release_probe()
+                raise
+
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+        except requests.RequestException:
+            UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - start, urlsplit(url).path, "error")
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            # 其它异常（参数错误等）不计入失败，但半开状态下必须释放探测名额，否则熔断器再也不会放行请求
+            self.breaker.release_probe()
+            raise
+        UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - start, urlsplit(url).path, str(resp.status_code))
+
+        if resp.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return resp
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def get_upstream_client():
+    """
+    返回进程内唯一的 UpstreamClient，参数取自 config.py 中的 UPSTREAM_* 配置
+    """
+    global _upstream_client
+    if _upstream_client is None:
+        with _client_lock:
+            if _upstream_client is None:
+                config = current_app.config
+                scheduler = None
+                if config.get("UPSTREAM_RATE_LIMIT_ENABLED", True):
+                    scheduler = UpstreamScheduler(
+                        get_redis_client(),
+                        rate=config.get("UPSTREAM_RATE", 20),
+                        burst=config.get("UPSTREAM_BURST", 40),
+                        reserves=config.get("UPSTREAM_PRIORITY_RESERVES"),
+                        deadlines=config.get("UPSTREAM_PRIORITY_DEADLINES")
+                    )
+                _upstream_client = UpstreamClient(
+                    pool_connections=config.get("UPSTREAM_POOL_CONNECTIONS", 10),
+                    pool_maxsize=config.get("UPSTREAM_POOL_MAXSIZE", 50),
+                    connect_timeout=config.get("UPSTREAM_CONNECT_TIMEOUT", 3),
+                    read_timeout=config.get("UPSTREAM_READ_TIMEOUT", 10),
+                    retries=config.get("UPSTREAM_RETRIES", 2),
+                    backoff_factor=config.get("UPSTREAM_BACKOFF_FACTOR", 0.2),
+                    failure_threshold=config.get("UPSTREAM_BREAKER_THRESHOLD", 5),
+                    recovery_timeout=config.get("UPSTREAM_BREAKER_RECOVERY", 30),
+                    scheduler=scheduler
+                )
+    return _upstream_client
@@ -0,0 +1,187 @@
+# utils/upstream_scheduler.py
+import asyncio
+import threading
+import time
+
+import redis
+
+PRIORITY_LOGIN = 0  # 扫码登录轮询、登录后取用户信息
+PRIORITY_INTERACTIVE = 1  # 用户正在等待的详情类请求
+PRIORITY_BACKGROUND = 2  # 后台刷新
+PRIORITY_NAMES = {PRIORITY_LOGIN: "login", PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+BUCKET_KEY = "upstream:bucket"
+QUEUE_KEY = "upstream:{{queue}}:{}"  # 带 hash tag，集群模式下各优先级的队列深度可以一次 MGET
+
+# 所有 worker / 节点共享的令牌桶；桶内令牌低于该优先级的保留量时，该优先级需要等待
+_TAKE_TOKEN = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens - 1 >= reserve then
+    tokens = tokens - 1
+else
+    wait = (reserve + 1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class UpstreamBudgetExceeded(Exception):
+    """在截止时间内拿不到上游调用额度，快速失败"""
+
+
+class UpstreamScheduler:
+    """
+    基于 Redis 令牌桶的全局上游调用预算与优先级调度：
+    - rate / burst 为所有进程共享的每秒令牌数与桶容量
+    - reserves[priority] 为该优先级可用的最低剩余比例，优先级越低保留越多，高优先级请求先拿到令牌
+    - 预计等待时间超过请求截止时间时立即抛出 UpstreamBudgetExceeded，不占着 worker 空等
+    Redis 不可用时放行，避免限流本身成为故障点。
+    """
+
+    def __init__(self, redis_client, rate=20, burst=40, reserves=None, deadlines=None):
+        self.redis = redis_client
+        self.rate = rate
+        self.burst = burst
+        self.reserves = reserves or {PRIORITY_LOGIN: 0, PRIORITY_INTERACTIVE: 0.2, PRIORITY_BACKGROUND: 0.5}
+        self.deadlines = deadlines or {PRIORITY_LOGIN: 5, PRIORITY_INTERACTIVE: 3, PRIORITY_BACKGROUND: 30}
+        self._script = redis_client.register_script(_TAKE_TOKEN)
+        self._lock = threading.Lock()
+        self._stats = {
+            p: {"waiting": 0, "acquired": 0, "rejected": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for p in PRIORITY_NAMES
+        }
+
+    def _take(self, priority):
+        reserve = self.burst * self.reserves.get(priority, 0)
+        return float(self._script(keys=[BUCKET_KEY], args=[self.rate, self.burst, reserve]))
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, deadline=None):
+        """
+        等待直到拿到一个令牌；deadline 为最长等待秒数，默认取该优先级的配置
+        """
+        if deadline is None:
+            deadline = self.deadlines.get(priority, 3)
+        start = time.monotonic()
+        expire_at = start + deadline
+        queued = False
+
+        try:
+            while True:
+                try:
+                    wait = self._take(priority)
+                except redis.RedisError:
+                    wait = 0
+                if wait <= 0:
+                    return self._acquired(priority, start)
+                self._check_deadline(priority, wait, expire_at)
+
+                if not queued:
+                    queued = True
+                    self._change_queue_depth(priority, 1)
+                time.sleep(wait)
+        finally:
+            if queued:
+                self._change_queue_depth(priority, -1)
+
+    def _acquired(self, priority, start):
+        waited = time.monotonic() - start
+        with self._lock:
+            stats = self._stats[priority]
+            stats["acquired"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+        return waited
+
+    def _check_deadline(self, priority, wait, expire_at):
+        remaining = expire_at - time.monotonic()
+        if wait > remaining:
+            with self._lock:
+                self._stats[priority]["rejected"] += 1
+            raise UpstreamBudgetExceeded(
+                f"上游调用额度不足，预计等待 {wait:.2f}s 超过剩余时间 {max(remaining, 0):.2f}s"
+            )
+
+    def _change_queue_depth(self, priority, delta):
+        with self._lock:
+            self._stats[priority]["waiting"] += delta
+        try:
+            self.redis.incrby(QUEUE_KEY.format(PRIORITY_NAMES[priority]), delta)
+        except redis.RedisError:
+            pass
+
+    def stats(self):
+        """
+        本进程各优先级的排队数、获取/拒绝次数、等待时间，以及全局（Redis 中）的排队数
+        """
+        with self._lock:
+            result = {
+                PRIORITY_NAMES[p]: dict(s, wait_avg=s["wait_total"] / s["acquired"] if s["acquired"] else 0.0)
+                for p, s in self._stats.items()
+            }
+        try:
+            depths = self.redis.mget([QUEUE_KEY.format(name) for name in result])
+            for name, depth in zip(result, depths):
+                result[name]["global_waiting"] = int(depth or 0)
+        except redis.RedisError:
+            pass
+        return result
+
+
+class AsyncUpstreamScheduler(UpstreamScheduler):
+    """
+    asyncio 版本（ASGI 模式）：与同步版本共用 Redis 中的令牌桶与优先级保留量，等待时 await 而不占用线程。
+    统计沿用父类（stats() 仍使用同步客户端读取全局排队数）。
+    """
+
+    def __init__(self, redis_client, async_redis_client, **kwargs):
+        super().__init__(redis_client, **kwargs)
+        self.async_redis = async_redis_client
+        self._async_script = async_redis_client.register_script(_TAKE_TOKEN)
+
+    async def _take_async(self, priority):
+        reserve = self.burst * self.reserves.get(priority, 0)
+        return float(await self._async_script(keys=[BUCKET_KEY], args=[self.rate, self.burst, reserve]))
+
+    async def acquire_async(self, priority=PRIORITY_INTERACTIVE, deadline=None):
+        if deadline is None:
+            deadline = self.deadlines.get(priority, 3)
+        start = time.monotonic()
+        expire_at = start + deadline
+        queued = False
+
+        try:
+            while True:
+                try:
+                    wait = await self._take_async(priority)
+                except redis.RedisError:
+                    wait = 0
+                if wait <= 0:
+                    return self._acquired(priority, start)
+                self._check_deadline(priority, wait, expire_at)
+
+                if not queued:
+                    queued = True
+                    await self._change_queue_depth_async(priority, 1)
+                await asyncio.sleep(wait)
+        finally:
+            if queued:
+                await self._change_queue_depth_async(priority, -1)
+
+    async def _change_queue_depth_async(self, priority, delta):
+        with self._lock:
+            self._stats[priority]["waiting"] += delta
+        try:
+            await self.async_redis.incrby(QUEUE_KEY.format(PRIORITY_NAMES[priority]), delta)
+        except redis.RedisError:
+            pass
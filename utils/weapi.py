@@ -0,0 +1,94 @@
+# utils/weapi.py
+import base64
+import json
+import secrets
+import threading
+import time
+
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+# 与 static/main.js 中的 e / f / g 保持一致
+PUBKEY = "010001"
+MODULUS = (
+    "00e0b509f6259df8642dbc35662901477df22677ec152b5ff68ace615bb7b725152b3ab17a876aea8a5aa76d2e417629ec4ee341f56135fccf"
+    "695280104e0312ecbda92557c93870114af6c9d05c4f7f0c3685b7a46bee255932575cce10b424d813cfe4875d3e82047b97ddef52741d546b"
+    "8e289dc6935b3ece0462db0a22b8e7"
+)
+NONCE = b"0CoJUm6Qyw8W8jud"
+IV = b"0102030405060708"
+KEY_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+_PUBKEY_INT = int(PUBKEY, 16)
+_MODULUS_INT = int(MODULUS, 16)
+
+_key_lock = threading.Lock()
+_cached_key = None  # (secret_key, enc_sec_key, expire_at)
+
+
+def aes_encrypt(text, key):
+    """
+    AES-128-CBC + PKCS7，返回 base64 字符串（等价于 CryptoJS.AES.encrypt(...).toString()）
+    """
+    padder = padding.PKCS7(128).padder()
+    padded = padder.update(text) + padder.finalize()
+    encryptor = Cipher(algorithms.AES(key), modes.CBC(IV)).encryptor()
+    return base64.b64encode(encryptor.update(padded) + encryptor.finalize())
+
+
+def rsa_encrypt(secret_key):
+    """
+    无填充 RSA：先把密钥逆序，再做 pow(m, e, n)，输出 256 位十六进制
+    """
+    m = int.from_bytes(secret_key[::-1], "big")
+    return format(pow(m, _PUBKEY_INT, _MODULUS_INT), "x").zfill(256)
+
+
+def create_secret_key(size=16):
+    return "".join(secrets.choice(KEY_CHARS) for _ in range(size)).encode("utf-8")
+
+
+def get_secret_key_pair(ttl=300):
+    """
+    返回 (secret_key, encSecKey)，在 ttl 秒内复用同一对，避免每次都做 RSA 运算。
+    ttl <= 0 表示每次都重新生成。
+    """
+    global _cached_key
+    if ttl <= 0:
+        secret_key = create_secret_key()
+        return secret_key, rsa_encrypt(secret_key)
+
+    now = time.time()
+    cached = _cached_key
+    if cached and cached[2] > now:
+        return cached[0], cached[1]
+
+    with _key_lock:
+        cached = _cached_key
+        if cached and cached[2] > now:
+            return cached[0], cached[1]
+        secret_key = create_secret_key()
+        enc_sec_key = rsa_encrypt(secret_key)
+        _cached_key = (secret_key, enc_sec_key, now + ttl)
+        return secret_key, enc_sec_key
+
+
+def weapi_encrypt(data, secret_key=None, ttl=300):
+    """
+    与 main.js 中 get_param 等价的 weapi 加密。
+    data: dict 或已序列化好的 JSON 字符串
+    secret_key: 指定 16 位随机密钥（用于测试向量），为空时使用缓存的密钥对
+    """
+    if not isinstance(data, str):
+        data = json.dumps(data, separators=(",", ":"))
+
+    if secret_key is None:
+        secret_key, enc_sec_key = get_secret_key_pair(ttl)
+    else:
+        if isinstance(secret_key, str):
+            secret_key = secret_key.encode("utf-8")
+        enc_sec_key = rsa_encrypt(secret_key)
+
+    enc_text = aes_encrypt(data.encode("utf-8"), NONCE)
+    enc_text = aes_encrypt(enc_text, secret_key)
+    return {"params": enc_text.decode("utf-8"), "encSecKey": enc_sec_key}